@@ -0,0 +1,64 @@
+import asyncio
+
+_NO_ENTRY = object()
+
+
+async def parse_stream(parser, source, max_frames=1000, max_delay=0.01, executor=None):
+  # parses a stream of update_strings entries, [nanos, [[address, data, src], ...]],
+  # from an async iterable or an asyncio.Queue, where None ends the stream.
+  # Entries are batched until max_frames frames or max_delay seconds after the
+  # first one, each batch is parsed in one update on the executor so the event
+  # loop isn't blocked. Yields the updated addresses of each batch, as returned by
+  # update_strings, the parser's vl and vl_all hold its values until the next
+  # batch is requested.
+  # The source is read ahead by at most max_frames entries while the consumer is busy
+  loop = asyncio.get_running_loop()
+  if isinstance(source, asyncio.Queue):
+    queue, pump = source, None
+  else:
+    queue = asyncio.Queue(max_frames)
+    pump = loop.create_task(_pump(source, queue))
+
+  # a pending get is kept across batches, canceling it could lose an entry
+  getter = None
+  batch, frames, deadline, done = [], 0, None, False
+  try:
+    while not done:
+      if getter is None and not queue.empty():
+        entry = queue.get_nowait()
+      else:
+        if getter is None:
+          getter = loop.create_task(queue.get())
+        await asyncio.wait((getter,), timeout=None if deadline is None else max(deadline - loop.time(), 0))
+        entry, getter = (getter.result(), None) if getter.done() else (_NO_ENTRY, getter)
+
+      if entry is None:
+        done = True
+      elif entry is not _NO_ENTRY:
+        batch.append(entry)
+        frames += len(entry[1])
+        if deadline is None:
+          deadline = loop.time() + max_delay
+
+      if batch and (done or frames >= max_frames or loop.time() >= deadline):
+        updated = await loop.run_in_executor(executor, parser.update_strings, batch)
+        batch, frames, deadline = [], 0, None
+        yield updated
+
+    if pump is not None:
+      await pump  # raises what the source raised
+  finally:
+    if getter is not None:
+      getter.cancel()
+    if pump is not None:
+      pump.cancel()
+
+
+async def _pump(source, queue):
+  try:
+    async for entry in source:
+      await queue.put(entry)
+  except Exception:
+    await queue.put(None)
+    raise
+  await queue.put(None)
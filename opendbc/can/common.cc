@@ -1,13 +1,13 @@
 #include "opendbc/can/common.h"
 
 
-unsigned int honda_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d) {
+unsigned int honda_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) {
   int s = 0;
   bool extended = address > 0x7FF;
   while (address) { s += (address & 0xF); address >>= 4; }
-  for (int i = 0; i < d.size(); i++) {
+  for (int i = 0; i < size; i++) {
     uint8_t x = d[i];
-    if (i == d.size()-1) x >>= 4; // remove checksum
+    if (i == size-1) x >>= 4; // remove checksum
     s += (x & 0xF) + (x >> 4);
   }
   s = 8-s;
@@ -16,58 +16,29 @@ unsigned int honda_checksum(uint32_t address, const Signal &sig, const std::vect
   return s & 0xF;
 }
 
-unsigned int toyota_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d) {
-  unsigned int s = d.size();
+unsigned int toyota_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) {
+  unsigned int s = size;
   while (address) { s += address & 0xFF; address >>= 8; }
-  for (int i = 0; i < d.size() - 1; i++) { s += d[i]; }
+  for (int i = 0; i < size - 1; i++) { s += d[i]; }
 
   return s & 0xFF;
 }
 
-unsigned int subaru_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d) {
+unsigned int subaru_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) {
   unsigned int s = 0;
   while (address) { s += address & 0xFF; address >>= 8; }
 
   // skip checksum in first byte
-  for (int i = 1; i < d.size(); i++) { s += d[i]; }
+  for (int i = 1; i < size; i++) { s += d[i]; }
 
   return s & 0xFF;
 }
 
-unsigned int chrysler_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d) {
-  // jeep chrysler canbus checksum from http://illmatics.com/Remote%20Car%20Hacking.pdf
-  uint8_t checksum = 0xFF;
-  for (int j = 0; j < (d.size() - 1); j++) {
-    uint8_t shift = 0x80;
-    uint8_t curr = d[j];
-    for (int i = 0; i < 8; i++) {
-      uint8_t bit_sum = curr & shift;
-      uint8_t temp_chk = checksum & 0x80U;
-      if (bit_sum != 0U) {
-        bit_sum = 0x1C;
-        if (temp_chk != 0U) {
-          bit_sum = 1;
-        }
-        checksum = checksum << 1;
-        temp_chk = checksum | 1U;
-        bit_sum ^= temp_chk;
-      } else {
-        if (temp_chk != 0U) {
-          bit_sum = 0x1D;
-        }
-        checksum = checksum << 1;
-        bit_sum ^= checksum;
-      }
-      checksum = bit_sum;
-      shift = shift >> 1;
-    }
-  }
-  return ~checksum & 0xFF;
-}
-
-// Static lookup table for fast computation of CRCs
+// Static lookup tables for fast computation of CRCs
 uint8_t crc8_lut_8h2f[256]; // CRC8 poly 0x2F, aka 8H2F/AUTOSAR
-uint16_t crc16_lut_xmodem[256]; // CRC16 poly 0x1021, aka XMODEM
+uint8_t crc8_lut_j1850[256]; // CRC8 poly 0x1D, aka SAE J1850
+uint8_t crc8_lut_d5[256]; // CRC8 poly 0xD5
+uint16_t crc16_lut_xmodem[8][256]; // CRC16 poly 0x1021, aka XMODEM, one table per byte of a slice
 
 void gen_crc_lookup_table_8(uint8_t poly, uint8_t crc_lut[]) {
   uint8_t crc;
@@ -85,7 +56,7 @@ void gen_crc_lookup_table_8(uint8_t poly, uint8_t crc_lut[]) {
   }
 }
 
-void gen_crc_lookup_table_16(uint16_t poly, uint16_t crc_lut[]) {
+void gen_crc_lookup_table_16(uint16_t poly, uint16_t crc_lut[][256], int slices) {
   uint16_t crc;
   int i, j;
 
@@ -98,7 +69,15 @@ void gen_crc_lookup_table_16(uint16_t poly, uint16_t crc_lut[]) {
         crc <<= 1;
       }
     }
-    crc_lut[i] = crc;
+    crc_lut[0][i] = crc;
+  }
+
+  // table k is the CRC of a byte followed by k zero bytes
+  for (j = 1; j < slices; j++) {
+    for (i = 0; i < 256; i++) {
+      crc = crc_lut[j - 1][i];
+      crc_lut[j][i] = (crc << 8) ^ crc_lut[0][crc >> 8];
+    }
   }
 }
 
@@ -106,13 +85,41 @@ void gen_crc_lookup_table_16(uint16_t poly, uint16_t crc_lut[]) {
 struct CrcInitializer {
   CrcInitializer() {
     gen_crc_lookup_table_8(0x2F, crc8_lut_8h2f);    // CRC-8 8H2F/AUTOSAR for Volkswagen
-    gen_crc_lookup_table_16(0x1021, crc16_lut_xmodem);    // CRC-16 XMODEM for HKG CAN FD
+    gen_crc_lookup_table_8(0x1D, crc8_lut_j1850);    // CRC-8 SAE J1850 for Chrysler
+    gen_crc_lookup_table_8(0xD5, crc8_lut_d5);    // CRC-8 for the comma pedal
+    gen_crc_lookup_table_16(0x1021, crc16_lut_xmodem, 8);    // CRC-16 XMODEM for HKG CAN FD
   }
 };
 
 static CrcInitializer crcInitializer;
 
-unsigned int volkswagen_mqb_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d) {
+static uint8_t crc8_update(const uint8_t crc_lut[], uint8_t crc, const uint8_t *dat, size_t len) {
+  for (size_t i = 0; i < len; i++) {
+    crc = crc_lut[crc ^ dat[i]];
+  }
+  return crc;
+}
+
+static uint16_t crc16_update(const uint16_t crc_lut[][256], uint16_t crc, const uint8_t *dat, size_t len) {
+  // slice-by-8: the CRC of 8 bytes is the XOR of each byte's CRC shifted by the bytes after it
+  for (; len >= 8; dat += 8, len -= 8) {
+    crc = crc_lut[7][(crc >> 8) ^ dat[0]] ^ crc_lut[6][(crc & 0xFF) ^ dat[1]] ^ crc_lut[5][dat[2]] ^
+          crc_lut[4][dat[3]] ^ crc_lut[3][dat[4]] ^ crc_lut[2][dat[5]] ^ crc_lut[1][dat[6]] ^ crc_lut[0][dat[7]];
+  }
+  for (; len > 0; dat++, len--) {
+    crc = (crc << 8) ^ crc_lut[0][(crc >> 8) ^ *dat];
+  }
+  return crc;
+}
+
+unsigned int chrysler_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) {
+  // jeep chrysler canbus checksum from http://illmatics.com/Remote%20Car%20Hacking.pdf
+  // is the CRC-8 SAE J1850 of the payload, without the checksum in the last byte
+  const uint8_t checksum = crc8_update(crc8_lut_j1850, 0xFF, d, std::max<size_t>(size, 1) - 1);
+  return ~checksum & 0xFF;
+}
+
+unsigned int volkswagen_mqb_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) {
   // Volkswagen uses standard CRC8 8H2F/AUTOSAR, but they compute it with
   // a magic variable padding byte tacked onto the end of the payload.
   // https://www.autosar.org/fileadmin/user_upload/standards/classic/4-3/AUTOSAR_SWS_CRCLibrary.pdf
@@ -120,10 +127,7 @@ unsigned int volkswagen_mqb_checksum(uint32_t address, const Signal &sig, const
   uint8_t crc = 0xFF; // Standard init value for CRC8 8H2F/AUTOSAR
 
   // CRC the payload first, skipping over the first byte where the CRC lives.
-  for (int i = 1; i < d.size(); i++) {
-    crc ^= d[i];
-    crc = crc8_lut_8h2f[crc];
-  }
+  crc = crc8_update(crc8_lut_8h2f, crc, d + 1, std::max<size_t>(size, 1) - 1);
 
   // Look up and apply the magic final CRC padding byte, which permutes by CAN
   // address, and additionally (for SOME addresses) by the message counter.
@@ -193,12 +197,12 @@ unsigned int volkswagen_mqb_checksum(uint32_t address, const Signal &sig, const
   return crc ^ 0xFF; // Return after standard final XOR for CRC8 8H2F/AUTOSAR
 }
 
-unsigned int xor_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d) {
+unsigned int xor_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) {
   uint8_t checksum = 0;
   int checksum_byte = sig.start_bit / 8;
 
   // Simple XOR over the payload, except for the byte where the checksum lives.
-  for (int i = 0; i < d.size(); i++) {
+  for (int i = 0; i < size; i++) {
     if (i != checksum_byte) {
       checksum ^= d[i];
     }
@@ -207,42 +211,30 @@ unsigned int xor_checksum(uint32_t address, const Signal &sig, const std::vector
   return checksum;
 }
 
-unsigned int pedal_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d) {
+unsigned int pedal_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) {
   uint8_t crc = 0xFF;
-  uint8_t poly = 0xD5; // standard crc8
 
-  // skip checksum byte
-  for (int i = d.size()-2; i >= 0; i--) {
-    crc ^= d[i];
-    for (int j = 0; j < 8; j++) {
-      if ((crc & 0x80) != 0) {
-        crc = (uint8_t)((crc << 1) ^ poly);
-      } else {
-        crc <<= 1;
-      }
-    }
+  // skip checksum byte, the payload is CRCed from the end
+  for (int i = size-2; i >= 0; i--) {
+    crc = crc8_lut_d5[crc ^ d[i]];
   }
   return crc;
 }
 
-unsigned int hkg_can_fd_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d) {
-  uint16_t crc = 0;
-
-  for (int i = 2; i < d.size(); i++) {
-    crc = (crc << 8) ^ crc16_lut_xmodem[(crc >> 8) ^ d[i]];
-  }
+unsigned int hkg_can_fd_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) {
+  uint16_t crc = crc16_update(crc16_lut_xmodem, 0, d + 2, std::max<size_t>(size, 2) - 2);
 
   // Add address to crc
-  crc = (crc << 8) ^ crc16_lut_xmodem[(crc >> 8) ^ ((address >> 0) & 0xFF)];
-  crc = (crc << 8) ^ crc16_lut_xmodem[(crc >> 8) ^ ((address >> 8) & 0xFF)];
+  const uint8_t address_bytes[] = {(uint8_t)(address & 0xFF), (uint8_t)((address >> 8) & 0xFF)};
+  crc = crc16_update(crc16_lut_xmodem, crc, address_bytes, 2);
 
-  if (d.size() == 8) {
+  if (size == 8) {
     crc ^= 0x5f29;
-  } else if (d.size() == 16) {
+  } else if (size == 16) {
     crc ^= 0x041d;
-  } else if (d.size() == 24) {
+  } else if (size == 24) {
     crc ^= 0x819d;
-  } else if (d.size() == 32) {
+  } else if (size == 32) {
     crc ^= 0x9f5b;
   }
 
@@ -1,7 +1,15 @@
 #pragma once
 
+#include <algorithm>
+#include <atomic>
+#include <cstring>
+#include <list>
 #include <map>
+#include <memory>
+#include <mutex>
 #include <string>
+#include <string_view>
+#include <thread>
 #include <utility>
 #include <unordered_map>
 #include <vector>
@@ -18,19 +26,38 @@
 #define CAN_INVALID_CNT 20
 
 // Car specific functions
-unsigned int honda_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d);
-unsigned int toyota_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d);
-unsigned int subaru_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d);
-unsigned int chrysler_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d);
-unsigned int volkswagen_mqb_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d);
-unsigned int xor_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d);
-unsigned int hkg_can_fd_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d);
-unsigned int pedal_checksum(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d);
+unsigned int honda_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size);
+unsigned int toyota_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size);
+unsigned int subaru_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size);
+unsigned int chrysler_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size);
+unsigned int volkswagen_mqb_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size);
+unsigned int xor_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size);
+unsigned int hkg_can_fd_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size);
+unsigned int pedal_checksum(uint32_t address, const Signal &sig, const uint8_t *d, size_t size);
 
+// Signals are read and written through a 64-bit window, see Signal::in_window.
+// The window is stored little-endian; big endian signals are byte-swapped.
+static_assert(__BYTE_ORDER__ == __ORDER_LITTLE_ENDIAN__, "little endian host required");
+
+inline uint64_t read_window(const uint8_t *dat, size_t size, const Signal &sig) {
+  uint64_t w = 0;
+  memcpy(&w, dat + sig.window_byte, std::min<size_t>(8, size - sig.window_byte));
+  return sig.is_little_endian ? w : __builtin_bswap64(w);
+}
+
+inline void write_window(uint8_t *dat, size_t size, const Signal &sig, uint64_t w) {
+  if (!sig.is_little_endian) {
+    w = __builtin_bswap64(w);
+  }
+  memcpy(dat + sig.window_byte, &w, std::min<size_t>(8, size - sig.window_byte));
+}
+
+// The payload isn't copied, dat must stay valid for the update the frame is passed to
 struct CanFrame {
   long src;
   uint32_t address;
-  std::vector<uint8_t> dat;
+  const uint8_t *dat;
+  size_t size;
 };
 
 struct CanData {
@@ -38,6 +65,28 @@ struct CanData {
   std::vector<CanFrame> frames;
 };
 
+// Contiguous frame log, e.g. backed by NumPy arrays. Frame i carries
+// dlcs[i] payload bytes starting at dat + i * stride. Consecutive frames
+// with the same timestamp are handled like the frames of one CanData.
+struct CanFrameBatch {
+  size_t count;
+  const uint64_t *nanos;
+  const uint32_t *addresses;
+  const uint8_t *src;
+  const uint8_t *dlcs;
+  const uint8_t *dat;
+  size_t stride;
+};
+
+// values of a signal over time. Signals with a whole factor and offset are
+// computed exactly from the raw value into int_values, the others into values
+struct SignalSeries {
+  bool integer = false;
+  std::vector<uint64_t> ts_nanos;
+  std::vector<double> values;
+  std::vector<int64_t> int_values;
+};
+
 class MessageState {
 public:
   std::string name;
@@ -46,26 +95,95 @@ public:
 
   std::vector<Signal> parse_sigs;
   std::vector<double> vals;
-  std::vector<std::vector<double>> all_vals;
+  std::vector<double> tmp_vals;
 
-  uint64_t last_seen_nanos;
-  uint64_t check_threshold;
+  // values of every frame parsed since the history was last cleared, a ring
+  // of rows holding one value per signal. It grows up to history_capacity
+  // rows (0 for unbounded), then the oldest rows are dropped.
+  std::vector<double> history;
+  size_t history_rows = 0;
+  size_t history_start = 0;
+  size_t history_count = 0;
+  size_t history_capacity = 0;
 
-  uint8_t counter;
-  uint8_t counter_fail;
+  uint64_t last_seen_nanos = 0;
+  uint64_t check_threshold = 0;
+
+  uint8_t counter = 0;
+  uint8_t counter_fail = 0;
+
+  // counters, always on. Checksum failures are frames dropped for their checksum,
+  // counter failures every unexpected counter. A timeout is a gap longer than
+  // check_threshold, it's counted once the message is parsed again
+  uint64_t frames_seen = 0;
+  uint64_t frames_parsed = 0;
+  uint64_t checksum_failures = 0;
+  uint64_t counter_failures = 0;
+  uint64_t timeouts = 0;
 
   bool ignore_checksum = false;
   bool ignore_counter = false;
+  bool updated = false;  // parsed since the last query
+
+  // position in the parser's timeout group, for messages with a check_threshold
+  int timeout_group = -1;
+  std::list<MessageState *>::iterator timeout_it;
 
-  bool parse(uint64_t nanos, const std::vector<uint8_t> &dat);
+  void init(const Msg &msg);
+  bool parse(uint64_t nanos, const uint8_t *dat, size_t len);
   bool update_counter_generic(int64_t v, int cnt_size);
+
+  void push_history();
+  void read_history(size_t sig_index, std::vector<double> &values) const;
+  void clear_history();
+  void set_history_capacity(size_t capacity);
+  double history_at(size_t row, size_t sig_index) const {
+    return history[((history_start + row) % history_rows) * vals.size() + sig_index];
+  }
+};
+
+// counters of a parser, always on, the times are cumulative nanoseconds.
+// Counters of the messages are kept in their states. The parsers of a
+// MultiBusCANParser route the frames of all buses in one pass, update_cans_nanos
+// isn't measured for them
+struct ParserStats {
+  uint64_t frames = 0;  // on the parser's bus
+  uint64_t bytes = 0;
+  uint64_t oversized = 0;  // of tracked messages, dropped for being longer than 64 bytes
+  uint64_t bus_timeouts = 0;
+  uint64_t update_cans_nanos = 0;
+  uint64_t update_valid_nanos = 0;
+  uint64_t query_nanos = 0;
 };
 
+// Parsers only read their DBC, which is shared and never changed once loaded,
+// so independent parsers can be used from different threads. A parser itself
+// isn't synchronized and is only used by one thread at a time.
 class CANParser {
 private:
+  friend class MultiBusCANParser;
+  friend class CANReader;
+
+  // messages sharing a check_threshold, ordered by last_seen_nanos
+  struct TimeoutGroup {
+    uint64_t check_threshold;
+    std::list<MessageState *> states;
+  };
+
   const int bus;
   const DBC *dbc = NULL;
   std::unordered_map<uint32_t, MessageState> message_states;
+  std::vector<MessageState *> updated_states;
+  std::vector<TimeoutGroup> timeout_groups;
+  size_t failing_counters = 0;  // messages with counter_fail >= MAX_BAD_COUNTER
+
+  // tracking every message of the DBC, their states are added on first sight
+  bool all_messages = false;
+  bool ignore_checksum = false;
+  bool ignore_counter = false;
+  size_t history_capacity = 0;
+
+  MessageState* lookup_state(uint32_t address);
 
 public:
   bool can_valid = false;
@@ -75,26 +193,215 @@ public:
   uint64_t last_nonempty_nanos = 0;
   uint64_t bus_timeout_threshold = 0;
   uint64_t can_invalid_cnt = CAN_INVALID_CNT;
+  ParserStats stats;
 
-  CANParser(int abus, const std::string& dbc_name,
-            const std::vector<std::pair<uint32_t, int>> &messages);
+  CANParser(int abus, const std::string& dbc_name, const std::vector<std::pair<uint32_t, int>> &messages,
+            bool ignore_checksum = false, bool ignore_counter = false);
   CANParser(int abus, const std::string& dbc_name, bool ignore_checksum, bool ignore_counter);
   void update(const std::vector<CanData> &can_data, std::vector<SignalValue> &vals);
+  void update(const CanFrameBatch &batch, std::vector<SignalValue> &vals);
+  // same as above, but returns the updated message states instead of copying
+  // their values. Their history has to be cleared once it's read.
+  void update(const std::vector<CanData> &can_data, std::vector<MessageState *> &states);
+  void update(const CanFrameBatch &batch, std::vector<MessageState *> &states);
+  void decode(const CanFrameBatch &batch, const std::vector<std::pair<uint32_t, int>> &signals,
+              std::vector<SignalSeries> &series);
   void query_latest(std::vector<SignalValue> &vals, uint64_t last_ts = 0);
+  void query_updated(std::vector<MessageState *> &states, uint64_t last_ts = 0);
+  // states live as long as the parser, at a fixed address. nullptr if the
+  // message isn't tracked, or when tracking all messages, wasn't seen yet
+  MessageState* get_message_state(uint32_t address);
+  // max frames per message kept for SignalValue::all_values between queries, 0 for unbounded
+  void set_history_capacity(size_t capacity);
+  // tracked message states, for their counters
+  void get_message_states(std::vector<MessageState *> &states);
+  // zeroes the parser's counters and those of its messages
+  void reset_stats();
 
 protected:
+  uint64_t UpdateData(const std::vector<CanData> &can_data);
+  uint64_t UpdateData(const CanFrameBatch &batch);
+  bool UpdateState(MessageState &state, uint64_t nanos, const uint8_t *dat, size_t len);
   void UpdateCans(const CanData &can);
+  void UpdateCans(const CanFrameBatch &batch, size_t begin, size_t end);
+  void UpdateBusTimeout(uint64_t nanos, bool bus_empty);
   void UpdateValid(uint64_t nanos);
+  // the states to report for an update starting at current_nanos, see QueryLatestSeen
+  void QueryUpdate(std::vector<MessageState *> &states, uint64_t current_nanos);
+  // the messages seen at the last timestamp, or every message before one was seen
+  // at a non-zero time. Updates without frames, or starting at timestamp 0,
+  // report these, as they did when every tracked message was queried
+  void QueryLatestSeen(std::vector<MessageState *> &states);
+};
+
+// parses the messages of several buses, routing each frame once by (bus, address).
+// Validity and timeouts are kept per bus, by a CANParser for each bus.
+class MultiBusCANParser {
+private:
+  struct Route {
+    size_t parser_index;
+    MessageState *state;
+  };
+
+  std::vector<std::unique_ptr<CANParser>> parsers;  // ordered by bus
+  std::vector<int> parser_index;  // by bus, -1 for buses without messages
+  std::unordered_map<uint64_t, Route> routes;  // by bus << 32 | address
+  std::vector<uint8_t> bus_empty;  // per parser, for the current timestamp
+  std::vector<MessageState *> updated_states;
+
+  void BeginUpdate(uint64_t nanos);
+  // marks the bus as not empty and counts the frame, nullptr if the message isn't tracked
+  const Route* FindRoute(long bus, uint32_t address, size_t size);
+  void EndUpdate(uint64_t nanos);
+  void QueryUpdated(std::vector<std::pair<int, MessageState *>> &states, uint64_t last_ts);
+
+public:
+  // messages to check on each bus, as in CANParser
+  MultiBusCANParser(const std::string& dbc_name,
+                    const std::map<int, std::vector<std::pair<uint32_t, int>>> &bus_messages);
+  // updated message states of all buses, as (bus, state)
+  void update(const std::vector<CanData> &can_data, std::vector<std::pair<int, MessageState *>> &states);
+  void update(const CanFrameBatch &batch, std::vector<std::pair<int, MessageState *>> &states);
+  // parser of a bus, for its validity and states. nullptr if the bus has no messages
+  CANParser* get_parser(int bus) const;
+  void set_history_capacity(size_t capacity);
+};
+
+// Reads struct can_frame or canfd_frame records on a background thread and
+// parses them into the parser's states as they come, the records of one read
+// being one update at the monotonic time they were read. The thread holds the
+// reader's lock while it parses, the parser's states and validity are only
+// read with the reader locked.
+class CANReader {
+private:
+  CANParser *parser;
+  int fd = -1;
+  int wake_fds[2] = {-1, -1};  // written to by stop()
+  bool is_socket = false;
+  size_t record_size = 0;  // of the file or pipe records
+
+  std::vector<uint8_t> buf;
+  size_t buffered = 0;
+  std::vector<CanData> can_data;  // a single update, its frames point into buf
+  uint64_t query_nanos = 0;  // of the first update since the last query
+
+  std::mutex mutex;
+  std::thread thread;
+  std::atomic<bool> reading{true};
+
+  void Start();
+  void Run();
+  bool ReadSocket();
+  bool ReadStream();
+  void AddFrame(const uint8_t *record, size_t max_size);
+  void Update();
+  void Fail(const std::string &what);
+
+public:
+  std::string error;  // why reading stopped early, empty at the end of a file
+
+  // frames of a SocketCAN interface, e.g. "can0" or "vcan0"
+  CANReader(CANParser *parser, const std::string &interface);
+  // can_frame records, or canfd_frame ones, of a file or pipe until its end
+  CANReader(CANParser *parser, const std::string &path, bool canfd);
+  ~CANReader();
+
+  void lock() { mutex.lock(); }
+  void unlock() { mutex.unlock(); }
+  // states parsed since the last query, with the reader locked
+  void query_updated(std::vector<MessageState *> &states);
+  bool running() const { return reading; }
+  void stop();
+};
+
+// Frames of a CAN log file, mapped in memory and parsed a chunk at a time, so
+// logs of any size are read in bounded memory. Logs are either candump -l text,
+// or binary: LOG_MAGIC then records of uint64 nanos, uint32 address, uint8 bus,
+// uint8 size and size bytes, little endian. Lines of a text log that can't be
+// parsed are skipped and counted.
+class CANLogReader {
+private:
+  const char *data = nullptr;
+  size_t size = 0;
+  size_t pos = 0;
+  size_t released = 0;  // pages before it were dropped
+
+public:
+  static constexpr char LOG_MAGIC[] = "ODBCLOG1";
+
+  bool binary = false;
+  bool truncated = false;  // the binary log ends with a partial record
+  size_t skipped_lines = 0;
+
+  CANLogReader(const std::string &path);
+  ~CANLogReader();
+  // reads up to capacity frames into the arrays, dat holding capacity * 64 bytes.
+  // Returns the frames read, 0 at the end of the log. Their payloads are rows of
+  // stride bytes, the size of the longest one, padded with zeros. An invalid
+  // binary record throws once the frames before it have been returned
+  size_t read(size_t capacity, uint64_t *nanos, uint32_t *addresses, uint8_t *buses, uint8_t *dlcs,
+              uint8_t *dat, size_t &stride);
+};
+
+// a message with its signals resolved, to pack values given by position
+struct PreparedMessage {
+  uint32_t address;
+  size_t size;
+  std::vector<const Signal *> sigs;
+  int counter_index;  // position of COUNTER in sigs, -1 if it's not given
+  const Signal *counter_sig;
+  const Signal *checksum_sig;
+  uint32_t *counter;
+  uint64_t *frames;  // packed, of the message's counters
+};
+
+// counters of a packer, always on
+struct PackerStats {
+  uint64_t frames = 0;
+  uint64_t bytes = 0;
+  uint64_t undefined_addresses = 0;
+  uint64_t undefined_signals = 0;
 };
 
 class CANPacker {
 private:
+  struct SignalKey {
+    uint32_t address;
+    std::string_view name;
+    bool operator==(const SignalKey &other) const { return address == other.address && name == other.name; }
+  };
+  struct SignalKeyHash {
+    size_t operator()(const SignalKey &key) const { return std::hash<std::string_view>()(key.name) ^ key.address; }
+  };
+  struct MessagePackState {
+    const Signal *counter_sig = nullptr;
+    const Signal *checksum_sig = nullptr;
+    uint32_t counter = 0;
+    uint64_t frames = 0;
+  };
+
   const DBC *dbc = NULL;
-  std::map<std::pair<uint32_t, std::string>, Signal> signal_lookup;
-  std::map<uint32_t, uint32_t> counters;
+  // points into the DBC's messages and signals
+  std::unordered_map<SignalKey, const Signal *, SignalKeyHash> signal_lookup;
+  std::vector<MessagePackState> messages;  // same order as dbc->msgs
+
+  const Signal* lookup_signal(uint32_t address, std::string_view name) const;
+  MessagePackState* lookup_state(uint32_t address);
+  void set_counter_and_checksum(uint32_t address, MessagePackState &state, std::vector<uint8_t> &ret, bool counter_set);
 
 public:
+  PackerStats stats;
+
   CANPacker(const std::string& dbc_name);
   std::vector<uint8_t> pack(uint32_t address, const std::vector<SignalPackValue> &values);
+  // packs each message of the batch in order, appending its data to `out`
+  void pack(const std::vector<SignalPackMessage> &msgs, std::vector<std::vector<uint8_t>> &out);
+  PreparedMessage prepare(uint32_t address, const std::vector<std::string> &signal_names);
+  void pack(const PreparedMessage &msg, const double *values, std::vector<uint8_t> &ret);
+  // packs `count` frames of a message into `out`, frame i takes value i of each column
+  void pack(uint32_t address, const std::vector<SignalPackColumn> &columns, size_t count, uint8_t *out);
   const Msg* lookup_message(uint32_t address);
+  // frames packed of each message, by address, messages that weren't packed are left out
+  void get_message_frames(std::vector<std::pair<uint32_t, uint64_t>> &frames) const;
+  void reset_stats();
 };
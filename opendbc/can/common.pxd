@@ -1,15 +1,16 @@
 # distutils: language = c++
 # cython: language_level=3
 
-from libc.stdint cimport uint8_t, uint32_t, uint64_t
+from libc.stdint cimport uint8_t, uint32_t, int64_t, uint64_t
 from libcpp cimport bool
+from libcpp.map cimport map
 from libcpp.pair cimport pair
 from libcpp.string cimport string
 from libcpp.vector cimport vector
 from libcpp.unordered_map cimport unordered_map
 
 
-ctypedef unsigned int (*calc_checksum_type)(uint32_t, const Signal&, const vector[uint8_t] &)
+ctypedef unsigned int (*calc_checksum_type)(uint32_t, const Signal&, const uint8_t *, size_t)
 
 cdef extern from "common_dbc.h":
   ctypedef enum SignalType:
@@ -63,25 +64,139 @@ cdef extern from "common_dbc.h":
     string name
     double value
 
+  cdef struct SignalPackMessage:
+    uint32_t address
+    vector[SignalPackValue] values
+
+  cdef struct SignalPackColumn:
+    string name
+    const double *values
+
+
+cdef extern from "logger.h":
+  cdef struct LogRecord:
+    uint64_t nanos
+    int level
+    char message[256]
+
+  cdef void log_capture(size_t)
+  cdef size_t log_read_captured(vector[LogRecord]&)
+
 
 cdef extern from "common.h":
   cdef const DBC* dbc_lookup(const string) except +
+  cdef void dbc_invalidate(const string)
+  cdef void dbc_invalidate_all()
+  cdef const DBC* dbc_reload(const string) except +
+  cdef void dbc_preload(const vector[string]&, int) except + nogil
 
   cdef struct CanFrame:
     long src
     uint32_t address
-    vector[uint8_t] dat
+    const uint8_t *dat
+    size_t size
 
   cdef struct CanData:
     uint64_t nanos
     vector[CanFrame] frames
 
+  cdef struct CanFrameBatch:
+    size_t count
+    const uint64_t *nanos
+    const uint32_t *addresses
+    const uint8_t *src
+    const uint8_t *dlcs
+    const uint8_t *dat
+    size_t stride
+
+  cdef struct SignalSeries:
+    bool integer
+    vector[uint64_t] ts_nanos
+    vector[double] values
+    vector[int64_t] int_values
+
+  cdef cppclass MessageState:
+    string name
+    uint32_t address
+    uint64_t last_seen_nanos
+    vector[double] vals
+    size_t history_count
+    double history_at(size_t, size_t)
+    void clear_history()
+    uint64_t frames_seen
+    uint64_t frames_parsed
+    uint64_t checksum_failures
+    uint64_t counter_failures
+    uint64_t timeouts
+
+  cdef struct ParserStats:
+    uint64_t frames
+    uint64_t bytes
+    uint64_t oversized
+    uint64_t bus_timeouts
+    uint64_t update_cans_nanos
+    uint64_t update_valid_nanos
+    uint64_t query_nanos
+
   cdef cppclass CANParser:
     bool can_valid
     bool bus_timeout
+    ParserStats stats
     CANParser(int, string, vector[pair[uint32_t, int]]) except +
-    void update(vector[CanData]&, vector[SignalValue]&) except +
+    CANParser(int, string, vector[pair[uint32_t, int]], bool, bool) except +
+    CANParser(int, string, bool, bool) except +
+    void update(vector[CanData]&, vector[SignalValue]&) except + nogil
+    void update(CanFrameBatch&, vector[SignalValue]&) except + nogil
+    void update(vector[CanData]&, vector[MessageState*]&) except + nogil
+    void update(CanFrameBatch&, vector[MessageState*]&) except + nogil
+    void decode(CanFrameBatch&, vector[pair[uint32_t, int]]&, vector[SignalSeries]&) except + nogil
+    MessageState* get_message_state(uint32_t)
+    void set_history_capacity(size_t)
+    void get_message_states(vector[MessageState*]&)
+    void reset_stats()
+
+  cdef cppclass MultiBusCANParser:
+    MultiBusCANParser(string, map[int, vector[pair[uint32_t, int]]]) except +
+    void update(vector[CanData]&, vector[pair[int, MessageState*]]&) except + nogil
+    void update(CanFrameBatch&, vector[pair[int, MessageState*]]&) except + nogil
+    CANParser* get_parser(int)
+    void set_history_capacity(size_t)
+
+  cdef cppclass CANReader:
+    string error
+    CANReader(CANParser*, string) except +
+    CANReader(CANParser*, string, bool) except +
+    void lock() nogil
+    void unlock() nogil
+    void query_updated(vector[MessageState*]&)
+    bool running()
+    void stop() nogil
+
+  cdef cppclass CANLogReader:
+    bool binary
+    bool truncated
+    size_t skipped_lines
+    CANLogReader(string) except +
+    size_t read(size_t, uint64_t*, uint32_t*, uint8_t*, uint8_t*, uint8_t*, size_t&) except + nogil
+
+  cdef struct PreparedMessage:
+    uint32_t address
+    size_t size
+    vector[const Signal *] sigs
+
+  cdef struct PackerStats:
+    uint64_t frames
+    uint64_t bytes
+    uint64_t undefined_addresses
+    uint64_t undefined_signals
 
   cdef cppclass CANPacker:
+   PackerStats stats
    CANPacker(string)
    vector[uint8_t] pack(uint32_t, vector[SignalPackValue]&)
+   void pack(vector[SignalPackMessage]&, vector[vector[uint8_t]]&) except +
+   PreparedMessage prepare(uint32_t, vector[string]&) except +
+   void pack(PreparedMessage&, const double*, vector[uint8_t]&)
+   void pack(uint32_t, vector[SignalPackColumn]&, size_t, uint8_t*) except +
+   void get_message_frames(vector[pair[uint32_t, uint64_t]]&)
+   void reset_stats()
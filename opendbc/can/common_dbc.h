@@ -10,6 +10,17 @@ struct SignalPackValue {
   double value;
 };
 
+// one message of a batch, packed as if by itself
+struct SignalPackMessage {
+  uint32_t address;
+  std::vector<SignalPackValue> values;
+};
+
+struct SignalPackColumn {
+  std::string name;
+  const double *values;
+};
+
 struct SignalValue {
   uint32_t address;
   uint64_t ts_nanos;
@@ -38,7 +49,15 @@ struct Signal {
   double factor, offset;
   bool is_little_endian;
   SignalType type;
-  unsigned int (*calc_checksum)(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d);
+  unsigned int (*calc_checksum)(uint32_t address, const Signal &sig, const uint8_t *d, size_t size);
+
+  // extraction plan, precomputed when the DBC is loaded
+  bool byte_aligned;    // exactly one whole byte at lsb / 8
+  bool in_window;       // fits in the 64-bit window starting at window_byte
+  int window_byte;      // first byte of the window (lowest address)
+  int window_shift;     // position of the lsb inside the window
+  int last_byte;        // highest byte index the signal touches
+  uint64_t mask;        // size bits set
 };
 
 struct Msg {
@@ -70,10 +89,21 @@ typedef struct ChecksumState {
   int counter_start_bit;
   bool little_endian;
   SignalType checksum_type;
-  unsigned int (*calc_checksum)(uint32_t address, const Signal &sig, const std::vector<uint8_t> &d);
+  unsigned int (*calc_checksum)(uint32_t address, const Signal &sig, const uint8_t *d, size_t size);
 } ChecksumState;
 
+ChecksumState* get_checksum(const std::string& dbc_name);
+void set_signal_plan(Signal &s);
+
 DBC* dbc_parse(const std::string& dbc_path);
+DBC* dbc_parse_cached(const std::string& dbc_path);
 DBC* dbc_parse_from_stream(const std::string &dbc_name, std::istream &stream, ChecksumState *checksum = nullptr, bool allow_duplicate_msg_name=false);
+// thread-safe, a DBC is parsed once and the same one is returned to every thread
 const DBC* dbc_lookup(const std::string& dbc_name);
+// invalidated DBCs are resolved and parsed again on their next lookup, the
+// DBCs returned by earlier lookups stay valid
+void dbc_invalidate(const std::string& dbc_name);
+void dbc_invalidate_all();
+const DBC* dbc_reload(const std::string& dbc_name);
+void dbc_preload(const std::vector<std::string>& dbc_names, int workers);
 std::vector<std::string> get_dbc_names();
@@ -2,24 +2,20 @@
 #include <filesystem>
 #include <fstream>
 #include <map>
-#include <regex>
 #include <set>
 #include <sstream>
 #include <vector>
 #include <mutex>
+#include <future>
+#include <thread>
+#include <atomic>
 #include <iterator>
 #include <cstring>
-#include <clocale>
+#include <locale>
 
 #include "opendbc/can/common.h"
 #include "opendbc/can/common_dbc.h"
 
-std::regex bo_regexp(R"(^BO_ (\w+) (\w+) *: (\w+) (\w+))");
-std::regex sg_regexp(R"(^SG_ (\w+) : (\d+)\|(\d+)@(\d+)([\+|\-]) \(([0-9.+\-eE]+),([0-9.+\-eE]+)\) \[([0-9.+\-eE]+)\|([0-9.+\-eE]+)\] \"(.*)\" (.*))");
-std::regex sgm_regexp(R"(^SG_ (\w+) (\w+) *: (\d+)\|(\d+)@(\d+)([\+|\-]) \(([0-9.+\-eE]+),([0-9.+\-eE]+)\) \[([0-9.+\-eE]+)\|([0-9.+\-eE]+)\] \"(.*)\" (.*))");
-std::regex val_regexp(R"(VAL_ (\w+) (\w+) (\s*[-+]?[0-9]+\s+\".+?\"[^;]*))");
-std::regex val_split_regexp{R"([\"]+)"};  // split on "
-
 #define DBC_ASSERT(condition, message)                             \
   do {                                                             \
     if (!(condition)) {                                            \
@@ -30,7 +26,7 @@ std::regex val_split_regexp{R"([\"]+)"};  // split on "
   } while (false)
 
 inline bool startswith(const std::string& str, const char* prefix) {
-  return str.find(prefix, 0) == 0;
+  return str.rfind(prefix, 0) == 0;
 }
 
 inline bool startswith(const std::string& str, std::initializer_list<const char*> prefix_list) {
@@ -44,11 +40,157 @@ inline bool endswith(const std::string& str, const char* suffix) {
   return str.find(suffix, 0) == (str.length() - strlen(suffix));
 }
 
+// std::stod follows the global C locale, which may use a decimal comma, and
+// setlocale isn't thread-safe. The numbers of a DBC are always in the C locale
+inline double parse_double(const std::string &s) {
+  thread_local std::istringstream is = [] {
+    std::istringstream stream;
+    stream.imbue(std::locale::classic());
+    return stream;
+  }();
+  is.clear();
+  is.str(s);
+  double v;
+  if (!(is >> v)) {
+    throw std::invalid_argument("invalid number: " + s);
+  }
+  return v;
+}
+
 inline std::string& trim(std::string& s, const char* t = " \t\n\r\f\v") {
   s.erase(s.find_last_not_of(t) + 1);
   return s.erase(0, s.find_first_not_of(t));
 }
 
+// Single-pass scanner for the BO_, SG_ and VAL_ lines, accepting the same
+// lines as these regular expressions:
+//   BO_  ^BO_ (\w+) (\w+) *: (\w+) (\w+)$
+//   SG_  ^SG_ (\w+) : (\d+)\|(\d+)@(\d+)([\+|\-]) \(([0-9.+\-eE]+),([0-9.+\-eE]+)\) \[([0-9.+\-eE]+)\|([0-9.+\-eE]+)\] \"(.*)\" (.*)
+//        multiplexed signals have a second word before the colon: ^SG_ (\w+) (\w+) *: ...
+//   VAL_ VAL_ (\w+) (\w+) (\s*[-+]?[0-9]+\s+\".+?\"[^;]*)
+class LineScanner {
+public:
+  const std::string &str;
+  size_t pos;
+
+  LineScanner(const std::string &s, size_t p = 0) : str(s), pos(p) {}
+
+  static bool is_word(char c) {
+    return (c >= 'a' && c <= 'z') || (c >= 'A' && c <= 'Z') || (c >= '0' && c <= '9') || c == '_';
+  }
+  static bool is_digit(char c) { return c >= '0' && c <= '9'; }
+  static bool is_number(char c) { return is_digit(c) || c == '.' || c == '+' || c == '-' || c == 'e' || c == 'E'; }
+  static bool is_space(char c) { return c == ' ' || (c >= '\t' && c <= '\r'); }
+  static bool is_line_end(char c) { return c == '\n' || c == '\r'; }
+
+  bool at_end() const { return pos == str.size(); }
+
+  bool literal(const char *lit) {
+    const size_t n = strlen(lit);
+    if (str.compare(pos, n, lit) != 0) return false;
+    pos += n;
+    return true;
+  }
+
+  // one or more characters matching pred
+  template <class Pred>
+  bool span(Pred pred, std::string *out = nullptr) {
+    const size_t start = pos;
+    while (pos < str.size() && pred(str[pos])) pos++;
+    if (pos == start) return false;
+    if (out) out->assign(str, start, pos - start);
+    return true;
+  }
+
+  bool word(std::string *out = nullptr) { return span(is_word, out); }
+  bool digits(std::string *out = nullptr) { return span(is_digit, out); }
+  bool number(std::string *out = nullptr) { return span(is_number, out); }
+
+  void skip(char c) {
+    while (pos < str.size() && str[pos] == c) pos++;
+  }
+
+  // first occurrence of lit at or after pos, without crossing a line terminator
+  size_t find_on_line(const char *lit, size_t from) const {
+    const size_t found = str.find(lit, from);
+    if (found == std::string::npos) return found;
+    for (size_t i = from; i < found; i++) {
+      if (is_line_end(str[i])) return std::string::npos;
+    }
+    return found;
+  }
+};
+
+struct SignalTokens {
+  std::string name, start_bit, size, byte_order, factor, offset;
+  char sign;
+};
+
+bool scan_bo(const std::string &line, std::string &address, std::string &name, std::string &size) {
+  LineScanner sc(line);
+  if (!(sc.literal("BO_ ") && sc.word(&address) && sc.literal(" ") && sc.word(&name))) return false;
+  sc.skip(' ');
+  return sc.literal(": ") && sc.word(&size) && sc.literal(" ") && sc.word() && sc.at_end();
+}
+
+bool scan_sg(const std::string &line, SignalTokens &t) {
+  LineScanner sc(line);
+  if (!(sc.literal("SG_ ") && sc.word(&t.name))) return false;
+  if (!sc.literal(" : ")) {
+    // multiplexed signal
+    if (!(sc.literal(" ") && sc.word())) return false;
+    sc.skip(' ');
+    if (!sc.literal(": ")) return false;
+  }
+  if (!(sc.digits(&t.start_bit) && sc.literal("|") && sc.digits(&t.size) && sc.literal("@") && sc.digits(&t.byte_order))) return false;
+  if (sc.at_end() || (line[sc.pos] != '+' && line[sc.pos] != '|' && line[sc.pos] != '-')) return false;
+  t.sign = line[sc.pos++];
+  if (!(sc.literal(" (") && sc.number(&t.factor) && sc.literal(",") && sc.number(&t.offset) && sc.literal(") ["))) return false;
+  if (!(sc.number() && sc.literal("|") && sc.number() && sc.literal("] \""))) return false;
+  // unit, then receivers
+  return sc.find_on_line("\" ", sc.pos) != std::string::npos;
+}
+
+bool scan_val(const std::string &line, std::string &address, std::string &name, std::string &defvals) {
+  for (size_t start = line.find("VAL_ "); start != std::string::npos; start = line.find("VAL_ ", start + 1)) {
+    LineScanner sc(line, start);
+    if (!(sc.literal("VAL_ ") && sc.word(&address) && sc.literal(" ") && sc.word(&name) && sc.literal(" "))) continue;
+
+    const size_t defvals_start = sc.pos;
+    sc.span(LineScanner::is_space);
+    if (!sc.at_end() && (line[sc.pos] == '-' || line[sc.pos] == '+')) sc.pos++;
+    if (!(sc.digits() && sc.span(LineScanner::is_space) && sc.literal("\""))) continue;
+
+    // lazy .+? up to the closing quote
+    const size_t close = sc.pos + 1 <= line.size() ? sc.find_on_line("\"", sc.pos + 1) : std::string::npos;
+    if (close == std::string::npos || sc.pos == close) continue;
+    const size_t semicolon = line.find(';', close + 1);
+    const size_t defvals_end = semicolon == std::string::npos ? line.size() : semicolon;
+    defvals.assign(line, defvals_start, defvals_end - defvals_start);
+    return true;
+  }
+  return false;
+}
+
+// split on runs of quotes, dropping an empty trailing piece
+std::vector<std::string> split_quoted(const std::string &s) {
+  std::vector<std::string> words;
+  size_t start = 0;
+  for (size_t i = 0; i < s.size(); ) {
+    if (s[i] == '"') {
+      words.emplace_back(s, start, i - start);
+      while (i < s.size() && s[i] == '"') i++;
+      start = i;
+    } else {
+      i++;
+    }
+  }
+  if (start < s.size() || words.empty()) {
+    words.emplace_back(s, start, s.size() - start);
+  }
+  return words;
+}
+
 ChecksumState* get_checksum(const std::string& dbc_name) {
   ChecksumState* s = nullptr;
   if (startswith(dbc_name, {"honda_", "acura_"})) {
@@ -99,6 +241,25 @@ void set_signal_type(Signal& s, ChecksumState* chk, const std::string& dbc_name,
   }
 }
 
+void set_signal_plan(Signal &s) {
+  const int lsb_byte = s.lsb / 8;
+  const int msb_byte = s.msb / 8;
+  s.mask = s.size < 64 ? (1ULL << s.size) - 1 : ~0ULL;
+  s.byte_aligned = s.size == 8 && (s.lsb % 8) == 0;
+  if (s.is_little_endian) {
+    s.window_byte = lsb_byte;
+    s.window_shift = s.lsb % 8;
+    s.last_byte = msb_byte;
+    s.in_window = s.window_shift + s.size <= 64;
+  } else {
+    // big endian: the window is read byte-swapped, msb byte ends up on top
+    s.window_byte = msb_byte;
+    s.window_shift = (7 - (lsb_byte - msb_byte)) * 8 + (s.lsb % 8);
+    s.last_byte = lsb_byte;
+    s.in_window = lsb_byte - msb_byte < 8;
+  }
+}
+
 DBC* dbc_parse_from_stream(const std::string &dbc_name, std::istream &stream, ChecksumState *checksum, bool allow_duplicate_msg_name) {
   uint32_t address = 0;
   std::set<uint32_t> address_set;
@@ -107,7 +268,6 @@ DBC* dbc_parse_from_stream(const std::string &dbc_name, std::istream &stream, Ch
   std::map<uint32_t, std::vector<Signal>> signals;
   DBC* dbc = new DBC;
   dbc->name = dbc_name;
-  std::setlocale(LC_NUMERIC, "C");
 
   // used to find big endian LSB from MSB and size
   std::vector<int> be_bits;
@@ -119,20 +279,20 @@ DBC* dbc_parse_from_stream(const std::string &dbc_name, std::istream &stream, Ch
 
   std::string line;
   int line_num = 0;
-  std::smatch match;
-  // TODO: see if we can speed up the regex statements in this loop, SG_ is specifically the slowest
+  std::string tok_address, tok_name, tok_size;
+  SignalTokens sig_tokens;
   while (std::getline(stream, line)) {
     line = trim(line);
     line_num += 1;
     if (startswith(line, "BO_ ")) {
       // new group
-      bool ret = std::regex_match(line, match, bo_regexp);
+      bool ret = scan_bo(line, tok_address, tok_name, tok_size);
       DBC_ASSERT(ret, "bad BO: " << line);
 
       Msg& msg = dbc->msgs.emplace_back();
-      address = msg.address = std::stoul(match[1].str());  // could be hex
-      msg.name = match[2].str();
-      msg.size = std::stoul(match[3].str());
+      address = msg.address = std::stoul(tok_address);  // could be hex
+      msg.name = tok_name;
+      msg.size = std::stoul(tok_size);
 
       // check for duplicates
       DBC_ASSERT(address_set.find(address) == address_set.end(), "Duplicate message address: " << address << " (" << msg.name << ")");
@@ -144,20 +304,17 @@ DBC* dbc_parse_from_stream(const std::string &dbc_name, std::istream &stream, Ch
       }
     } else if (startswith(line, "SG_ ")) {
       // new signal
-      int offset = 0;
-      if (!std::regex_search(line, match, sg_regexp)) {
-        bool ret = std::regex_search(line, match, sgm_regexp);
-        DBC_ASSERT(ret, "bad SG: " << line);
-        offset = 1;
-      }
+      bool ret = scan_sg(line, sig_tokens);
+      DBC_ASSERT(ret, "bad SG: " << line);
+
       Signal& sig = signals[address].emplace_back();
-      sig.name = match[1].str();
-      sig.start_bit = std::stoi(match[offset + 2].str());
-      sig.size = std::stoi(match[offset + 3].str());
-      sig.is_little_endian = std::stoi(match[offset + 4].str()) == 1;
-      sig.is_signed = match[offset + 5].str() == "-";
-      sig.factor = std::stod(match[offset + 6].str());
-      sig.offset = std::stod(match[offset + 7].str());
+      sig.name = sig_tokens.name;
+      sig.start_bit = std::stoi(sig_tokens.start_bit);
+      sig.size = std::stoi(sig_tokens.size);
+      sig.is_little_endian = std::stoi(sig_tokens.byte_order) == 1;
+      sig.is_signed = sig_tokens.sign == '-';
+      sig.factor = parse_double(sig_tokens.factor);
+      sig.offset = parse_double(sig_tokens.offset);
       set_signal_type(sig, checksum, dbc_name, line_num);
       if (sig.is_little_endian) {
         sig.lsb = sig.start_bit;
@@ -168,23 +325,23 @@ DBC* dbc_parse_from_stream(const std::string &dbc_name, std::istream &stream, Ch
         sig.msb = sig.start_bit;
       }
       DBC_ASSERT(sig.lsb < (64 * 8) && sig.msb < (64 * 8), "Signal out of bounds: " << line);
+      set_signal_plan(sig);
 
       // Check for duplicate signal names
       DBC_ASSERT(signal_name_sets[address].find(sig.name) == signal_name_sets[address].end(), "Duplicate signal name: " << sig.name);
       signal_name_sets[address].insert(sig.name);
     } else if (startswith(line, "VAL_ ")) {
       // new signal value/definition
-      bool ret = std::regex_search(line, match, val_regexp);
+      std::string defvals;
+      bool ret = scan_val(line, tok_address, tok_name, defvals);
       DBC_ASSERT(ret, "bad VAL: " << line);
 
       auto& val = dbc->vals.emplace_back();
-      val.address = std::stoul(match[1].str());  // could be hex
-      val.name = match[2].str();
+      val.address = std::stoul(tok_address);  // could be hex
+      val.name = tok_name;
 
-      auto defvals = match[3].str();
-      std::sregex_token_iterator it{defvals.begin(), defvals.end(), val_split_regexp, -1};
       // convert strings to UPPER_CASE_WITH_UNDERSCORES
-      std::vector<std::string> words{it, {}};
+      std::vector<std::string> words = split_quoted(defvals);
       for (auto& w : words) {
         w = trim(w);
         std::transform(w.begin(), w.end(), w.begin(), ::toupper);
@@ -198,14 +355,14 @@ DBC* dbc_parse_from_stream(const std::string &dbc_name, std::istream &stream, Ch
     }
   }
 
+  for (auto& v : dbc->vals) {
+    v.sigs = signals[v.address];
+  }
   for (auto& m : dbc->msgs) {
-    m.sigs = signals[m.address];
+    m.sigs = std::move(signals[m.address]);
     dbc->addr_to_msg[m.address] = &m;
     dbc->name_to_msg[m.name] = &m;
   }
-  for (auto& v : dbc->vals) {
-    v.sigs = signals[v.address];
-  }
   return dbc;
 }
 
@@ -228,21 +385,114 @@ const std::string get_dbc_root_path() {
   }
 }
 
+namespace {
+
+struct CachedDBC {
+  uint64_t id;
+  std::shared_future<DBC*> dbc;
+};
+
+std::mutex dbcs_lock;
+uint64_t next_dbc_id = 0;
+// DBCs by the name they were looked up with, the name is only resolved to a
+// file the first time it's looked up
+std::map<std::string, CachedDBC> loaded_dbcs;
+// invalidated DBCs are kept alive, parsers and packers may still use them
+std::vector<std::shared_future<DBC*>> retired_dbcs;
+
+void retire_dbc(std::map<std::string, CachedDBC>::iterator it) {
+  retired_dbcs.push_back(it->second.dbc);
+  loaded_dbcs.erase(it);
+}
+
+}  // namespace
+
 const DBC* dbc_lookup(const std::string& dbc_name) {
-  static std::mutex lock;
-  static std::map<std::string, DBC*> dbcs;
+  // the first caller of a DBC parses it outside the lock, while concurrent
+  // callers of the same DBC wait on its future
+  std::promise<DBC*> parsed;
+  std::shared_future<DBC*> dbc;
+  {
+    std::unique_lock lk(dbcs_lock);
+    auto it = loaded_dbcs.find(dbc_name);
+    if (it != loaded_dbcs.end()) {
+      dbc = it->second.dbc;
+    } else {
+      const uint64_t id = next_dbc_id++;
+      dbc = parsed.get_future().share();
+      loaded_dbcs.emplace(dbc_name, CachedDBC{id, dbc});
+      lk.unlock();
 
-  std::string dbc_file_path = dbc_name;
-  if (!std::filesystem::exists(dbc_file_path)) {
-    dbc_file_path = get_dbc_root_path() + "/" + dbc_name + ".dbc";
+      try {
+        std::string dbc_file_path = dbc_name;
+        if (!std::filesystem::exists(dbc_file_path)) {
+          dbc_file_path = get_dbc_root_path() + "/" + dbc_name + ".dbc";
+        }
+        parsed.set_value(dbc_parse_cached(dbc_file_path));
+      } catch (...) {
+        // don't keep failures around, the next lookup tries again
+        lk.lock();
+        it = loaded_dbcs.find(dbc_name);
+        if (it != loaded_dbcs.end() && it->second.id == id) {
+          loaded_dbcs.erase(it);
+        }
+        parsed.set_exception(std::current_exception());
+      }
+    }
+  }
+  return dbc.get();
+}
+
+void dbc_invalidate(const std::string& dbc_name) {
+  std::unique_lock lk(dbcs_lock);
+  auto it = loaded_dbcs.find(dbc_name);
+  if (it != loaded_dbcs.end()) {
+    retire_dbc(it);
+  }
+}
+
+void dbc_invalidate_all() {
+  std::unique_lock lk(dbcs_lock);
+  while (!loaded_dbcs.empty()) {
+    retire_dbc(loaded_dbcs.begin());
+  }
+}
+
+const DBC* dbc_reload(const std::string& dbc_name) {
+  dbc_invalidate(dbc_name);
+  return dbc_lookup(dbc_name);
+}
+
+void dbc_preload(const std::vector<std::string>& dbc_names, int workers) {
+  std::atomic<size_t> next = 0;
+  std::exception_ptr error;
+  std::mutex error_lock;
+
+  auto worker = [&]() {
+    for (size_t i = next++; i < dbc_names.size(); i = next++) {
+      try {
+        if (dbc_lookup(dbc_names[i]) == nullptr) {
+          throw std::runtime_error("Can't find DBC: " + dbc_names[i]);
+        }
+      } catch (...) {
+        std::unique_lock lk(error_lock);
+        if (!error) error = std::current_exception();
+      }
+    }
+  };
+
+  std::vector<std::thread> threads;
+  for (int i = 1; i < std::min<int>(workers, dbc_names.size()); i++) {
+    threads.emplace_back(worker);
+  }
+  worker();
+  for (auto &t : threads) {
+    t.join();
   }
 
-  std::unique_lock lk(lock);
-  auto it = dbcs.find(dbc_name);
-  if (it == dbcs.end()) {
-    it = dbcs.insert(it, {dbc_name, dbc_parse(dbc_file_path)});
+  if (error) {
+    std::rethrow_exception(error);
   }
-  return it->second;
 }
 
 std::vector<std::string> get_dbc_names() {
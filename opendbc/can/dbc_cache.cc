@@ -0,0 +1,339 @@
+#include <cstdlib>
+#include <cstring>
+#include <filesystem>
+#include <fstream>
+#include <memory>
+#include <sstream>
+#include <string>
+#include <thread>
+
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+
+#include "opendbc/can/common.h"
+#include "opendbc/can/common_dbc.h"
+
+// Binary cache of parsed DBCs. A cache file stores the DBC as parsed from
+// the source text, and is only used while the source's content hash and the
+// fingerprint of the build that wrote it match the ones recorded in the header.
+
+namespace {
+
+const uint32_t CACHE_MAGIC = 0x43424430;  // "0DBC"
+const uint32_t CACHE_VERSION = 2;
+
+// hash of the sources of the DBC parser, the signal plans and the cache format,
+// set by the SConscript. Caches written by a different build aren't loaded
+#ifndef DBC_CACHE_FINGERPRINT
+#define DBC_CACHE_FINGERPRINT 0
+#endif
+
+struct CacheHeader {
+  uint32_t magic;
+  uint32_t version;
+  uint64_t fingerprint;
+  uint64_t content_hash;
+};
+
+// checksum functions are stored by their index in this table
+unsigned int (* const checksum_functions[])(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) = {
+  nullptr,
+  &honda_checksum,
+  &toyota_checksum,
+  &subaru_checksum,
+  &chrysler_checksum,
+  &volkswagen_mqb_checksum,
+  &xor_checksum,
+  &hkg_can_fd_checksum,
+  &pedal_checksum,
+};
+const size_t num_checksum_functions = sizeof(checksum_functions) / sizeof(checksum_functions[0]);
+
+uint64_t fnv1a_hash(const char *data, size_t size, uint64_t h = 0xcbf29ce484222325ULL) {
+  for (size_t i = 0; i < size; i++) {
+    h = (h ^ (uint8_t)data[i]) * 0x100000001b3ULL;
+  }
+  return h;
+}
+
+// the cache is opt-in, only used while OPENDBC_CACHE_DIR is set and not empty
+std::string get_cache_dir() {
+  const char *dir = std::getenv("OPENDBC_CACHE_DIR");
+  return dir != NULL ? dir : "";
+}
+
+std::string get_cache_path(const std::string &dbc_path) {
+  const std::string cache_dir = get_cache_dir();
+  if (cache_dir.empty()) {
+    return "";
+  }
+
+  std::error_code ec;
+  const std::string abs_path = std::filesystem::absolute(dbc_path, ec);
+  if (ec) {
+    return "";
+  }
+  char key[17];
+  snprintf(key, sizeof(key), "%016llx", (unsigned long long)fnv1a_hash(abs_path.data(), abs_path.size()));
+  return cache_dir + "/" + std::string(std::filesystem::path(dbc_path).filename()) + "." + key + ".bin";
+}
+
+class Writer {
+public:
+  std::string buf;
+
+  template <class T>
+  void put(const T &v) {
+    buf.append((const char *)&v, sizeof(T));
+  }
+
+  void put(const std::string &s) {
+    put((uint32_t)s.size());
+    buf.append(s);
+  }
+
+  void put(const Signal &sig) {
+    put(sig.name);
+    put((int32_t)sig.start_bit);
+    put((int32_t)sig.msb);
+    put((int32_t)sig.lsb);
+    put((int32_t)sig.size);
+    put((uint8_t)sig.is_signed);
+    put(sig.factor);
+    put(sig.offset);
+    put((uint8_t)sig.is_little_endian);
+    put((uint8_t)sig.type);
+
+    uint8_t checksum_index = 0;
+    for (size_t i = 0; i < num_checksum_functions; i++) {
+      if (checksum_functions[i] == sig.calc_checksum) {
+        checksum_index = i;
+      }
+    }
+    put(checksum_index);
+  }
+
+  void put(const std::vector<Signal> &sigs) {
+    put((uint32_t)sigs.size());
+    for (const auto &sig : sigs) {
+      put(sig);
+    }
+  }
+};
+
+class Reader {
+public:
+  const char *pos;
+  const char *end;
+  bool ok = true;
+
+  Reader(const char *data, size_t size) : pos(data), end(data + size) {}
+
+  template <class T>
+  T get() {
+    T v{};
+    if (end - pos < (ptrdiff_t)sizeof(T)) {
+      ok = false;
+      return v;
+    }
+    memcpy(&v, pos, sizeof(T));
+    pos += sizeof(T);
+    return v;
+  }
+
+  std::string get_string() {
+    const uint32_t size = get<uint32_t>();
+    if (!ok || end - pos < (ptrdiff_t)size) {
+      ok = false;
+      return "";
+    }
+    std::string s(pos, size);
+    pos += size;
+    return s;
+  }
+
+  void get(Signal &sig) {
+    sig.name = get_string();
+    sig.start_bit = get<int32_t>();
+    sig.msb = get<int32_t>();
+    sig.lsb = get<int32_t>();
+    sig.size = get<int32_t>();
+    sig.is_signed = get<uint8_t>();
+    sig.factor = get<double>();
+    sig.offset = get<double>();
+    sig.is_little_endian = get<uint8_t>();
+    sig.type = (SignalType)get<uint8_t>();
+
+    const uint8_t checksum_index = get<uint8_t>();
+    if (checksum_index >= num_checksum_functions || sig.size < 1 || sig.size > 64 || sig.lsb < 0 || sig.msb < 0 ||
+        sig.lsb >= 64 * 8 || sig.msb >= 64 * 8) {
+      ok = false;
+      return;
+    }
+    sig.calc_checksum = checksum_functions[checksum_index];
+    set_signal_plan(sig);
+  }
+
+  void get(std::vector<Signal> &sigs) {
+    const uint32_t count = get<uint32_t>();
+    for (uint32_t i = 0; ok && i < count; i++) {
+      get(sigs.emplace_back());
+    }
+  }
+};
+
+std::string serialize_dbc(const DBC *dbc, const CacheHeader &header) {
+  Writer w;
+  w.put(header);
+  w.put(dbc->name);
+
+  w.put((uint32_t)dbc->msgs.size());
+  for (const auto &msg : dbc->msgs) {
+    w.put(msg.name);
+    w.put(msg.address);
+    w.put((uint32_t)msg.size);
+    w.put(msg.sigs);
+  }
+
+  w.put((uint32_t)dbc->vals.size());
+  for (const auto &val : dbc->vals) {
+    w.put(val.name);
+    w.put(val.address);
+    w.put(val.def_val);
+
+    // signals of a val are the ones of the message at that address, if there is one
+    const bool message_sigs = dbc->addr_to_msg.find(val.address) != dbc->addr_to_msg.end();
+    w.put((uint8_t)message_sigs);
+    if (!message_sigs) {
+      w.put(val.sigs);
+    }
+  }
+  return w.buf;
+}
+
+DBC* deserialize_dbc(const char *data, size_t size) {
+  Reader r(data + sizeof(CacheHeader), size - sizeof(CacheHeader));
+  std::unique_ptr<DBC> dbc(new DBC);
+  dbc->name = r.get_string();
+
+  const uint32_t num_msgs = r.get<uint32_t>();
+  for (uint32_t i = 0; r.ok && i < num_msgs; i++) {
+    Msg &msg = dbc->msgs.emplace_back();
+    msg.name = r.get_string();
+    msg.address = r.get<uint32_t>();
+    msg.size = r.get<uint32_t>();
+    r.get(msg.sigs);
+  }
+  for (auto &m : dbc->msgs) {
+    dbc->addr_to_msg[m.address] = &m;
+    dbc->name_to_msg[m.name] = &m;
+  }
+
+  const uint32_t num_vals = r.get<uint32_t>();
+  for (uint32_t i = 0; r.ok && i < num_vals; i++) {
+    Val &val = dbc->vals.emplace_back();
+    val.name = r.get_string();
+    val.address = r.get<uint32_t>();
+    val.def_val = r.get_string();
+    if (r.get<uint8_t>()) {
+      auto msg_it = dbc->addr_to_msg.find(val.address);
+      if (msg_it == dbc->addr_to_msg.end()) {
+        r.ok = false;
+        break;
+      }
+      val.sigs = msg_it->second->sigs;
+    } else {
+      r.get(val.sigs);
+    }
+  }
+
+  if (!r.ok || r.pos != r.end) {
+    return nullptr;
+  }
+  return dbc.release();
+}
+
+void write_cache(const std::string &cache_path, const std::string &data) {
+  std::error_code ec;
+  std::filesystem::create_directories(std::filesystem::path(cache_path).parent_path(), ec);
+  if (ec) {
+    return;
+  }
+
+  // write to a temporary file and rename, concurrent readers never see a partial cache
+  const std::string tmp_path = cache_path + ".tmp" + std::to_string(getpid()) + "." +
+                               std::to_string(std::hash<std::thread::id>{}(std::this_thread::get_id()));
+  {
+    std::ofstream out(tmp_path, std::ios::binary | std::ios::trunc);
+    if (!out.write(data.data(), data.size())) {
+      out.close();
+      unlink(tmp_path.c_str());
+      return;
+    }
+  }
+  if (rename(tmp_path.c_str(), cache_path.c_str()) != 0) {
+    unlink(tmp_path.c_str());
+  }
+}
+
+// maps the cache file and returns the DBC if it was written for this content by this build
+DBC* load_cache(const std::string &cache_path, uint64_t content_hash) {
+  int fd = open(cache_path.c_str(), O_RDONLY | O_CLOEXEC);
+  if (fd < 0) {
+    return nullptr;
+  }
+
+  DBC *dbc = nullptr;
+  struct stat cache_st;
+  if (fstat(fd, &cache_st) == 0 && cache_st.st_size > (off_t)sizeof(CacheHeader)) {
+    void *mem = mmap(NULL, cache_st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    if (mem != MAP_FAILED) {
+      const char *data = (const char *)mem;
+      CacheHeader header;
+      memcpy(&header, data, sizeof(header));
+      if (header.magic == CACHE_MAGIC && header.version == CACHE_VERSION &&
+          header.fingerprint == DBC_CACHE_FINGERPRINT && header.content_hash == content_hash) {
+        dbc = deserialize_dbc(data, cache_st.st_size);
+      }
+      munmap(mem, cache_st.st_size);
+    }
+  }
+  close(fd);
+  return dbc;
+}
+
+}  // namespace
+
+DBC* dbc_parse_cached(const std::string& dbc_path) {
+  // the source is always read and hashed, hashing is much cheaper than parsing
+  std::ifstream infile(dbc_path, std::ios::binary);
+  if (!infile) return nullptr;
+  std::string content((std::istreambuf_iterator<char>(infile)), std::istreambuf_iterator<char>());
+  const uint64_t content_hash = fnv1a_hash(content.data(), content.size());
+
+  const std::string cache_path = get_cache_path(dbc_path);
+  if (!cache_path.empty()) {
+    DBC *dbc = load_cache(cache_path, content_hash);
+    if (dbc != nullptr) {
+      return dbc;
+    }
+  }
+
+  const std::string dbc_name = std::filesystem::path(dbc_path).filename();
+  std::unique_ptr<ChecksumState> checksum(get_checksum(dbc_name));
+  std::istringstream stream(content);
+  DBC *dbc = dbc_parse_from_stream(dbc_name, stream, checksum.get());
+
+  if (!cache_path.empty()) {
+    CacheHeader header = {
+      .magic = CACHE_MAGIC,
+      .version = CACHE_VERSION,
+      .fingerprint = DBC_CACHE_FINGERPRINT,
+      .content_hash = content_hash,
+    };
+    write_cache(cache_path, serialize_dbc(dbc, header));
+  }
+  return dbc;
+}
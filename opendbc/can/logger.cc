@@ -0,0 +1,131 @@
+#include <cstdarg>
+#include <cstdio>
+#include <cstring>
+#include <ctime>
+#include <mutex>
+
+#include "opendbc/can/logger.h"
+
+namespace {
+
+struct LogState {
+  std::mutex mutex;
+  LogSink sink = nullptr;
+  void *ctx = nullptr;
+
+  // ring of captured messages, used while capture_capacity isn't 0
+  std::vector<LogRecord> captured;
+  size_t capture_capacity = 0;
+  size_t capture_start = 0;
+  size_t capture_count = 0;
+  size_t dropped = 0;
+};
+
+LogState &log_state() {
+  static LogState state;
+  return state;
+}
+
+uint64_t clock_nanos(clockid_t clock) {
+  timespec t;
+  clock_gettime(clock, &t);
+  return t.tv_sec * 1000000000ULL + t.tv_nsec;
+}
+
+void capture(LogState &state, int level, const char *message) {
+  LogRecord *record;
+  if (state.capture_count < state.capture_capacity) {
+    record = &state.captured[(state.capture_start + state.capture_count++) % state.capture_capacity];
+  } else {
+    // full, the oldest message is overwritten
+    record = &state.captured[state.capture_start];
+    state.capture_start = (state.capture_start + 1) % state.capture_capacity;
+    state.dropped++;
+  }
+  record->nanos = clock_nanos(CLOCK_MONOTONIC);
+  record->level = level;
+  strncpy(record->message, message, LOG_MESSAGE_SIZE - 1);
+  record->message[LOG_MESSAGE_SIZE - 1] = '\0';
+}
+
+}  // namespace
+
+void log_set_sink(LogSink sink, void *ctx) {
+  LogState &state = log_state();
+  std::lock_guard lk(state.mutex);
+  state.sink = sink;
+  state.ctx = ctx;
+}
+
+void log_capture(size_t capacity) {
+  LogState &state = log_state();
+  std::lock_guard lk(state.mutex);
+  state.captured.resize(capacity);
+  state.captured.shrink_to_fit();
+  state.capture_capacity = capacity;
+  state.capture_start = state.capture_count = state.dropped = 0;
+}
+
+size_t log_read_captured(std::vector<LogRecord> &records) {
+  LogState &state = log_state();
+  std::lock_guard lk(state.mutex);
+  for (size_t i = 0; i < state.capture_count; i++) {
+    records.push_back(state.captured[(state.capture_start + i) % state.capture_capacity]);
+  }
+  const size_t dropped = state.dropped;
+  state.capture_start = state.capture_count = state.dropped = 0;
+  return dropped;
+}
+
+bool log_rate_limit(LogRateLimit &rl, uint32_t burst, uint64_t millis, uint32_t &suppressed) {
+#ifdef CLOCK_MONOTONIC_COARSE
+  const uint64_t now = clock_nanos(CLOCK_MONOTONIC_COARSE) / 1000000;
+#else
+  const uint64_t now = clock_nanos(CLOCK_MONOTONIC) / 1000000;
+#endif
+
+  // a new window starts once the last one is over, only one thread resets the count
+  uint64_t start = rl.window_start.load(std::memory_order_relaxed);
+  if ((start == 0 || now - start >= millis) &&
+      rl.window_start.compare_exchange_strong(start, now, std::memory_order_relaxed)) {
+    rl.count.store(0, std::memory_order_relaxed);
+  }
+
+  if (rl.count.fetch_add(1, std::memory_order_relaxed) < burst) {
+    suppressed = rl.suppressed.exchange(0, std::memory_order_relaxed);
+    return true;
+  }
+  rl.suppressed.fetch_add(1, std::memory_order_relaxed);
+  return false;
+}
+
+void log_message(int level, uint32_t suppressed, const char *fmt, ...) {
+  char message[LOG_MESSAGE_SIZE];
+  va_list args;
+  va_start(args, fmt);
+  int len = vsnprintf(message, sizeof(message), fmt, args);
+  va_end(args);
+  if (suppressed > 0 && len >= 0 && len < (int)sizeof(message)) {
+    snprintf(message + len, sizeof(message) - len, " (%u similar messages suppressed)", suppressed);
+  }
+
+  // the lock isn't held for the I/O, a slow sink doesn't block other threads logging
+  LogSink sink;
+  void *ctx;
+  {
+    LogState &state = log_state();
+    std::lock_guard lk(state.mutex);
+    if (state.capture_capacity > 0) {
+      capture(state, level, message);
+      return;
+    }
+    sink = state.sink;
+    ctx = state.ctx;
+  }
+
+  if (sink != nullptr) {
+    sink(level, message, ctx);
+  } else {
+    printf("%s\n", message);
+  }
+}
@@ -1,5 +1,47 @@
 #pragma once
 
+#include <atomic>
+#include <cstddef>
+#include <cstdint>
+#include <vector>
+
+// Log messages of the library go to a sink, stdout by default. Rate limited
+// messages are dropped at their call site, so a burst of them costs a clock
+// read each and never any I/O.
+
+const size_t LOG_MESSAGE_SIZE = 256;  // longer messages are truncated
+
+struct LogRecord {
+  uint64_t nanos;  // CLOCK_MONOTONIC
+  int level;
+  char message[LOG_MESSAGE_SIZE];
+};
+
+typedef void (*LogSink)(int level, const char *message, void *ctx);
+
+// messages are passed to sink instead, from the thread logging them, so it can be
+// called by several threads at once. A call in progress may still use the previous
+// sink and ctx after this returns. nullptr prints them to stdout again
+void log_set_sink(LogSink sink, void *ctx);
+// keeps the last `capacity` messages in a ring buffer instead, read with
+// log_read_captured. 0 prints them to stdout again
+void log_capture(size_t capacity);
+// moves the captured messages to records, returns how many were overwritten
+// before they were read
+size_t log_read_captured(std::vector<LogRecord> &records);
+
+// state of a rate limited call site
+struct LogRateLimit {
+  std::atomic<uint64_t> window_start{0};
+  std::atomic<uint32_t> count{0};
+  std::atomic<uint32_t> suppressed{0};
+};
+
+// true if a message of the call site may be logged, at most burst of them
+// every millis. suppressed is set to the messages dropped since the last one
+bool log_rate_limit(LogRateLimit &rl, uint32_t burst, uint64_t millis, uint32_t &suppressed);
+void log_message(int level, uint32_t suppressed, const char *fmt, ...) __attribute__((format(printf, 3, 4)));
+
 #ifdef SWAGLOG
 // cppcheck-suppress preprocessorErrorDirective
 #include SWAGLOG
@@ -11,8 +53,14 @@
 #define CLOUDLOG_ERROR 40
 #define CLOUDLOG_CRITICAL 50
 
-#define cloudlog(lvl, fmt, ...) printf(fmt "\n", ## __VA_ARGS__)
-#define cloudlog_rl(burst, millis, lvl, fmt, ...) printf(fmt "\n", ##__VA_ARGS__)
+#define cloudlog(lvl, fmt, ...) log_message(lvl, 0, fmt, ## __VA_ARGS__)
+#define cloudlog_rl(burst, millis, lvl, fmt, ...) do {                 \
+    static LogRateLimit _log_rl;                                        \
+    uint32_t _log_suppressed;                                           \
+    if (log_rate_limit(_log_rl, burst, millis, _log_suppressed)) {      \
+      log_message(lvl, _log_suppressed, fmt, ## __VA_ARGS__);           \
+    }                                                                   \
+  } while (0)
 
 #define LOGD(fmt, ...) cloudlog(CLOUDLOG_DEBUG, fmt, ## __VA_ARGS__)
 #define LOG(fmt, ...) cloudlog(CLOUDLOG_INFO, fmt, ## __VA_ARGS__)
@@ -0,0 +1,224 @@
+#include <cerrno>
+#include <cstring>
+#include <sstream>
+#include <stdexcept>
+
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+
+#include "opendbc/can/common.h"
+
+namespace {
+
+const size_t MAX_FRAME_SIZE = 64;
+const uint32_t FRAME_EFF_MASK = 0x1FFFFFFFU;
+const uint32_t FRAME_ERR_FLAG = 0x20000000U;
+
+// binary log records: uint64 nanos, uint32 address, uint8 bus, uint8 size, then size bytes
+const size_t LOG_RECORD_HEADER_SIZE = 14;
+
+int hex_digit(char c) {
+  if (c >= '0' && c <= '9') return c - '0';
+  if (c >= 'A' && c <= 'F') return c - 'A' + 10;
+  if (c >= 'a' && c <= 'f') return c - 'a' + 10;
+  return -1;
+}
+
+// one line of candump -l, e.g. "(1436509052.249713) can0 123#DEADBEEF" or
+// "(1436509052.249713) can1 123##1DEADBEEF" for CAN FD. Remote and error frames
+// are skipped as valid lines without a frame
+bool parse_candump_line(const char *p, const char *end, bool &has_frame, uint64_t &nanos, uint32_t &address,
+                        uint8_t &bus, uint8_t *dat, uint8_t &size) {
+  has_frame = false;
+  if (p == end || *p != '(') {
+    return false;
+  }
+  p++;
+
+  uint64_t sec = 0;
+  const char *start = p;
+  for (; p < end && *p >= '0' && *p <= '9'; p++) sec = sec * 10 + (*p - '0');
+  if (p == start || p == end || *p != '.') {
+    return false;
+  }
+  p++;
+  uint64_t frac = 0;
+  int digits = 0;
+  for (; p < end && *p >= '0' && *p <= '9'; p++, digits++) {
+    if (digits < 9) frac = frac * 10 + (*p - '0');
+  }
+  for (int i = digits; i < 9; i++) frac *= 10;
+  if (p == end || *p != ')') {
+    return false;
+  }
+  nanos = sec * 1000000000ULL + frac;
+  p++;
+
+  // interface, the bus is the number it ends with
+  for (; p < end && *p == ' '; p++) {}
+  start = p;
+  for (; p < end && *p != ' '; p++) {}
+  if (p == start) {
+    return false;
+  }
+  const char *digit = p;
+  for (; digit > start && digit[-1] >= '0' && digit[-1] <= '9'; digit--) {}
+  int ibus = 0;
+  for (const char *d = digit; d < p; d++) ibus = std::min(ibus * 10 + (*d - '0'), 255);
+  bus = ibus;
+
+  for (; p < end && *p == ' '; p++) {}
+  uint32_t id = 0;
+  start = p;
+  for (int v; p < end && (v = hex_digit(*p)) >= 0; p++) id = (id << 4) | v;
+  const long id_digits = p - start;
+  if (id_digits == 0 || id_digits > 8 || p == end || *p != '#') {
+    return false;
+  }
+  p++;
+  if (id_digits == 8 && (id & FRAME_ERR_FLAG) != 0) {
+    return true;  // error frames are printed with the flag in their id
+  }
+
+  const bool fd = p < end && *p == '#';
+  if (fd) {
+    if (end - p < 2 || hex_digit(p[1]) < 0) {
+      return false;
+    }
+    p += 2;  // flags nibble
+  } else if (p < end && *p == 'R') {
+    return true;
+  }
+
+  size = 0;
+  for (int hi, lo; p + 1 < end && (hi = hex_digit(p[0])) >= 0 && (lo = hex_digit(p[1])) >= 0; p += 2) {
+    if (size == MAX_FRAME_SIZE) {
+      return false;
+    }
+    dat[size++] = (hi << 4) | lo;
+  }
+  if (p < end && hex_digit(*p) >= 0) {
+    return false;  // odd number of digits
+  }
+
+  address = id & FRAME_EFF_MASK;
+  has_frame = true;
+  return true;
+}
+
+}  // namespace
+
+CANLogReader::CANLogReader(const std::string &path) {
+  const int fd = open(path.c_str(), O_RDONLY | O_CLOEXEC);
+  if (fd < 0) {
+    throw std::runtime_error("Can't open " + path + ": " + strerror(errno));
+  }
+
+  struct stat st;
+  if (fstat(fd, &st) != 0) {
+    const std::string reason = strerror(errno);
+    close(fd);
+    throw std::runtime_error("Can't open " + path + ": " + reason);
+  }
+  size = st.st_size;
+  if (size > 0) {
+    void *mem = mmap(NULL, size, PROT_READ, MAP_PRIVATE, fd, 0);
+    if (mem == MAP_FAILED) {
+      const std::string reason = strerror(errno);
+      close(fd);
+      throw std::runtime_error("Can't map " + path + ": " + reason);
+    }
+    data = (const char *)mem;
+    madvise(mem, size, MADV_SEQUENTIAL);
+  }
+  close(fd);
+
+  binary = size >= sizeof(LOG_MAGIC) - 1 && memcmp(data, LOG_MAGIC, sizeof(LOG_MAGIC) - 1) == 0;
+  pos = binary ? sizeof(LOG_MAGIC) - 1 : 0;
+}
+
+CANLogReader::~CANLogReader() {
+  if (data != nullptr) {
+    munmap((void *)data, size);
+  }
+}
+
+size_t CANLogReader::read(size_t capacity, uint64_t *nanos, uint32_t *addresses, uint8_t *buses, uint8_t *dlcs,
+                          uint8_t *dat, size_t &stride) {
+  // rows of MAX_FRAME_SIZE bytes, compacted to the longest frame once the chunk is read
+  size_t count = 0;
+  size_t max_size = 0;
+  while (count < capacity && pos < size) {
+    uint8_t *row = dat + count * MAX_FRAME_SIZE;
+    if (binary) {
+      if (size - pos < LOG_RECORD_HEADER_SIZE) {
+        truncated = true;
+        pos = size;
+        break;
+      }
+      const char *record = data + pos;
+      memcpy(&nanos[count], record, 8);
+      memcpy(&addresses[count], record + 8, 4);
+      buses[count] = record[12];
+      dlcs[count] = record[13];
+      if (dlcs[count] > MAX_FRAME_SIZE) {
+        // the frames read before it are returned, the next read reports it
+        if (count > 0) {
+          break;
+        }
+        std::stringstream is;
+        is << "Invalid log record at offset " << pos << ": " << (int)dlcs[count] << " bytes";
+        throw std::runtime_error(is.str());
+      }
+      if (size - pos - LOG_RECORD_HEADER_SIZE < dlcs[count]) {
+        truncated = true;
+        pos = size;
+        break;
+      }
+      memcpy(row, record + LOG_RECORD_HEADER_SIZE, dlcs[count]);
+      pos += LOG_RECORD_HEADER_SIZE + dlcs[count];
+    } else {
+      const char *line = data + pos;
+      const char *line_end = (const char *)memchr(line, '\n', size - pos);
+      if (line_end == nullptr) {
+        line_end = data + size;
+      }
+      pos = line_end - data + 1;
+
+      const char *content_end = line_end > line && line_end[-1] == '\r' ? line_end - 1 : line_end;
+      if (content_end == line) {
+        continue;
+      }
+      bool has_frame;
+      if (!parse_candump_line(line, content_end, has_frame, nanos[count], addresses[count], buses[count], row,
+                              dlcs[count])) {
+        skipped_lines++;
+        continue;
+      }
+      if (!has_frame) {
+        continue;
+      }
+    }
+    max_size = std::max<size_t>(max_size, dlcs[count]);
+    count++;
+  }
+  pos = std::min(pos, size);
+
+  stride = std::max<size_t>(max_size, 1);
+  for (size_t i = 0; i < count; i++) {
+    uint8_t *row = dat + i * stride;
+    memmove(row, dat + i * MAX_FRAME_SIZE, dlcs[i]);
+    memset(row + dlcs[i], 0, stride - dlcs[i]);
+  }
+
+  // the parsed part of the file won't be read again, drop its pages
+  const size_t page_size = sysconf(_SC_PAGESIZE);
+  const size_t release_end = pos / page_size * page_size;
+  if (release_end > released) {
+    madvise((void *)(data + released), release_end - released, MADV_DONTNEED);
+    released = release_end;
+  }
+  return count;
+}
@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import struct
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from opendbc.can.parser_pyx import CANDecoder, CANLogReader, preload_dbcs  # pylint: disable=no-name-in-module, import-error
+assert CANLogReader
+
+LOG_MAGIC = b"ODBCLOG1"
+LOG_RECORD = struct.Struct("<QIBB")
+
+# per segment: frames read, size of the log, seconds spent and the worker's pid
+DecodeStats = namedtuple("DecodeStats", ["frames", "bytes", "seconds", "pid"])
+
+_worker_args = None
+
+
+def write_log(path, frames):
+  # writes a binary log read by CANLogReader, frames: [(nanos, address, dat, bus), ...]
+  with open(path, "wb") as f:
+    f.write(LOG_MAGIC)
+    for nanos, address, dat, bus in frames:
+      f.write(LOG_RECORD.pack(nanos, address, bus, len(dat)))
+      f.write(dat)
+
+
+def merge_decoded(results):
+  # concatenates the outputs of decode, in order: {(message, signal): (ts_nanos, values)}
+  results = list(results)
+  if not results:
+    return {}
+  return {key: (np.concatenate([r[key][0] for r in results]), np.concatenate([r[key][1] for r in results]))
+          for key in results[0]}
+
+
+def decode_log(dbc_name, signals, path, bus=0, chunk_frames=65536):
+  # decodes a whole log with a new decoder, returns ({(message, signal): (ts_nanos, values)}, DecodeStats)
+  start = time.perf_counter()
+  decoder = CANDecoder(dbc_name, signals, bus)
+  reader = CANLogReader(path, chunk_frames)
+  chunks = []
+  frames = 0
+  for chunk in reader:
+    frames += len(chunk[0])
+    chunks.append(decoder.decode(*chunk))
+
+  decoded = merge_decoded(chunks) if chunks else decoder.decode(*_empty_chunk())
+  return decoded, DecodeStats(frames, os.path.getsize(path), time.perf_counter() - start, os.getpid())
+
+
+def decode_logs(dbc_name, signals, paths, bus=0, processes=None, chunk_frames=65536, output_dir=None):
+  # decodes logs, e.g. the segments of a route, on a process pool and yields
+  # (path, result, DecodeStats) for each log in the order of paths. The result
+  # is the log's decoded columns, or the .npz file they're written to in output_dir.
+  # The DBC is loaded before the workers are forked so they share it, where
+  # processes are spawned instead they load it from the DBC cache, if it's enabled
+  paths = [os.fspath(p) for p in paths]
+  preload_dbcs([dbc_name], 1)
+  if output_dir is not None:
+    os.makedirs(output_dir, exist_ok=True)
+
+  methods = multiprocessing.get_all_start_methods()
+  ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+  args = (dbc_name, list(signals), bus, chunk_frames, output_dir)
+  with ctx.Pool(processes, initializer=_init_worker, initargs=(args,)) as pool:
+    for path, (result, stats) in zip(paths, pool.imap(_decode_worker, enumerate(paths))):
+      yield path, result, stats
+
+
+def _empty_chunk():
+  return (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint8),
+          np.empty(0, dtype=np.uint8), np.empty((0, 1), dtype=np.uint8))
+
+
+def _init_worker(args):
+  global _worker_args
+  _worker_args = args
+
+
+def _decode_worker(shard):
+  index, path = shard
+  dbc_name, signals, bus, chunk_frames, output_dir = _worker_args
+  decoded, stats = decode_log(dbc_name, signals, path, bus, chunk_frames)
+  if output_dir is None:
+    return decoded, stats
+
+  # prefixed with the shard index, segments of a route share their basename.
+  # columns are stored as "<message>.<signal>.ts" and "<message>.<signal>.values"
+  out = os.path.join(output_dir, f"{index}_{os.path.basename(path)}.npz")
+  columns = {}
+  for (msg, sig), (ts, values) in decoded.items():
+    columns[f"{msg}.{sig}.ts"] = ts
+    columns[f"{msg}.{sig}.values"] = values
+  np.savez(out, **columns)
+  return out, stats
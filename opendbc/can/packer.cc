@@ -1,7 +1,9 @@
 #include <algorithm>
 #include <cassert>
 #include <cmath>
+#include <cstring>
 #include <map>
+#include <sstream>
 #include <stdexcept>
 #include <utility>
 
@@ -9,6 +11,20 @@
 
 
 void set_value(std::vector<uint8_t> &msg, const Signal &sig, int64_t ival) {
+  if (sig.last_byte < msg.size()) {
+    if (sig.byte_aligned) {
+      msg[sig.window_byte] = ival;
+      return;
+    }
+    if (sig.in_window) {
+      uint64_t w = read_window(msg.data(), msg.size(), sig);
+      w &= ~(sig.mask << sig.window_shift);
+      w |= (ival & sig.mask) << sig.window_shift;
+      write_window(msg.data(), msg.size(), sig, w);
+      return;
+    }
+  }
+
   int i = sig.lsb / 8;
   int bits = sig.size;
   if (sig.size < 64) {
@@ -32,71 +48,187 @@ CANPacker::CANPacker(const std::string& dbc_name) {
   dbc = dbc_lookup(dbc_name);
   assert(dbc);
 
+  // index the DBC's own signals, DBCs are never freed
+  size_t num_signals = 0;
   for (const auto& msg : dbc->msgs) {
+    num_signals += msg.sigs.size();
+  }
+  signal_lookup.reserve(num_signals);
+  messages.resize(dbc->msgs.size());
+  for (size_t i = 0; i < dbc->msgs.size(); i++) {
+    const Msg &msg = dbc->msgs[i];
     for (const auto& sig : msg.sigs) {
-      signal_lookup[std::make_pair(msg.address, sig.name)] = sig;
+      signal_lookup[{msg.address, sig.name}] = &sig;
+    }
+    messages[i].counter_sig = lookup_signal(msg.address, "COUNTER");
+    messages[i].checksum_sig = lookup_signal(msg.address, "CHECKSUM");
+    if (messages[i].checksum_sig != nullptr && messages[i].checksum_sig->calc_checksum == nullptr) {
+      messages[i].checksum_sig = nullptr;
     }
   }
 }
 
-std::vector<uint8_t> CANPacker::pack(uint32_t address, const std::vector<SignalPackValue> &signals) {
+void set_physical_value(std::vector<uint8_t> &msg, const Signal &sig, double value) {
+  int64_t ival = (int64_t)(round((value - sig.offset) / sig.factor));
+  if (ival < 0) {
+    ival = (1ULL << sig.size) + ival;
+  }
+  set_value(msg, sig, ival);
+}
+
+const Signal* CANPacker::lookup_signal(uint32_t address, std::string_view name) const {
+  auto sig_it = signal_lookup.find({address, name});
+  return sig_it != signal_lookup.end() ? sig_it->second : nullptr;
+}
+
+CANPacker::MessagePackState* CANPacker::lookup_state(uint32_t address) {
   auto msg_it = dbc->addr_to_msg.find(address);
-  if (msg_it == dbc->addr_to_msg.end()) {
+  return msg_it != dbc->addr_to_msg.end() ? &messages[msg_it->second - dbc->msgs.data()] : nullptr;
+}
+
+void CANPacker::set_counter_and_checksum(uint32_t address, MessagePackState &state, std::vector<uint8_t> &ret, bool counter_set) {
+  // set message counter
+  if (!counter_set && state.counter_sig != nullptr) {
+    set_value(ret, *state.counter_sig, state.counter);
+    state.counter = (state.counter + 1) % (1 << state.counter_sig->size);
+  }
+
+  // set message checksum
+  if (state.checksum_sig != nullptr) {
+    unsigned int checksum = state.checksum_sig->calc_checksum(address, *state.checksum_sig, ret.data(), ret.size());
+    set_value(ret, *state.checksum_sig, checksum);
+  }
+}
+
+std::vector<uint8_t> CANPacker::pack(uint32_t address, const std::vector<SignalPackValue> &signals) {
+  MessagePackState *state = lookup_state(address);
+  if (state == nullptr) {
+    stats.undefined_addresses++;
     LOGE("undefined address %d", address);
     return {};
   }
 
-  std::vector<uint8_t> ret(msg_it->second->size, 0);
+  std::vector<uint8_t> ret(dbc->addr_to_msg.at(address)->size, 0);
 
   // set all values for all given signal/value pairs
   bool counter_set = false;
   for (const auto& sigval : signals) {
-    auto sig_it = signal_lookup.find(std::make_pair(address, sigval.name));
-    if (sig_it == signal_lookup.end()) {
+    const Signal *sig = lookup_signal(address, sigval.name);
+    if (sig == nullptr) {
       // TODO: do something more here. invalid flag like CANParser?
-      LOGE("undefined signal %s - %d\n", sigval.name.c_str(), address);
+      stats.undefined_signals++;
+      LOGE("undefined signal %s - %d", sigval.name.c_str(), address);
       continue;
     }
-    const auto &sig = sig_it->second;
-
-    int64_t ival = (int64_t)(round((sigval.value - sig.offset) / sig.factor));
-    if (ival < 0) {
-      ival = (1ULL << sig.size) + ival;
-    }
-    set_value(ret, sig, ival);
+    set_physical_value(ret, *sig, sigval.value);
 
-    if (sigval.name == "COUNTER") {
-      counters[address] = sigval.value;
+    if (sig == state->counter_sig) {
+      state->counter = sigval.value;
       counter_set = true;
     }
   }
 
-  // set message counter
-  auto sig_it_counter = signal_lookup.find(std::make_pair(address, "COUNTER"));
-  if (!counter_set && sig_it_counter != signal_lookup.end()) {
-    const auto& sig = sig_it_counter->second;
+  set_counter_and_checksum(address, *state, ret, counter_set);
+  state->frames++;
+  stats.frames++;
+  stats.bytes += ret.size();
+  return ret;
+}
 
-    if (counters.find(address) == counters.end()) {
-      counters[address] = 0;
-    }
-    set_value(ret, sig, counters[address]);
-    counters[address] = (counters[address] + 1) % (1 << sig.size);
+void CANPacker::pack(const std::vector<SignalPackMessage> &msgs, std::vector<std::vector<uint8_t>> &out) {
+  out.reserve(out.size() + msgs.size());
+  for (const auto &msg : msgs) {
+    out.push_back(pack(msg.address, msg.values));
   }
+}
 
-  // set message checksum
-  auto sig_it_checksum = signal_lookup.find(std::make_pair(address, "CHECKSUM"));
-  if (sig_it_checksum != signal_lookup.end()) {
-    const auto &sig = sig_it_checksum->second;
-    if (sig.calc_checksum != nullptr) {
-      unsigned int checksum = sig.calc_checksum(address, sig, ret);
-      set_value(ret, sig, checksum);
+PreparedMessage CANPacker::prepare(uint32_t address, const std::vector<std::string> &signal_names) {
+  MessagePackState *state = lookup_state(address);
+  if (state == nullptr) {
+    std::stringstream is;
+    is << "CANPacker: could not find message 0x" << std::hex << address << " in DBC " << dbc->name;
+    throw std::runtime_error(is.str());
+  }
+
+  PreparedMessage msg = {};
+  msg.address = address;
+  msg.size = dbc->addr_to_msg.at(address)->size;
+  msg.counter_index = -1;
+  for (const auto &name : signal_names) {
+    const Signal *sig = lookup_signal(address, name);
+    if (sig == nullptr) {
+      std::stringstream is;
+      is << "CANPacker: could not find signal " << name << " in message 0x" << std::hex << address;
+      throw std::runtime_error(is.str());
+    }
+    if (sig == state->counter_sig) {
+      msg.counter_index = msg.sigs.size();
     }
+    msg.sigs.push_back(sig);
   }
+  msg.counter_sig = state->counter_sig;
+  msg.checksum_sig = state->checksum_sig;
+  msg.counter = &state->counter;
+  msg.frames = &state->frames;
+  return msg;
+}
 
-  return ret;
+void CANPacker::pack(const PreparedMessage &msg, const double *values, std::vector<uint8_t> &ret) {
+  ret.assign(msg.size, 0);
+  for (size_t i = 0; i < msg.sigs.size(); i++) {
+    set_physical_value(ret, *msg.sigs[i], values[i]);
+  }
+
+  if (msg.counter_index != -1) {
+    *msg.counter = values[msg.counter_index];
+  } else if (msg.counter_sig != nullptr) {
+    set_value(ret, *msg.counter_sig, *msg.counter);
+    *msg.counter = (*msg.counter + 1) % (1 << msg.counter_sig->size);
+  }
+
+  if (msg.checksum_sig != nullptr) {
+    unsigned int checksum = msg.checksum_sig->calc_checksum(msg.address, *msg.checksum_sig, ret.data(), ret.size());
+    set_value(ret, *msg.checksum_sig, checksum);
+  }
+  (*msg.frames)++;
+  stats.frames++;
+  stats.bytes += msg.size;
+}
+
+void CANPacker::pack(uint32_t address, const std::vector<SignalPackColumn> &columns, size_t count, uint8_t *out) {
+  std::vector<std::string> names;
+  for (const auto& column : columns) {
+    names.push_back(column.name);
+  }
+  const PreparedMessage msg = prepare(address, names);
+
+  std::vector<double> values(columns.size());
+  std::vector<uint8_t> ret;
+  for (size_t i = 0; i < count; i++) {
+    for (size_t j = 0; j < columns.size(); j++) {
+      values[j] = columns[j].values[i];
+    }
+    pack(msg, values.data(), ret);
+    memcpy(out + i * msg.size, ret.data(), msg.size);
+  }
 }
 
 // This function has a definition in common.h and is used in PlotJuggler
 const Msg* CANPacker::lookup_message(uint32_t address) {
   return dbc->addr_to_msg.at(address);
 }
+
+void CANPacker::get_message_frames(std::vector<std::pair<uint32_t, uint64_t>> &frames) const {
+  for (size_t i = 0; i < messages.size(); i++) {
+    if (messages[i].frames != 0) {
+      frames.emplace_back(dbc->msgs[i].address, messages[i].frames);
+    }
+  }
+}
+
+void CANPacker::reset_stats() {
+  stats = {};
+  for (auto &state : messages) {
+    state.frames = 0;
+  }
+}
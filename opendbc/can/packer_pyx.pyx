@@ -1,11 +1,15 @@
 # distutils: language = c++
 # cython: c_string_encoding=ascii, language_level=3
 
-from libc.stdint cimport uint8_t, uint32_t
+from libc.stdint cimport uint8_t, uint32_t, uint64_t
+from libcpp.pair cimport pair
+from libcpp.string cimport string
 from libcpp.vector cimport vector
 
-from .common cimport CANPacker as cpp_CANPacker
-from .common cimport dbc_lookup, SignalPackValue, DBC, Msg
+from .common cimport CANPacker as cpp_CANPacker, PreparedMessage as cpp_PreparedMessage
+from .common cimport dbc_lookup, SignalPackValue, SignalPackMessage, SignalPackColumn, DBC, Msg
+
+import numpy as np
 
 
 cdef class CANPacker:
@@ -24,8 +28,7 @@ cdef class CANPacker:
     if self.packer:
       del self.packer
 
-  cdef vector[uint8_t] pack(self, addr, values):
-    cdef vector[SignalPackValue] values_thing
+  cdef fill_values(self, values, vector[SignalPackValue] &values_thing):
     values_thing.reserve(len(values))
     cdef SignalPackValue spv
 
@@ -34,20 +37,134 @@ cdef class CANPacker:
       spv.value = value
       values_thing.push_back(spv)
 
-    return self.packer.pack(addr, values_thing)
-
-  cpdef make_can_msg(self, name_or_addr, bus, values):
-    cdef uint32_t addr = 0
+  cdef uint32_t address(self, name_or_addr):
     cdef const Msg* m
     if isinstance(name_or_addr, int):
-      addr = name_or_addr
-    else:
-      try:
-        m = self.dbc.name_to_msg.at(name_or_addr.encode("utf8"))
-        addr = m.address
-      except IndexError:
-        # The C++ pack function will log an error message for invalid addresses
-        pass
-
-    cdef vector[uint8_t] val = self.pack(addr, values)
-    return [addr, (<char *>&val[0])[:val.size()], bus]
+      return name_or_addr
+    try:
+      m = self.dbc.name_to_msg.at(name_or_addr.encode("utf8"))
+      return m.address
+    except IndexError:
+      # The C++ pack function will log an error message for invalid addresses
+      return 0
+
+  cdef const Msg* lookup_message(self, name_or_addr) except NULL:
+    try:
+      if isinstance(name_or_addr, int):
+        return self.dbc.addr_to_msg.at(name_or_addr)
+      return self.dbc.name_to_msg.at(name_or_addr.encode("utf8"))
+    except IndexError:
+      raise RuntimeError(f"could not find message {repr(name_or_addr)} in DBC {self.dbc.name.decode('utf8')}")
+
+  cpdef make_can_msg(self, name_or_addr, bus, values):
+    cdef uint32_t addr = self.address(name_or_addr)
+    cdef vector[SignalPackValue] values_thing
+    self.fill_values(values, values_thing)
+    cdef vector[uint8_t] val = self.packer.pack(addr, values_thing)
+    return [addr, (<char *>val.data())[:val.size()], bus]
+
+  def make_can_msgs(self, msgs):
+    # msgs: [(name or address, bus, values), ...], packed in one call
+    msgs = list(msgs)
+    cdef size_t i, count = len(msgs)
+    cdef vector[SignalPackMessage] msgs_v
+    cdef vector[vector[uint8_t]] dats
+    msgs_v.resize(count)
+    addresses = {}
+    for i in range(count):
+      name_or_addr, _, values = msgs[i]
+      addr = addresses.get(name_or_addr)
+      if addr is None:
+        addr = addresses[name_or_addr] = self.address(name_or_addr)
+      msgs_v[i].address = addr
+      self.fill_values(values, msgs_v[i].values)
+
+    # the GIL is held, packing touches the counters shared with make_can_msg
+    self.packer.pack(msgs_v, dats)
+
+    ret = [None] * count
+    for i in range(count):
+      ret[i] = [msgs_v[i].address, (<char *>dats[i].data())[:dats[i].size()], msgs[i][1]]
+    return ret
+
+  def pack_arrays(self, name_or_addr, values):
+    # packs N frames of one message from a column of N values per signal,
+    # returns their data as a (N, message size) uint8 array
+    cdef const Msg* m = self.lookup_message(name_or_addr)
+    if len(values) == 0:
+      raise RuntimeError("invalid parameter: no signal columns")
+
+    columns = {name: np.ascontiguousarray(v, dtype=np.float64) for name, v in values.items()}
+    count = next(iter(columns.values())).shape[0]
+    if any(c.ndim != 1 or c.shape[0] != count for c in columns.values()):
+      raise RuntimeError("invalid parameter: array lengths differ")
+
+    cdef vector[SignalPackColumn] columns_v
+    cdef SignalPackColumn column
+    cdef const double[::1] column_view
+    columns_v.reserve(len(columns))
+    for name, c in columns.items():
+      column_view = c
+      column.name = name.encode("utf8")
+      column.values = &column_view[0] if count > 0 else NULL
+      columns_v.push_back(column)
+
+    ret = np.zeros((count, m.size), dtype=np.uint8)
+    cdef uint8_t[:, ::1] ret_view = ret
+    if count > 0 and ret.shape[1] > 0:
+      self.packer.pack(m.address, columns_v, count, &ret_view[0, 0])
+    return ret
+
+  def prepare(self, name_or_addr, signals):
+    # returns a PreparedMessage packing values for `signals`, given by position
+    return PreparedMessage(self, name_or_addr, signals)
+
+  def stats(self):
+    # snapshot of the always-on counters, see PackerStats in common.h, and the
+    # frames packed of each message by address under "messages"
+    cdef dict stats = self.packer.stats
+    cdef vector[pair[uint32_t, uint64_t]] frames
+    cdef pair[uint32_t, uint64_t] f
+    cdef const Msg *m
+    self.packer.get_message_frames(frames)
+    messages = {}
+    for f in frames:
+      m = self.dbc.addr_to_msg.at(f.first)
+      messages[f.first] = {"name": m.name.decode("utf8"), "frames": f.second}
+    stats["messages"] = messages
+    return stats
+
+  def reset_stats(self):
+    self.packer.reset_stats()
+
+
+cdef class PreparedMessage:
+  cdef:
+    CANPacker packer
+    cpp_PreparedMessage msg
+    vector[double] values
+    vector[uint8_t] dat
+
+  cdef readonly:
+    uint32_t address
+    list signals
+
+  def __init__(self, CANPacker packer, name_or_addr, signals):
+    self.packer = packer
+    self.signals = list(signals)
+    cdef vector[string] names = [s.encode("utf8") for s in self.signals]
+    self.msg = packer.packer.prepare(packer.lookup_message(name_or_addr).address, names)
+    self.address = self.msg.address
+    self.values.resize(self.msg.sigs.size())
+
+  cpdef make_can_msg(self, bus, values):
+    # values: tuple, list or array with a value per prepared signal
+    if len(values) != self.values.size():
+      raise RuntimeError(f"invalid parameter: expected {self.values.size()} values, got {len(values)}")
+    cdef size_t i = 0
+    for v in values:
+      self.values[i] = v
+      i += 1
+
+    self.packer.packer.pack(self.msg, self.values.data(), self.dat)
+    return [self.address, (<char *>self.dat.data())[:self.dat.size()], bus]
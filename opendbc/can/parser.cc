@@ -1,6 +1,8 @@
 #include <algorithm>
 #include <cassert>
+#include <cmath>
 #include <cstring>
+#include <ctime>
 #include <limits>
 #include <stdexcept>
 #include <sstream>
@@ -12,12 +14,32 @@
 
 #include "opendbc/can/common.h"
 
-int64_t get_raw_value(const std::vector<uint8_t> &msg, const Signal &sig) {
+namespace {
+
+uint64_t monotonic_nanos() {
+  timespec t;
+  clock_gettime(CLOCK_MONOTONIC, &t);
+  return t.tv_sec * 1000000000ULL + t.tv_nsec;
+}
+
+}  // namespace
+
+int64_t get_raw_value(const uint8_t *msg, size_t len, const Signal &sig) {
+  if (sig.last_byte < len) {
+    if (sig.byte_aligned) {
+      return msg[sig.window_byte];
+    }
+    if (sig.in_window) {
+      return (read_window(msg, len, sig) >> sig.window_shift) & sig.mask;
+    }
+  }
+
+  // signal spans more than 8 bytes or the message is short, walk the bytes
   int64_t ret = 0;
 
   int i = sig.msb / 8;
   int bits = sig.size;
-  while (i >= 0 && i < msg.size() && bits > 0) {
+  while (i >= 0 && i < len && bits > 0) {
     int lsb = (int)(sig.lsb / 8) == i ? sig.lsb : i*8;
     int msb = (int)(sig.msb / 8) == i ? sig.msb : (i+1)*8 - 1;
     int size = msb - lsb + 1;
@@ -31,16 +53,35 @@ int64_t get_raw_value(const std::vector<uint8_t> &msg, const Signal &sig) {
   return ret;
 }
 
+// exact value of a signal with a whole factor and offset, vals holds it as a
+// double which loses precision above 2^53. Unsigned 64-bit values wrap to negative
+int64_t get_int_value(const uint8_t *msg, size_t len, const Signal &sig) {
+  uint64_t raw = get_raw_value(msg, len, sig);
+  if (sig.is_signed && sig.size < 64 && ((raw >> (sig.size - 1)) & 0x1)) {
+    raw -= 1ULL << sig.size;
+  }
+  return (int64_t)(raw * (uint64_t)(int64_t)sig.factor + (uint64_t)(int64_t)sig.offset);
+}
+
+void MessageState::init(const Msg &msg) {
+  name = msg.name;
+  address = msg.address;
+  size = msg.size;
+
+  // track all signals for this message
+  parse_sigs = msg.sigs;
+  vals.assign(parse_sigs.size(), 0);
+  tmp_vals.assign(parse_sigs.size(), 0);
+}
 
-bool MessageState::parse(uint64_t nanos, const std::vector<uint8_t> &dat) {
-  std::vector<double> tmp_vals(parse_sigs.size());
+bool MessageState::parse(uint64_t nanos, const uint8_t *dat, size_t len) {
   bool checksum_failed = false;
   bool counter_failed = false;
 
   for (int i = 0; i < parse_sigs.size(); i++) {
     const auto &sig = parse_sigs[i];
 
-    int64_t tmp = get_raw_value(dat, sig);
+    int64_t tmp = get_raw_value(dat, len, sig);
     if (sig.is_signed) {
       tmp -= ((tmp >> (sig.size-1)) & 0x1) ? (1ULL << sig.size) : 0;
     }
@@ -48,7 +89,7 @@ bool MessageState::parse(uint64_t nanos, const std::vector<uint8_t> &dat) {
     //DEBUG("parse 0x%X %s -> %ld\n", address, sig.name, tmp);
 
     if (!ignore_checksum) {
-      if (sig.calc_checksum != nullptr && sig.calc_checksum(address, sig, dat) != tmp) {
+      if (sig.calc_checksum != nullptr && sig.calc_checksum(address, sig, dat, len) != tmp) {
         checksum_failed = true;
       }
     }
@@ -63,16 +104,20 @@ bool MessageState::parse(uint64_t nanos, const std::vector<uint8_t> &dat) {
   }
 
   // only update values if both checksum and counter are valid
+  checksum_failures += checksum_failed;
   if (checksum_failed || counter_failed) {
     LOGE_100("0x%X message checks failed, checksum failed %d, counter failed %d", address, checksum_failed, counter_failed);
     return false;
   }
 
-  for (int i = 0; i < parse_sigs.size(); i++) {
-    vals[i] = tmp_vals[i];
-    all_vals[i].push_back(vals[i]);
+  // copy rather than swap, vals stays at the same address for array views
+  std::copy(tmp_vals.begin(), tmp_vals.end(), vals.begin());
+  push_history();
+  if (check_threshold != 0 && last_seen_nanos != 0 && nanos - last_seen_nanos > check_threshold) {
+    timeouts++;
   }
   last_seen_nanos = nanos;
+  frames_parsed++;
 
   return true;
 }
@@ -80,9 +125,10 @@ bool MessageState::parse(uint64_t nanos, const std::vector<uint8_t> &dat) {
 
 bool MessageState::update_counter_generic(int64_t v, int cnt_size) {
   if (((counter + 1) & ((1 << cnt_size) -1)) != v) {
+    counter_failures += last_seen_nanos != 0;  // not the first frame
     counter_fail = std::min(counter_fail + 1, MAX_BAD_COUNTER);
     if (counter_fail > 1) {
-      INFO("0x%X COUNTER FAIL #%d -- %d -> %d\n", address, counter_fail, counter, (int)v);
+      LOG_100("0x%X COUNTER FAIL #%d -- %d -> %d", address, counter_fail, counter, (int)v);
     }
   } else if (counter_fail > 0) {
     counter_fail--;
@@ -91,9 +137,60 @@ bool MessageState::update_counter_generic(int64_t v, int cnt_size) {
   return counter_fail < MAX_BAD_COUNTER;
 }
 
+void MessageState::push_history() {
+  const size_t num_sigs = vals.size();
+  if (history_count == history_rows) {
+    if (history_capacity != 0 && history_rows >= history_capacity) {
+      // full, drop the oldest row
+      history_start = (history_start + 1) % history_rows;
+      history_count--;
+    } else {
+      // grow and move the rows to the front, only until the ring is big enough
+      size_t rows = std::max<size_t>(history_rows * 2, 8);
+      if (history_capacity != 0) {
+        rows = std::min(rows, history_capacity);
+      }
+      std::vector<double> grown(rows * num_sigs);
+      for (size_t r = 0; r < history_count; r++) {
+        const size_t src = (history_start + r) % history_rows;
+        std::copy_n(history.begin() + src * num_sigs, num_sigs, grown.begin() + r * num_sigs);
+      }
+      history.swap(grown);
+      history_rows = rows;
+      history_start = 0;
+    }
+  }
+
+  const size_t row = (history_start + history_count) % history_rows;
+  std::copy(vals.begin(), vals.end(), history.begin() + row * num_sigs);
+  history_count++;
+}
 
-CANParser::CANParser(int abus, const std::string& dbc_name, const std::vector<std::pair<uint32_t, int>> &messages)
-  : bus(abus) {
+void MessageState::read_history(size_t sig_index, std::vector<double> &values) const {
+  const size_t num_sigs = vals.size();
+  values.clear();
+  for (size_t r = 0; r < history_count; r++) {
+    values.push_back(history[((history_start + r) % history_rows) * num_sigs + sig_index]);
+  }
+}
+
+void MessageState::clear_history() {
+  history_start = 0;
+  history_count = 0;
+}
+
+void MessageState::set_history_capacity(size_t capacity) {
+  history_capacity = capacity;
+  if (capacity != 0 && history_count > capacity) {
+    history_start = (history_start + history_count - capacity) % history_rows;
+    history_count = capacity;
+  }
+}
+
+
+CANParser::CANParser(int abus, const std::string& dbc_name, const std::vector<std::pair<uint32_t, int>> &messages,
+                     bool aignore_checksum, bool aignore_counter)
+  : bus(abus), ignore_checksum(aignore_checksum), ignore_counter(aignore_counter) {
   dbc = dbc_lookup(dbc_name);
   assert(dbc);
 
@@ -119,46 +216,59 @@ CANParser::CANParser(int abus, const std::string& dbc_name, const std::vector<st
       bus_timeout_threshold = std::min(bus_timeout_threshold, state.check_threshold);
     }
 
-    const Msg *msg = dbc->addr_to_msg.at(address);
-    state.name = msg->name;
-    state.size = msg->size;
+    state.init(*dbc->addr_to_msg.at(address));
+    state.ignore_checksum = ignore_checksum;
+    state.ignore_counter = ignore_counter;
     assert(state.size <= 64);  // max signal size is 64 bytes
+  }
 
-    // track all signals for this message
-    state.parse_sigs = msg->sigs;
-    state.vals.resize(msg->sigs.size());
-    state.all_vals.resize(msg->sigs.size());
+  for (auto& kv : message_states) {
+    MessageState &state = kv.second;
+    if (state.check_threshold == 0) {
+      continue;
+    }
+    auto group = std::find_if(timeout_groups.begin(), timeout_groups.end(), [&](const auto &g) {
+      return g.check_threshold == state.check_threshold;
+    });
+    if (group == timeout_groups.end()) {
+      group = timeout_groups.insert(group, {state.check_threshold, {}});
+    }
+    state.timeout_group = group - timeout_groups.begin();
+    state.timeout_it = group->states.insert(group->states.end(), &state);
   }
 }
 
-CANParser::CANParser(int abus, const std::string& dbc_name, bool ignore_checksum, bool ignore_counter)
-  : bus(abus) {
-  // Add all messages and signals
-
+CANParser::CANParser(int abus, const std::string& dbc_name, bool aignore_checksum, bool aignore_counter)
+  : bus(abus), all_messages(true), ignore_checksum(aignore_checksum), ignore_counter(aignore_counter) {
+  // all messages and signals, the states are created as the messages show up
   dbc = dbc_lookup(dbc_name);
   assert(dbc);
+}
 
-  for (const auto& msg : dbc->msgs) {
-    MessageState state = {
-      .name = msg.name,
-      .address = msg.address,
-      .size = msg.size,
-      .ignore_checksum = ignore_checksum,
-      .ignore_counter = ignore_counter,
-    };
-
-    for (const auto& sig : msg.sigs) {
-      state.parse_sigs.push_back(sig);
-      state.vals.push_back(0);
-      state.all_vals.push_back({});
-    }
+MessageState* CANParser::lookup_state(uint32_t address) {
+  auto state_it = message_states.find(address);
+  if (state_it != message_states.end()) {
+    return &state_it->second;
+  }
+  if (!all_messages) {
+    return nullptr;
+  }
 
-    message_states[state.address] = state;
+  auto msg_it = dbc->addr_to_msg.find(address);
+  if (msg_it == dbc->addr_to_msg.end()) {
+    return nullptr;
   }
+  MessageState &state = message_states[address];
+  state.init(*msg_it->second);
+  state.ignore_checksum = ignore_checksum;
+  state.ignore_counter = ignore_counter;
+  state.set_history_capacity(history_capacity);
+  return &state;
 }
 
-void CANParser::update(const std::vector<CanData> &can_data, std::vector<SignalValue> &vals) {
+uint64_t CANParser::UpdateData(const std::vector<CanData> &can_data) {
   uint64_t current_nanos = 0;
+  uint64_t start = monotonic_nanos();
   for (const auto &c : can_data) {
     if (first_nanos == 0) {
       first_nanos = c.nanos;
@@ -169,9 +279,123 @@ void CANParser::update(const std::vector<CanData> &can_data, std::vector<SignalV
     last_nanos = c.nanos;
 
     UpdateCans(c);
+    const uint64_t cans_end = monotonic_nanos();
     UpdateValid(last_nanos);
+    const uint64_t valid_end = monotonic_nanos();
+    stats.update_cans_nanos += cans_end - start;
+    stats.update_valid_nanos += valid_end - cans_end;
+    start = valid_end;
+  }
+  return current_nanos;
+}
+
+uint64_t CANParser::UpdateData(const CanFrameBatch &batch) {
+  uint64_t current_nanos = 0;
+  uint64_t start = monotonic_nanos();
+  size_t begin = 0;
+  while (begin < batch.count) {
+    const uint64_t nanos = batch.nanos[begin];
+    size_t end = begin + 1;
+    while (end < batch.count && batch.nanos[end] == nanos) {
+      end++;
+    }
+
+    if (first_nanos == 0) {
+      first_nanos = nanos;
+    }
+    if (current_nanos == 0) {
+      current_nanos = nanos;
+    }
+    last_nanos = nanos;
+
+    UpdateCans(batch, begin, end);
+    const uint64_t cans_end = monotonic_nanos();
+    UpdateValid(last_nanos);
+    const uint64_t valid_end = monotonic_nanos();
+    stats.update_cans_nanos += cans_end - start;
+    stats.update_valid_nanos += valid_end - cans_end;
+    start = valid_end;
+    begin = end;
+  }
+  return current_nanos;
+}
+
+void CANParser::update(const std::vector<CanData> &can_data, std::vector<SignalValue> &vals) {
+  query_latest(vals, UpdateData(can_data));
+}
+
+void CANParser::update(const CanFrameBatch &batch, std::vector<SignalValue> &vals) {
+  query_latest(vals, UpdateData(batch));
+}
+
+void CANParser::update(const std::vector<CanData> &can_data, std::vector<MessageState *> &states) {
+  QueryUpdate(states, UpdateData(can_data));
+}
+
+void CANParser::update(const CanFrameBatch &batch, std::vector<MessageState *> &states) {
+  QueryUpdate(states, UpdateData(batch));
+}
+
+void CANParser::decode(const CanFrameBatch &batch, const std::vector<std::pair<uint32_t, int>> &signals,
+                       std::vector<SignalSeries> &series) {
+  struct Selection {
+    MessageState *state;
+    std::vector<std::pair<int, size_t>> sigs;  // (signal index, series index)
+  };
+  std::unordered_map<uint32_t, Selection> selected;
+
+  for (size_t i = 0; i < signals.size(); i++) {
+    const auto &[address, sig_index] = signals[i];
+    MessageState *state = lookup_state(address);
+    if (state == nullptr || sig_index < 0 || sig_index >= state->parse_sigs.size()) {
+      std::stringstream is;
+      is << "Signal not tracked: " << address << " " << sig_index;
+      throw std::runtime_error(is.str());
+    }
+    Selection &sel = selected[address];
+    sel.state = state;
+    sel.sigs.push_back({sig_index, i});
+  }
+  series.resize(signals.size());
+  for (auto &[address, sel] : selected) {
+    for (const auto &[sig_index, series_index] : sel.sigs) {
+      const Signal &sig = sel.state->parse_sigs[sig_index];
+      series[series_index].integer = std::floor(sig.factor) == sig.factor && std::floor(sig.offset) == sig.offset;
+    }
+  }
+
+  for (size_t i = 0; i < batch.count; i++) {
+    if (batch.src[i] != bus) {
+      continue;
+    }
+    stats.frames++;
+    stats.bytes += batch.dlcs[i];
+    auto sel_it = selected.find(batch.addresses[i]);
+    if (sel_it == selected.end()) {
+      continue;
+    }
+    if (batch.dlcs[i] > 64 || batch.dlcs[i] > batch.stride) {
+      stats.oversized++;
+      continue;
+    }
+
+    MessageState &state = *sel_it->second.state;
+    const uint8_t *dat = batch.dat + i * batch.stride;
+    if (UpdateState(state, batch.nanos[i], dat, batch.dlcs[i])) {
+      for (const auto &[sig_index, series_index] : sel_it->second.sigs) {
+        SignalSeries &s = series[series_index];
+        s.ts_nanos.push_back(batch.nanos[i]);
+        if (s.integer) {
+          s.int_values.push_back(get_int_value(dat, batch.dlcs[i], state.parse_sigs[sig_index]));
+        } else {
+          s.values.push_back(state.vals[sig_index]);
+        }
+      }
+    }
+
+    // per-cycle history is not queried here, don't let it grow over the whole log
+    state.clear_history();
   }
-  query_latest(vals, current_nanos);
 }
 
 void CANParser::UpdateCans(const CanData &can) {
@@ -185,14 +409,17 @@ void CANParser::UpdateCans(const CanData &can) {
       continue;
     }
     bus_empty = false;
+    stats.frames++;
+    stats.bytes += frame.size;
 
-    auto state_it = message_states.find(frame.address);
-    if (state_it == message_states.end()) {
+    MessageState *state = lookup_state(frame.address);
+    if (state == nullptr) {
       // DEBUG("skip %d: not specified\n", cmsg.getAddress());
       continue;
     }
-    if (frame.dat.size() > 64) {
-      DEBUG("got message longer than 64 bytes: 0x%X %zu\n", frame.address, frame.dat.size());
+    if (frame.size > 64) {
+      stats.oversized++;
+      DEBUG("got message longer than 64 bytes: 0x%X %zu\n", frame.address, frame.size);
       continue;
     }
 
@@ -202,64 +429,330 @@ void CANParser::UpdateCans(const CanData &can) {
     //  continue;
     //}
 
-    state_it->second.parse(can.nanos, frame.dat);
+    UpdateState(*state, can.nanos, frame.dat, frame.size);
+  }
+
+  UpdateBusTimeout(can.nanos, bus_empty);
+}
+
+void CANParser::UpdateCans(const CanFrameBatch &batch, size_t begin, size_t end) {
+  const uint64_t nanos = batch.nanos[begin];
+  bool bus_empty = true;
+
+  for (size_t i = begin; i < end; i++) {
+    if (batch.src[i] != bus) {
+      continue;
+    }
+    bus_empty = false;
+    stats.frames++;
+    stats.bytes += batch.dlcs[i];
+
+    MessageState *state = lookup_state(batch.addresses[i]);
+    if (state == nullptr) {
+      continue;
+    }
+    if (batch.dlcs[i] > 64 || batch.dlcs[i] > batch.stride) {
+      stats.oversized++;
+      DEBUG("got message longer than 64 bytes: 0x%X %d\n", batch.addresses[i], batch.dlcs[i]);
+      continue;
+    }
+
+    // parsed in place, the payload isn't copied
+    UpdateState(*state, nanos, batch.dat + i * batch.stride, batch.dlcs[i]);
+  }
+
+  UpdateBusTimeout(nanos, bus_empty);
+}
+
+bool CANParser::UpdateState(MessageState &state, uint64_t nanos, const uint8_t *dat, size_t len) {
+  state.frames_seen++;
+  const bool counter_failing = state.counter_fail >= MAX_BAD_COUNTER;
+  const bool parsed = state.parse(nanos, dat, len);
+  if (counter_failing != (state.counter_fail >= MAX_BAD_COUNTER)) {
+    failing_counters += counter_failing ? -1 : 1;
+  }
+  if (!parsed) {
+    return false;
   }
 
-  // update bus timeout
+  if (!state.updated) {
+    state.updated = true;
+    updated_states.push_back(&state);
+  }
+
+  if (state.timeout_group != -1) {
+    // keep the group ordered, with increasing timestamps this is the back of the list.
+    // the state's own node is skipped, its timestamp may have gone backwards
+    auto &states = timeout_groups[state.timeout_group].states;
+    auto pos = states.end();
+    while (pos != states.begin() && (std::prev(pos) == state.timeout_it ||
+                                     (*std::prev(pos))->last_seen_nanos > state.last_seen_nanos)) {
+      --pos;
+    }
+    states.splice(pos, states, state.timeout_it);
+  }
+  return true;
+}
+
+void CANParser::UpdateBusTimeout(uint64_t nanos, bool bus_empty) {
   if (!bus_empty) {
-    last_nonempty_nanos = can.nanos;
+    last_nonempty_nanos = nanos;
   }
-  bus_timeout = (can.nanos - last_nonempty_nanos) > bus_timeout_threshold;
+  const bool timed_out = (nanos - last_nonempty_nanos) > bus_timeout_threshold;
+  stats.bus_timeouts += timed_out && !bus_timeout;
+  bus_timeout = timed_out;
 }
 
 void CANParser::UpdateValid(uint64_t nanos) {
   const bool show_missing = (nanos - first_nanos) > 8e9;
 
   bool _valid = true;
-  bool _counters_valid = true;
-  for (const auto& kv : message_states) {
-    const auto& state = kv.second;
-
-    if (state.counter_fail >= MAX_BAD_COUNTER) {
-      _counters_valid = false;
-    }
-
-    const bool missing = state.last_seen_nanos == 0;
-    const bool timed_out = (nanos - state.last_seen_nanos) > state.check_threshold;
-    if (state.check_threshold > 0 && (missing || timed_out)) {
-      if (show_missing && !bus_timeout) {
-        if (missing) {
-          LOGE_100("0x%X '%s' NOT SEEN", state.address, state.name.c_str());
-        } else if (timed_out) {
-          LOGE_100("0x%X '%s' TIMED OUT", state.address, state.name.c_str());
+  for (const auto &group : timeout_groups) {
+    auto timed_out = [&](const MessageState *state) {
+      return state->last_seen_nanos == 0 || (nanos - state->last_seen_nanos) > group.check_threshold;
+    };
+
+    // the messages that are missing or timed out are the oldest ones, plus any
+    // newer than nanos. since the group is ordered, checking both ends is enough
+    if (group.states.empty() || (!timed_out(group.states.front()) && !timed_out(group.states.back()))) {
+      continue;
+    }
+    _valid = false;
+
+    if (show_missing && !bus_timeout) {
+      for (auto it = group.states.begin(); it != group.states.end() && timed_out(*it) && (*it)->last_seen_nanos <= nanos; ++it) {
+        if ((*it)->last_seen_nanos == 0) {
+          LOGE_100("0x%X '%s' NOT SEEN", (*it)->address, (*it)->name.c_str());
+        } else {
+          LOGE_100("0x%X '%s' TIMED OUT", (*it)->address, (*it)->name.c_str());
         }
       }
-      _valid = false;
+      for (auto it = group.states.rbegin(); it != group.states.rend() && (*it)->last_seen_nanos > nanos; ++it) {
+        LOGE_100("0x%X '%s' TIMED OUT", (*it)->address, (*it)->name.c_str());
+      }
     }
   }
   can_invalid_cnt = _valid ? 0 : (can_invalid_cnt + 1);
-  can_valid = (can_invalid_cnt < CAN_INVALID_CNT) && _counters_valid;
+  can_valid = (can_invalid_cnt < CAN_INVALID_CNT) && failing_counters == 0;
 }
 
 void CANParser::query_latest(std::vector<SignalValue> &vals, uint64_t last_ts) {
+  std::vector<MessageState *> states;
+  QueryUpdate(states, last_ts);
+  const uint64_t start = monotonic_nanos();
+
+  for (MessageState *state : states) {
+    for (int i = 0; i < state->parse_sigs.size(); i++) {
+      const Signal &sig = state->parse_sigs[i];
+      SignalValue &v = vals.emplace_back();
+      v.address = state->address;
+      v.ts_nanos = state->last_seen_nanos;
+      v.name = sig.name;
+      v.value = state->vals[i];
+      state->read_history(i, v.all_values);
+    }
+    state->clear_history();
+  }
+  stats.query_nanos += monotonic_nanos() - start;
+}
+
+void CANParser::query_updated(std::vector<MessageState *> &states, uint64_t last_ts) {
+  const uint64_t start = monotonic_nanos();
   if (last_ts == 0) {
     last_ts = last_nanos;
   }
-  for (auto& kv : message_states) {
-    auto& state = kv.second;
-    if (last_ts != 0 && state.last_seen_nanos < last_ts) {
+
+  // only the messages parsed since the last query, not every tracked one
+  for (MessageState *state : updated_states) {
+    state->updated = false;
+    if (last_ts != 0 && state->last_seen_nanos < last_ts) {
       continue;
     }
+    states.push_back(state);
+  }
+  updated_states.clear();
+  stats.query_nanos += monotonic_nanos() - start;
+}
 
-    for (int i = 0; i < state.parse_sigs.size(); i++) {
-      const Signal &sig = state.parse_sigs[i];
-      SignalValue &v = vals.emplace_back();
-      v.address = state.address;
-      v.ts_nanos = state.last_seen_nanos;
-      v.name = sig.name;
-      v.value = state.vals[i];
-      v.all_values = state.all_vals[i];
-      state.all_vals[i].clear();
+void CANParser::QueryUpdate(std::vector<MessageState *> &states, uint64_t current_nanos) {
+  if (current_nanos != 0) {
+    query_updated(states, current_nanos);
+  } else {
+    QueryLatestSeen(states);
+  }
+}
+
+void CANParser::QueryLatestSeen(std::vector<MessageState *> &states) {
+  const uint64_t start = monotonic_nanos();
+  for (MessageState *state : updated_states) {
+    state->updated = false;
+  }
+  updated_states.clear();
+
+  for (auto &kv : message_states) {
+    if (last_nanos == 0 || kv.second.last_seen_nanos >= last_nanos) {
+      states.push_back(&kv.second);
     }
   }
+  stats.query_nanos += monotonic_nanos() - start;
+}
+
+MessageState* CANParser::get_message_state(uint32_t address) {
+  auto state_it = message_states.find(address);
+  return state_it != message_states.end() ? &state_it->second : nullptr;
+}
+
+void CANParser::set_history_capacity(size_t capacity) {
+  history_capacity = capacity;
+  for (auto& kv : message_states) {
+    kv.second.set_history_capacity(capacity);
+  }
+}
+
+void CANParser::get_message_states(std::vector<MessageState *> &states) {
+  for (auto& kv : message_states) {
+    states.push_back(&kv.second);
+  }
+}
+
+void CANParser::reset_stats() {
+  stats = {};
+  for (auto& kv : message_states) {
+    MessageState &state = kv.second;
+    state.frames_seen = state.frames_parsed = 0;
+    state.checksum_failures = state.counter_failures = state.timeouts = 0;
+  }
+}
+
+MultiBusCANParser::MultiBusCANParser(const std::string& dbc_name,
+                                     const std::map<int, std::vector<std::pair<uint32_t, int>>> &bus_messages) {
+  for (const auto& [bus, messages] : bus_messages) {
+    if (bus < 0) {
+      std::stringstream is;
+      is << "Invalid bus: " << bus;
+      throw std::runtime_error(is.str());
+    }
+    if (bus >= (int)parser_index.size()) {
+      parser_index.resize(bus + 1, -1);
+    }
+    parser_index[bus] = parsers.size();
+
+    CANParser *parser = parsers.emplace_back(new CANParser(bus, dbc_name, messages)).get();
+    for (auto& kv : parser->message_states) {
+      routes[(uint64_t)bus << 32 | kv.first] = {parsers.size() - 1, &kv.second};
+    }
+  }
+  bus_empty.resize(parsers.size());
+}
+
+void MultiBusCANParser::BeginUpdate(uint64_t nanos) {
+  for (auto &parser : parsers) {
+    if (parser->first_nanos == 0) {
+      parser->first_nanos = nanos;
+    }
+    parser->last_nanos = nanos;
+  }
+  std::fill(bus_empty.begin(), bus_empty.end(), true);
+}
+
+const MultiBusCANParser::Route* MultiBusCANParser::FindRoute(long bus, uint32_t address, size_t size) {
+  if (bus < 0 || bus >= (long)parser_index.size() || parser_index[bus] == -1) {
+    return nullptr;
+  }
+  bus_empty[parser_index[bus]] = false;
+  ParserStats &stats = parsers[parser_index[bus]]->stats;
+  stats.frames++;
+  stats.bytes += size;
+
+  auto route_it = routes.find((uint64_t)bus << 32 | address);
+  return route_it != routes.end() ? &route_it->second : nullptr;
+}
+
+void MultiBusCANParser::EndUpdate(uint64_t nanos) {
+  uint64_t start = monotonic_nanos();
+  for (size_t i = 0; i < parsers.size(); i++) {
+    parsers[i]->UpdateBusTimeout(nanos, bus_empty[i]);
+    parsers[i]->UpdateValid(nanos);
+    const uint64_t end = monotonic_nanos();
+    parsers[i]->stats.update_valid_nanos += end - start;
+    start = end;
+  }
+}
+
+void MultiBusCANParser::QueryUpdated(std::vector<std::pair<int, MessageState *>> &states, uint64_t last_ts) {
+  for (auto &parser : parsers) {
+    updated_states.clear();
+    parser->query_updated(updated_states, last_ts);
+    for (MessageState *state : updated_states) {
+      states.emplace_back(parser->bus, state);
+    }
+  }
+}
+
+void MultiBusCANParser::update(const std::vector<CanData> &can_data, std::vector<std::pair<int, MessageState *>> &states) {
+  uint64_t current_nanos = 0;
+  for (const auto &c : can_data) {
+    if (current_nanos == 0) {
+      current_nanos = c.nanos;
+    }
+
+    BeginUpdate(c.nanos);
+    for (const auto &frame : c.frames) {
+      const Route *route = FindRoute(frame.src, frame.address, frame.size);
+      if (route == nullptr) {
+        continue;
+      }
+      if (frame.size > 64) {
+        parsers[route->parser_index]->stats.oversized++;
+        DEBUG("got message longer than 64 bytes: 0x%X %zu\n", frame.address, frame.size);
+        continue;
+      }
+      parsers[route->parser_index]->UpdateState(*route->state, c.nanos, frame.dat, frame.size);
+    }
+    EndUpdate(c.nanos);
+  }
+  QueryUpdated(states, current_nanos);
+}
+
+void MultiBusCANParser::update(const CanFrameBatch &batch, std::vector<std::pair<int, MessageState *>> &states) {
+  uint64_t current_nanos = 0;
+  size_t begin = 0;
+  while (begin < batch.count) {
+    const uint64_t nanos = batch.nanos[begin];
+    if (current_nanos == 0) {
+      current_nanos = nanos;
+    }
+
+    BeginUpdate(nanos);
+    size_t i = begin;
+    for (; i < batch.count && batch.nanos[i] == nanos; i++) {
+      const Route *route = FindRoute(batch.src[i], batch.addresses[i], batch.dlcs[i]);
+      if (route == nullptr) {
+        continue;
+      }
+      if (batch.dlcs[i] > 64 || batch.dlcs[i] > batch.stride) {
+        parsers[route->parser_index]->stats.oversized++;
+        DEBUG("got message longer than 64 bytes: 0x%X %d\n", batch.addresses[i], batch.dlcs[i]);
+        continue;
+      }
+
+      parsers[route->parser_index]->UpdateState(*route->state, nanos, batch.dat + i * batch.stride, batch.dlcs[i]);
+    }
+    EndUpdate(nanos);
+    begin = i;
+  }
+  QueryUpdated(states, current_nanos);
+}
+
+CANParser* MultiBusCANParser::get_parser(int bus) const {
+  if (bus < 0 || bus >= (int)parser_index.size() || parser_index[bus] == -1) {
+    return nullptr;
+  }
+  return parsers[parser_index[bus]].get();
+}
+
+void MultiBusCANParser::set_history_capacity(size_t capacity) {
+  for (auto &parser : parsers) {
+    parser->set_history_capacity(capacity);
+  }
 }
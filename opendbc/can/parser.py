@@ -1,2 +1,8 @@
-from opendbc.can.parser_pyx import CANParser, CANDefine  # pylint: disable=no-name-in-module, import-error
+from opendbc.can.parser_pyx import CANParser, CANDecoder, CANDefine, preload_dbcs, invalidate_dbcs, reload_dbc  # pylint: disable=no-name-in-module, import-error
+from opendbc.can.parser_pyx import MultiBusCANParser, CANReader  # pylint: disable=no-name-in-module, import-error
+from opendbc.can.parser_pyx import capture_logs, read_logs  # pylint: disable=no-name-in-module, import-error
 assert CANParser, CANDefine
+assert CANDecoder, preload_dbcs
+assert invalidate_dbcs, reload_dbc
+assert MultiBusCANParser, CANReader
+assert capture_logs, read_logs
@@ -1,32 +1,206 @@
 # distutils: language = c++
 # cython: c_string_encoding=ascii, language_level=3
 
-from cython.operator cimport dereference as deref, preincrement as preinc
+from libcpp.map cimport map
 from libcpp.pair cimport pair
 from libcpp.string cimport string
 from libcpp.vector cimport vector
-from libc.stdint cimport uint32_t
+from libc.stdint cimport uint8_t, uint32_t, int64_t, uint64_t
+from libc.string cimport memcpy
+from cpython.buffer cimport PyBUF_WRITABLE
 
-from .common cimport CANParser as cpp_CANParser
-from .common cimport dbc_lookup, SignalValue, DBC, CanData, CanFrame
+from .common cimport CANParser as cpp_CANParser, MultiBusCANParser as cpp_MultiBusCANParser, MessageState
+from .common cimport CANReader as cpp_CANReader, CANLogReader as cpp_CANLogReader
+from .common cimport dbc_lookup, dbc_preload, dbc_invalidate, dbc_invalidate_all, dbc_reload
+from .common cimport SignalSeries, DBC, Msg, CanData, CanFrame, CanFrameBatch
+from .common cimport LogRecord, log_capture, log_read_captured
 
 import numbers
+import os
 from collections import defaultdict
+from collections.abc import Mapping
+
+import numpy as np
+
+
+cdef CanFrameBatch frame_batch(const uint64_t[::1] nanos, const uint32_t[::1] addresses, const uint8_t[::1] buses,
+                               const uint8_t[::1] dlcs, const uint8_t[:, ::1] dat) except *:
+  cdef size_t count = nanos.shape[0]
+  if addresses.shape[0] != count or buses.shape[0] != count or dlcs.shape[0] != count or dat.shape[0] != count:
+    raise RuntimeError("invalid parameter: array lengths differ")
+
+  cdef CanFrameBatch batch
+  batch.count = count
+  batch.stride = dat.shape[1]
+  batch.dat = NULL
+  if count > 0:
+    batch.nanos = &nanos[0]
+    batch.addresses = &addresses[0]
+    batch.src = &buses[0]
+    batch.dlcs = &dlcs[0]
+    if batch.stride > 0:
+      batch.dat = &dat[0, 0]
+  return batch
+
+
+cdef list fill_can_data(strings, vector[CanData] &can_data_array):
+  # input format:
+  # [nanos, [[address, data, src], ...]]
+  # [[nanos, [[address, data, src], ...], ...]]
+  # frames point into the payloads rather than copying them, the returned
+  # list holds the payloads and must be kept alive for the update. Payloads that
+  # could change while the update runs without the GIL are copied
+  cdef CanFrame* frame
+  cdef CanData* can_data
+  cdef const char *payload
+  cdef list payloads = []
+
+  try:
+    if len(strings) and not isinstance(strings[0], (list, tuple)):
+      strings = [strings]
+
+    can_data_array.reserve(len(strings))
+    for s in strings:
+      can_data = &(can_data_array.emplace_back())
+      can_data.nanos = s[0]
+      can_data.frames.reserve(len(s[1]))
+      for f in s[1]:
+        frame = &(can_data.frames.emplace_back())
+        frame.address = f[0]
+        dat = f[1]
+        if isinstance(dat, (list, tuple)):
+          dat = bytes(dat)
+        elif not isinstance(dat, bytes):
+          # only buffers are converted, anything else (e.g. an int) raises a TypeError.
+          # Buffers of bytes are copied as is, wider items are converted one by one
+          view = memoryview(dat)
+          dat = view.tobytes() if view.itemsize == 1 and view.c_contiguous else bytes(view.tolist())
+        payloads.append(dat)
+        payload = dat
+        frame.dat = <const uint8_t*>payload
+        frame.size = len(dat)
+        frame.src = f[2]
+  except TypeError:
+    raise RuntimeError("invalid parameter")
+  return payloads
+
+
+cdef const Msg* lookup_message(const DBC *dbc, msg, dbc_name) except NULL:
+  try:
+    return dbc.addr_to_msg.at(msg) if isinstance(msg, numbers.Number) else dbc.name_to_msg.at(msg)
+  except IndexError:
+    raise RuntimeError(f"could not find message {repr(msg)} in DBC {dbc_name}")
+
+
+cdef tuple new_output(const Msg *m):
+  # (signal names, vl, vl_all, ts_nanos) of a message, signal names are created
+  # once, in the order of the message state's values
+  sig_names = [m.sigs[j].name.decode("utf8") for j in range(m.sigs.size())]
+  return (sig_names, {sig_name: 0.0 for sig_name in sig_names},
+          defaultdict(list, {sig_name: [] for sig_name in sig_names}), {sig_name: 0 for sig_name in sig_names})
+
+
+cdef update_output(MessageState *state, tuple output):
+  cdef size_t i, row
+  sig_names, vl, vl_all, ts_nanos = output
+  ts = state.last_seen_nanos
+  for i in range(state.vals.size()):
+    sig_name = sig_names[i]
+    vl[sig_name] = state.vals[i]
+    vl_all[sig_name] = [state.history_at(row, i) for row in range(state.history_count)]
+    ts_nanos[sig_name] = ts
+  state.clear_history()
+
+
+cdef dict parser_stats(cpp_CANParser *can):
+  # the counters of ParserStats, and of each tracked message by address under "messages"
+  cdef dict stats = can.stats
+  cdef vector[MessageState*] states
+  cdef MessageState *state
+  can.get_message_states(states)
+  messages = {}
+  for state in states:
+    messages[state.address] = {
+      "name": state.name.decode("utf8"),
+      "frames_seen": state.frames_seen,
+      "frames_parsed": state.frames_parsed,
+      "checksum_failures": state.checksum_failures,
+      "counter_failures": state.counter_failures,
+      "timeouts": state.timeouts,
+    }
+  stats["messages"] = messages
+  return stats
+
+
+def preload_dbcs(dbc_names, int workers=4):
+  # parses the DBCs on up to `workers` threads, so later lookups are cache hits
+  cdef vector[string] names = dbc_names
+  with nogil:
+    dbc_preload(names, workers)
+
+
+def capture_logs(size_t capacity=1024):
+  # keeps the last `capacity` log messages of the parsers and packers for
+  # read_logs instead of printing them, 0 prints them again
+  log_capture(capacity)
+
+
+def read_logs():
+  # the messages captured since the last read, [(nanos, level, message), ...],
+  # and how many were overwritten before they were read
+  cdef vector[LogRecord] records
+  cdef size_t dropped = log_read_captured(records)
+  cdef size_t i
+  logs = []
+  for i in range(records.size()):
+    logs.append((records[i].nanos, records[i].level, records[i].message.decode("utf8", "replace")))
+  return logs, dropped
+
+
+def invalidate_dbcs(dbc_names=None):
+  # forgets the loaded DBCs (all of them by default), so they're looked up and
+  # parsed again by the next parser, packer or define that uses them
+  if dbc_names is None:
+    dbc_invalidate_all()
+  else:
+    for dbc_name in dbc_names:
+      dbc_invalidate(dbc_name)
+
+
+def reload_dbc(dbc_name):
+  # parses the DBC again, existing parsers and packers keep using the old one
+  if not dbc_reload(dbc_name):
+    raise RuntimeError(f"Can't find DBC: {dbc_name}")
 
 
 cdef class CANParser:
+  # updates parse without the GIL, parsers can be updated from several threads at
+  # once. Each parser has its own state, sharing only the DBC, which is read-only
+  # once loaded. A parser can't be updated by two threads at once, and its views
+  # and validity aren't to be read by other threads while it's being updated.
   cdef:
     cpp_CANParser *can
     const DBC *dbc
     vector[uint32_t] addresses
+    dict outputs
+    list vl_all_updated
+    bint updating
 
   cdef readonly:
     dict vl
     dict vl_all
     dict ts_nanos
     string dbc_name
-
-  def __init__(self, dbc_name, messages, bus=0):
+    bint views
+
+  def __init__(self, dbc_name, messages, bus=0, history_capacity=0, views=False,
+               ignore_checksum=False, ignore_counter=False):
+    # messages: [(message name or address, frequency), ...], or None for every message
+    #   of the DBC. Those are added to vl (and vl_all and ts_nanos) the first time
+    #   they're seen. Either way, checksum and counter are checked unless ignored.
+    # history_capacity: max values per signal kept in vl_all between updates, 0 for unbounded
+    # views: vl holds a MessageView per message instead of dicts, vl_all and ts_nanos stay empty
+    self.views = views
     self.dbc_name = dbc_name
     self.dbc = dbc_lookup(dbc_name)
     if not self.dbc:
@@ -35,29 +209,26 @@ cdef class CANParser:
     self.vl = {}
     self.vl_all = {}
     self.ts_nanos = {}
+    self.outputs = {}
+    self.vl_all_updated = []
 
-    # Convert message names into addresses and check existence in DBC
+    cdef bint check_ignore_checksum = ignore_checksum, check_ignore_counter = ignore_counter
+    cdef const Msg *m
     cdef vector[pair[uint32_t, int]] message_v
-    for i in range(len(messages)):
-      c = messages[i]
-      try:
-        m = self.dbc.addr_to_msg.at(c[0]) if isinstance(c[0], numbers.Number) else self.dbc.name_to_msg.at(c[0])
-      except IndexError:
-        raise RuntimeError(f"could not find message {repr(c[0])} in DBC {self.dbc_name}")
-
-      address = m.address
-      message_v.push_back((address, c[1]))
-      self.addresses.push_back(address)
-
-      name = m.name.decode("utf8")
-      self.vl[address] = {}
-      self.vl[name] = self.vl[address]
-      self.vl_all[address] = defaultdict(list)
-      self.vl_all[name] = self.vl_all[address]
-      self.ts_nanos[address] = {}
-      self.ts_nanos[name] = self.ts_nanos[address]
+    if messages is None:
+      self.can = new cpp_CANParser(bus, dbc_name, check_ignore_checksum, check_ignore_counter)
+    else:
+      # Convert message names into addresses and check existence in DBC
+      for i in range(len(messages)):
+        c = messages[i]
+        m = lookup_message(self.dbc, c[0], self.dbc_name)
+        message_v.push_back((m.address, c[1]))
+        self.addresses.push_back(m.address)
+      self.can = new cpp_CANParser(bus, dbc_name, message_v, check_ignore_checksum, check_ignore_counter)
+    self.can.set_history_capacity(history_capacity)
 
-    self.can = new cpp_CANParser(bus, dbc_name, message_v)
+    for address in self.addresses:
+      self._add_message(address)
     self.update_strings([])
 
   def __dealloc__(self):
@@ -68,61 +239,249 @@ cdef class CANParser:
     # input format:
     # [nanos, [[address, data, src], ...]]
     # [[nanos, [[address, data, src], ...], ...]]
-    for address in self.addresses:
+    cdef vector[MessageState*] states
+    cdef vector[CanData] can_data_array
+    _payloads = fill_can_data(strings, can_data_array)  # referenced by the frames
+
+    self._begin_update()
+    try:
+      self._clear_views()
+      with nogil:
+        self.can.update(can_data_array, states)
+      return self._update_vl(states)
+    finally:
+      self.updating = False
+
+  def update_arrays(self, const uint64_t[::1] nanos, const uint32_t[::1] addresses, const uint8_t[::1] buses,
+                    const uint8_t[::1] dlcs, const uint8_t[:, ::1] dat):
+    # bulk input from contiguous buffers, one entry per frame:
+    # nanos (uint64), addresses (uint32), buses (uint8), dlcs (uint8)
+    # and dat (uint8, shape [frames, stride]) holding each payload.
+    # frames sharing a timestamp are parsed together like one update_strings entry
+    cdef CanFrameBatch batch = frame_batch(nanos, addresses, buses, dlcs, dat)
+    cdef vector[MessageState*] states
+    self._begin_update()
+    try:
+      self._clear_views()
+      with nogil:
+        self.can.update(batch, states)
+      return self._update_vl(states)
+    finally:
+      self.updating = False
+
+  cdef _begin_update(self):
+    if self.updating:
+      raise RuntimeError("CANParser is already being updated by another thread")
+    self.updating = True
+
+  cdef _add_message(self, uint32_t address):
+    cdef const Msg *m = self.dbc.addr_to_msg.at(address)
+    name = m.name.decode("utf8")
+    self.outputs[address] = new_output(m)
+    if self.views:
+      view = MessageView(self, address, self.outputs[address][0])
+      self.vl[address] = view
+      self.vl[name] = view
+    else:
+      _, self.vl[address], self.vl_all[address], self.ts_nanos[address] = self.outputs[address]
+      self.vl[name] = self.vl[address]
+      self.vl_all[name] = self.vl_all[address]
+      self.ts_nanos[name] = self.ts_nanos[address]
+
+  cdef _clear_views(self):
+    # views keep the history of the previous update until the next one starts
+    if self.views:
+      for address in self.vl_all_updated:
+        self.can.get_message_state(address).clear_history()
+      self.vl_all_updated = []
+
+  cdef _update_vl(self, vector[MessageState*] &states):
+    cdef MessageState *state
+    if self.views:
+      for state in states:
+        if state.address not in self.outputs:
+          self._add_message(state.address)
+        self.vl_all_updated.append(state.address)
+      return set(self.vl_all_updated)
+
+    # only the messages parsed in this update are touched
+    for address in self.vl_all_updated:
       self.vl_all[address].clear()
+    self.vl_all_updated = []
 
-    cur_address = -1
-    vl = {}
-    vl_all = {}
-    ts_nanos = {}
     updated_addrs = set()
+    for state in states:
+      if state.address not in self.outputs:
+        self._add_message(state.address)
+      update_output(state, self.outputs[state.address])
+      updated_addrs.add(state.address)
+      self.vl_all_updated.append(state.address)
 
-    cdef vector[SignalValue] new_vals
-    cdef CanFrame* frame
-    cdef CanData* can_data
-    cdef vector[CanData] can_data_array
+    return updated_addrs
 
-    try:
-      if len(strings) and not isinstance(strings[0], (list, tuple)):
-        strings = [strings]
-
-      can_data_array.reserve(len(strings))
-      for s in strings:
-        can_data = &(can_data_array.emplace_back())
-        can_data.nanos = s[0]
-        can_data.frames.reserve(len(s[1]))
-        for f in s[1]:
-          frame = &(can_data.frames.emplace_back())
-          frame.address = f[0]
-          frame.dat = f[1]
-          frame.src = f[2]
-    except TypeError:
-      raise RuntimeError("invalid parameter")
-
-    self.can.update(can_data_array, new_vals)
-
-    cdef vector[SignalValue].iterator it = new_vals.begin()
-    cdef SignalValue* cv
-    while it != new_vals.end():
-      cv = &deref(it)
-
-      # Check if the address has changed
-      if cv.address != cur_address:
-        cur_address = cv.address
-        vl = self.vl[cur_address]
-        vl_all = self.vl_all[cur_address]
-        ts_nanos = self.ts_nanos[cur_address]
-        updated_addrs.add(cur_address)
-
-      # Cast char * directly to unicode
-      cv_name = <unicode>cv.name
-      vl[cv_name] = cv.value
-      vl_all[cv_name] = cv.all_values
-      ts_nanos[cv_name] = cv.ts_nanos
-      preinc(it)
+  def stats(self):
+    # snapshot of the always-on counters, see ParserStats in common.h
+    return parser_stats(self.can)
+
+  def reset_stats(self):
+    self.can.reset_stats()
+
+  @property
+  def can_valid(self):
+    return self.can.can_valid
+
+  @property
+  def bus_timeout(self):
+    return self.can.bus_timeout
+
+
+cdef class MultiBusCANParser:
+  # parses the messages of several buses in one pass over the frames, instead of
+  # a CANParser per bus that each skip the frames of the other buses.
+  # messages: [(bus, message name or address, frequency), ...]
+  # buses: {bus: BusParser}, each reads like the CANParser of that bus
+  cdef:
+    cpp_MultiBusCANParser *can
+    const DBC *dbc
+    dict outputs
+    list vl_all_updated
+    bint updating
+
+  cdef readonly:
+    dict buses
+    string dbc_name
 
+  def __init__(self, dbc_name, messages, history_capacity=0):
+    self.dbc_name = dbc_name
+    self.dbc = dbc_lookup(dbc_name)
+    if not self.dbc:
+      raise RuntimeError(f"Can't find DBC: {dbc_name}")
+
+    self.outputs = {}
+    self.vl_all_updated = []
+
+    cdef const Msg *m
+    cdef map[int, vector[pair[uint32_t, int]]] bus_messages
+    for bus, msg, frequency in messages:
+      m = lookup_message(self.dbc, msg, self.dbc_name)
+      bus_messages[bus].push_back((m.address, frequency))
+      self.outputs[(bus, m.address)] = new_output(m)
+
+    self.can = new cpp_MultiBusCANParser(dbc_name, bus_messages)
+    self.can.set_history_capacity(history_capacity)
+
+    cdef BusParser bus_parser
+    self.buses = {}
+    for bus, address in self.outputs:
+      if bus not in self.buses:
+        self.buses[bus] = BusParser(self, bus)
+      bus_parser = self.buses[bus]
+      m = self.dbc.addr_to_msg.at(address)
+      bus_parser.add_output(m.name.decode("utf8"), address, self.outputs[(bus, address)])
+
+  def __dealloc__(self):
+    if self.can:
+      del self.can
+
+  def __getitem__(self, bus):
+    return self.buses[bus]
+
+  def update_strings(self, strings, sendcan=False):
+    # same input as CANParser.update_strings, with the frames of every bus
+    cdef vector[pair[int, MessageState*]] states
+    cdef vector[CanData] can_data_array
+    _payloads = fill_can_data(strings, can_data_array)  # referenced by the frames
+    self._begin_update()
+    try:
+      with nogil:
+        self.can.update(can_data_array, states)
+      return self._update_vl(states)
+    finally:
+      self.updating = False
+
+  def update_arrays(self, const uint64_t[::1] nanos, const uint32_t[::1] addresses, const uint8_t[::1] buses,
+                    const uint8_t[::1] dlcs, const uint8_t[:, ::1] dat):
+    # same input as CANParser.update_arrays
+    cdef CanFrameBatch batch = frame_batch(nanos, addresses, buses, dlcs, dat)
+    cdef vector[pair[int, MessageState*]] states
+    self._begin_update()
+    try:
+      with nogil:
+        self.can.update(batch, states)
+      return self._update_vl(states)
+    finally:
+      self.updating = False
+
+  cdef _begin_update(self):
+    # threads as with CANParser
+    if self.updating:
+      raise RuntimeError("MultiBusCANParser is already being updated by another thread")
+    self.updating = True
+
+  cdef _update_vl(self, vector[pair[int, MessageState*]] &states):
+    # returns the updated addresses of each bus
+    for bus, address in self.vl_all_updated:
+      self.outputs[(bus, address)][2].clear()
+    self.vl_all_updated = []
+
+    updated_addrs = {bus: set() for bus in self.buses}
+    cdef pair[int, MessageState*] s
+    for s in states:
+      key = (s.first, s.second.address)
+      update_output(s.second, self.outputs[key])
+      updated_addrs[s.first].add(s.second.address)
+      self.vl_all_updated.append(key)
     return updated_addrs
 
+  def stats(self):
+    # {bus: stats of the bus}, as CANParser.stats
+    return {bus: bus_parser.stats() for bus, bus_parser in self.buses.items()}
+
+  def reset_stats(self):
+    for bus_parser in self.buses.values():
+      bus_parser.reset_stats()
+
+  @property
+  def can_valid(self):
+    return all(bus_parser.can_valid for bus_parser in self.buses.values())
+
+  @property
+  def bus_timeout(self):
+    return any(bus_parser.bus_timeout for bus_parser in self.buses.values())
+
+
+cdef class BusParser:
+  # messages of one bus of a MultiBusCANParser, with the validity and timeout of that bus
+  cdef:
+    MultiBusCANParser parser
+    cpp_CANParser *can
+
+  cdef readonly:
+    int bus
+    dict vl
+    dict vl_all
+    dict ts_nanos
+
+  def __init__(self, MultiBusCANParser parser, int bus):
+    self.parser = parser
+    self.can = parser.can.get_parser(bus)
+    self.bus = bus
+    self.vl = {}
+    self.vl_all = {}
+    self.ts_nanos = {}
+
+  cdef add_output(self, name, address, tuple output):
+    _, self.vl[address], self.vl_all[address], self.ts_nanos[address] = output
+    self.vl[name] = self.vl[address]
+    self.vl_all[name] = self.vl_all[address]
+    self.ts_nanos[name] = self.ts_nanos[address]
+
+  def stats(self):
+    return parser_stats(self.can)
+
+  def reset_stats(self):
+    self.can.reset_stats()
+
   @property
   def can_valid(self):
     return self.can.can_valid
@@ -132,6 +491,315 @@ cdef class CANParser:
     return self.can.bus_timeout
 
 
+cdef class CANReader:
+  # reads frames on a background thread and parses them with the parser as they
+  # come, from a SocketCAN interface (e.g. "can0" or "vcan0") or from a file or
+  # pipe of raw struct can_frame records (canfd_frame ones with canfd=True).
+  # poll() updates the parser's vl, vl_all and ts_nanos with the messages parsed
+  # since the last poll, and can_valid and bus_timeout, which are read from the
+  # reader rather than the parser while it runs. The parser can't be updated
+  # directly, or by another reader, until the reader is stopped.
+  cdef cpp_CANReader *reader
+  cdef bint attached
+
+  cdef readonly:
+    CANParser parser
+    bint can_valid
+    bint bus_timeout
+
+  def __init__(self, CANParser parser, interface=None, path=None, canfd=False):
+    if parser.views:
+      raise RuntimeError("invalid parameter: parsers with views can't be read from a thread")
+    if (interface is None) == (path is None):
+      raise RuntimeError("invalid parameter: either an interface or a path is needed")
+
+    parser._begin_update()
+    self.parser = parser
+    self.attached = True
+    if interface is not None:
+      self.reader = new cpp_CANReader(parser.can, interface)
+    else:
+      self.reader = new cpp_CANReader(parser.can, os.fsencode(path), canfd)
+
+  def __dealloc__(self):
+    if self.reader:
+      with nogil:
+        del self.reader
+    self._detach()
+
+  def poll(self):
+    # returns the addresses parsed since the last poll
+    cdef vector[MessageState*] states
+    with nogil:
+      self.reader.lock()
+    try:
+      self.reader.query_updated(states)
+      self.can_valid = self.parser.can.can_valid
+      self.bus_timeout = self.parser.can.bus_timeout
+      return self.parser._update_vl(states)
+    finally:
+      self.reader.unlock()
+
+  def stop(self):
+    with nogil:
+      self.reader.stop()
+    self._detach()
+
+  cdef _detach(self):
+    if self.attached:
+      self.parser.updating = False
+      self.attached = False
+
+  @property
+  def running(self):
+    # false once stopped, at the end of a file or pipe, or on a read error
+    return self.reader.running()
+
+  @property
+  def error(self):
+    with nogil:
+      self.reader.lock()
+    try:
+      return self.reader.error.decode("utf8") if not self.reader.error.empty() else None
+    finally:
+      self.reader.unlock()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.stop()
+
+
+cdef class CANLogReader:
+  # frames of a candump -l text log or of a binary log (see write_log), read from
+  # the file mapped in memory a chunk at a time. Iterating yields chunks of up to
+  # chunk_frames frames as (nanos, addresses, buses, dlcs, dat) arrays, the input
+  # of CANParser.update_arrays and CANDecoder.decode
+  cdef cpp_CANLogReader *reader
+
+  cdef readonly:
+    size_t chunk_frames
+
+  def __init__(self, path, size_t chunk_frames=65536):
+    if chunk_frames == 0:
+      raise RuntimeError("invalid parameter: chunk_frames must be positive")
+    self.chunk_frames = chunk_frames
+    self.reader = new cpp_CANLogReader(os.fsencode(path))
+
+  def __dealloc__(self):
+    if self.reader:
+      del self.reader
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    nanos = np.empty(self.chunk_frames, dtype=np.uint64)
+    addresses = np.empty(self.chunk_frames, dtype=np.uint32)
+    buses = np.empty(self.chunk_frames, dtype=np.uint8)
+    dlcs = np.empty(self.chunk_frames, dtype=np.uint8)
+    dat = np.empty(self.chunk_frames * 64, dtype=np.uint8)
+
+    cdef uint64_t[::1] nanos_view = nanos
+    cdef uint32_t[::1] addresses_view = addresses
+    cdef uint8_t[::1] buses_view = buses, dlcs_view = dlcs, dat_view = dat
+    cdef uint64_t *nanos_p = &nanos_view[0]
+    cdef uint32_t *addresses_p = &addresses_view[0]
+    cdef uint8_t *buses_p = &buses_view[0]
+    cdef uint8_t *dlcs_p = &dlcs_view[0]
+    cdef uint8_t *dat_p = &dat_view[0]
+    cdef size_t count, stride = 0
+    with nogil:
+      count = self.reader.read(self.chunk_frames, nanos_p, addresses_p, buses_p, dlcs_p, dat_p, stride)
+    if count == 0:
+      raise StopIteration
+    return nanos[:count], addresses[:count], buses[:count], dlcs[:count], dat[:count * stride].reshape(count, stride)
+
+  @property
+  def binary(self):
+    return self.reader.binary
+
+  @property
+  def truncated(self):
+    # a binary log ending with a partial record, e.g. one still being written
+    return self.reader.truncated
+
+  @property
+  def skipped_lines(self):
+    # lines of a text log that aren't candump frames
+    return self.reader.skipped_lines
+
+
+cdef class MessageView:
+  # latest values of one message, updated in place by its parser. `array` is a
+  # read-only float64 array over the parser's values, `index` maps signal names
+  # to positions in it. Also reads like the vl dict of a message.
+  cdef:
+    CANParser parser
+    MessageState *state
+    Py_ssize_t shape[1]
+    Py_ssize_t strides[1]
+
+  cdef readonly:
+    uint32_t address
+    str name
+    dict index
+    object array
+
+  def __init__(self, CANParser parser, uint32_t address, sig_names):
+    cdef const Msg *m = parser.dbc.addr_to_msg.at(address)
+    self.parser = parser
+    self.state = parser.can.get_message_state(address)
+    self.address = address
+    self.name = m.name.decode("utf8")
+    self.index = {sig_name: i for i, sig_name in enumerate(sig_names)}
+    self.shape[0] = self.state.vals.size()
+    self.strides[0] = sizeof(double)
+    self.array = np.asarray(self)
+
+  def __getbuffer__(self, Py_buffer *buffer, int flags):
+    if flags & PyBUF_WRITABLE:
+      raise BufferError("MessageView is read-only")
+    buffer.buf = self.state.vals.data()
+    buffer.format = "d"
+    buffer.internal = NULL
+    buffer.itemsize = sizeof(double)
+    buffer.len = self.shape[0] * sizeof(double)
+    buffer.ndim = 1
+    buffer.obj = self
+    buffer.readonly = 1
+    buffer.shape = self.shape
+    buffer.strides = self.strides
+    buffer.suboffsets = NULL
+
+  @property
+  def ts_nanos(self):
+    return self.state.last_seen_nanos
+
+  def all_values(self, sig_name):
+    # values of the signal in every frame of the last update
+    cdef size_t i = self.index[sig_name]
+    cdef size_t row
+    ret = np.empty(self.state.history_count, dtype=np.float64)
+    cdef double[::1] ret_view = ret
+    for row in range(self.state.history_count):
+      ret_view[row] = self.state.history_at(row, i)
+    return ret
+
+  def __getitem__(self, sig_name):
+    return self.state.vals[self.index[sig_name]]
+
+  def __contains__(self, sig_name):
+    return sig_name in self.index
+
+  def __iter__(self):
+    return iter(self.index)
+
+  def __len__(self):
+    return len(self.index)
+
+  def get(self, sig_name, default=None):
+    return self[sig_name] if sig_name in self.index else default
+
+  def keys(self):
+    return self.index.keys()
+
+  def values(self):
+    return [self.state.vals[i] for i in range(self.state.vals.size())]
+
+  def items(self):
+    return list(zip(self.index, self.values()))
+
+
+Mapping.register(MessageView)
+
+
+cdef class CANDecoder:
+  cdef:
+    cpp_CANParser *can
+    const DBC *dbc
+    vector[pair[uint32_t, int]] signal_v
+    bint updating
+
+  cdef readonly:
+    list signals
+    string dbc_name
+
+  def __init__(self, dbc_name, signals, bus=0):
+    # signals: [(message name or address, signal name), ...]. Signals with a whole
+    #   factor and offset are decoded exactly as int64, the others as float64.
+    #   Unsigned 64-bit values from 2^63 wrap to negative
+    self.dbc_name = dbc_name
+    self.dbc = dbc_lookup(dbc_name)
+    if not self.dbc:
+      raise RuntimeError(f"Can't find DBC: {dbc_name}")
+
+    self.signals = list(signals)
+
+    cdef const Msg *m
+    cdef vector[pair[uint32_t, int]] message_v
+    addresses = set()
+    for msg, sig in self.signals:
+      m = lookup_message(self.dbc, msg, self.dbc_name)
+
+      sig_names = [m.sigs[i].name.decode("utf8") for i in range(m.sigs.size())]
+      if sig not in sig_names:
+        raise RuntimeError(f"could not find signal {repr(sig)} in message {repr(msg)}")
+
+      if m.address not in addresses:
+        addresses.add(m.address)
+        message_v.push_back((m.address, 0))
+      self.signal_v.push_back((m.address, sig_names.index(sig)))
+
+    self.can = new cpp_CANParser(bus, dbc_name, message_v)
+
+  def __dealloc__(self):
+    if self.can:
+      del self.can
+
+  def decode(self, const uint64_t[::1] nanos, const uint32_t[::1] addresses, const uint8_t[::1] buses,
+             const uint8_t[::1] dlcs, const uint8_t[:, ::1] dat):
+    # same input as CANParser.update_arrays, returns every value that passed the
+    # checksum and counter checks: {(message, signal): (ts_nanos, values)}
+    cdef CanFrameBatch batch = frame_batch(nanos, addresses, buses, dlcs, dat)
+    cdef vector[SignalSeries] series
+    # threads as with CANParser
+    if self.updating:
+      raise RuntimeError("CANDecoder is already decoding on another thread")
+    self.updating = True
+    try:
+      with nogil:
+        self.can.decode(batch, self.signal_v, series)
+    finally:
+      self.updating = False
+
+    cdef uint64_t[::1] ts_view
+    cdef double[::1] values_view
+    cdef int64_t[::1] int_view
+    ret = {}
+    for i in range(series.size()):
+      n = series[i].ts_nanos.size()
+      ts = np.empty(n, dtype=np.uint64)
+      values = np.empty(n, dtype=np.int64 if series[i].integer else np.float64)
+      if n > 0:
+        ts_view = ts
+        memcpy(&ts_view[0], series[i].ts_nanos.data(), n * sizeof(uint64_t))
+        if series[i].integer:
+          int_view = values
+          memcpy(&int_view[0], series[i].int_values.data(), n * sizeof(int64_t))
+        else:
+          values_view = values
+          memcpy(&values_view[0], series[i].values.data(), n * sizeof(double))
+      ret[self.signals[i]] = (ts, values)
+    return ret
+
+  def decode_log(self, path, chunk_frames=65536):
+    # decodes a log file a chunk at a time, yields the output of decode for each chunk
+    for chunk in CANLogReader(path, chunk_frames):
+      yield self.decode(*chunk)
+
+
 cdef class CANDefine():
   cdef:
     const DBC *dbc
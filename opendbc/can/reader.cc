@@ -0,0 +1,235 @@
+#include <cerrno>
+#include <cstddef>
+#include <cstring>
+#include <ctime>
+#include <stdexcept>
+
+#include <fcntl.h>
+#include <poll.h>
+#include <unistd.h>
+
+#ifdef __linux__
+#include <net/if.h>
+#include <sys/socket.h>
+#include <linux/can.h>
+#include <linux/can/raw.h>
+#endif
+
+#include "opendbc/can/common.h"
+
+namespace {
+
+// the parser is updated without frames after this long, so timeouts are noticed on a quiet bus
+const int IDLE_TIMEOUT_MS = 10;
+const size_t STREAM_READ_FRAMES = 4096;
+
+// struct canfd_frame of linux/can.h, a struct can_frame is its first 16 bytes
+// with the same header
+const size_t FRAME_HEADER_SIZE = 8;
+const size_t CAN_RECORD_SIZE = FRAME_HEADER_SIZE + 8;
+const size_t CANFD_RECORD_SIZE = FRAME_HEADER_SIZE + 64;
+
+const uint32_t FRAME_EFF_FLAG = 0x80000000U;
+const uint32_t FRAME_RTR_FLAG = 0x40000000U;
+const uint32_t FRAME_ERR_FLAG = 0x20000000U;
+const uint32_t FRAME_EFF_MASK = 0x1FFFFFFFU;
+const uint32_t FRAME_SFF_MASK = 0x000007FFU;
+
+#ifdef __linux__
+const size_t SOCKET_READ_FRAMES = 64;
+
+static_assert(sizeof(can_frame) == CAN_RECORD_SIZE && sizeof(canfd_frame) == CANFD_RECORD_SIZE);
+static_assert(offsetof(canfd_frame, data) == FRAME_HEADER_SIZE);
+#endif
+
+uint64_t monotonic_nanos() {
+  timespec t;
+  clock_gettime(CLOCK_MONOTONIC, &t);
+  return t.tv_sec * 1000000000ULL + t.tv_nsec;
+}
+
+}  // namespace
+
+CANReader::CANReader(CANParser *aparser, const std::string &interface) : parser(aparser) {
+#ifdef __linux__
+  fd = socket(PF_CAN, SOCK_RAW | SOCK_CLOEXEC, CAN_RAW);
+  if (fd < 0) {
+    throw std::runtime_error("Can't open a CAN socket: " + std::string(strerror(errno)));
+  }
+
+  // CAN FD frames too, on interfaces that have them
+  const int enable = 1;
+  setsockopt(fd, SOL_CAN_RAW, CAN_RAW_FD_FRAMES, &enable, sizeof(enable));
+
+  sockaddr_can addr = {};
+  addr.can_family = AF_CAN;
+  addr.can_ifindex = if_nametoindex(interface.c_str());
+  if (addr.can_ifindex == 0 || bind(fd, (sockaddr *)&addr, sizeof(addr)) < 0) {
+    const std::string reason = strerror(errno);
+    close(fd);
+    throw std::runtime_error("Can't open CAN interface " + interface + ": " + reason);
+  }
+
+  is_socket = true;
+  buf.resize(SOCKET_READ_FRAMES * CANFD_RECORD_SIZE);
+  Start();
+#else
+  throw std::runtime_error("SocketCAN is only supported on Linux");
+#endif
+}
+
+CANReader::CANReader(CANParser *aparser, const std::string &path, bool canfd) : parser(aparser) {
+  fd = open(path.c_str(), O_RDONLY | O_CLOEXEC);
+  if (fd < 0) {
+    throw std::runtime_error("Can't open " + path + ": " + strerror(errno));
+  }
+
+  record_size = canfd ? CANFD_RECORD_SIZE : CAN_RECORD_SIZE;
+  buf.resize(STREAM_READ_FRAMES * record_size);
+  Start();
+}
+
+CANReader::~CANReader() {
+  stop();
+  close(fd);
+  close(wake_fds[0]);
+  close(wake_fds[1]);
+}
+
+void CANReader::Start() {
+  if (pipe(wake_fds) != 0) {
+    const std::string reason = strerror(errno);
+    close(fd);
+    throw std::runtime_error("Can't start the CAN reader: " + reason);
+  }
+  can_data.resize(1);
+  thread = std::thread(&CANReader::Run, this);
+}
+
+void CANReader::stop() {
+  if (thread.joinable()) {
+    const char wake = 0;
+    while (write(wake_fds[1], &wake, 1) < 0 && errno == EINTR) {}
+    thread.join();
+  }
+}
+
+void CANReader::query_updated(std::vector<MessageState *> &states) {
+  parser->query_updated(states, query_nanos);
+  query_nanos = 0;
+}
+
+void CANReader::Run() {
+  pollfd fds[2] = {{fd, POLLIN, 0}, {wake_fds[0], POLLIN, 0}};
+  bool ok = true;
+  while (ok) {
+    const int ret = poll(fds, 2, IDLE_TIMEOUT_MS);
+    if (ret < 0) {
+      if (errno != EINTR) {
+        Fail("poll");
+        break;
+      }
+      continue;
+    }
+    if (fds[1].revents != 0) {
+      break;
+    }
+
+    if (fds[0].revents == 0) {
+      Update();
+    } else {
+      ok = is_socket ? ReadSocket() : ReadStream();
+    }
+  }
+  reading = false;
+}
+
+bool CANReader::ReadSocket() {
+#ifdef __linux__
+  mmsghdr msgs[SOCKET_READ_FRAMES] = {};
+  iovec iovs[SOCKET_READ_FRAMES];
+  for (size_t i = 0; i < SOCKET_READ_FRAMES; i++) {
+    iovs[i] = {buf.data() + i * CANFD_RECORD_SIZE, CANFD_RECORD_SIZE};
+    msgs[i].msg_hdr.msg_iov = &iovs[i];
+    msgs[i].msg_hdr.msg_iovlen = 1;
+  }
+
+  const int count = recvmmsg(fd, msgs, SOCKET_READ_FRAMES, MSG_DONTWAIT, nullptr);
+  if (count < 0) {
+    if (errno == EINTR || errno == EAGAIN || errno == EWOULDBLOCK) {
+      return true;
+    }
+    Fail("recvmmsg");
+    return false;
+  }
+
+  for (int i = 0; i < count; i++) {
+    if (msgs[i].msg_len >= CAN_RECORD_SIZE) {
+      AddFrame(buf.data() + i * CANFD_RECORD_SIZE, msgs[i].msg_len - FRAME_HEADER_SIZE);
+    }
+  }
+  Update();
+  return true;
+#else
+  return false;
+#endif
+}
+
+bool CANReader::ReadStream() {
+  const ssize_t n = read(fd, buf.data() + buffered, buf.size() - buffered);
+  if (n < 0) {
+    if (errno == EINTR || errno == EAGAIN) {
+      return true;
+    }
+    Fail("read");
+    return false;
+  }
+  if (n == 0) {
+    return false;  // end of the file or pipe, a partial record is dropped
+  }
+
+  buffered += n;
+  const size_t records = buffered / record_size;
+  for (size_t i = 0; i < records; i++) {
+    AddFrame(buf.data() + i * record_size, record_size - FRAME_HEADER_SIZE);
+  }
+  Update();
+
+  // keep the start of a record split across reads
+  const size_t used = records * record_size;
+  memmove(buf.data(), buf.data() + used, buffered - used);
+  buffered -= used;
+  return true;
+}
+
+void CANReader::AddFrame(const uint8_t *record, size_t max_size) {
+  uint32_t can_id;
+  memcpy(&can_id, record, sizeof(can_id));
+  if ((can_id & (FRAME_RTR_FLAG | FRAME_ERR_FLAG)) != 0) {
+    return;
+  }
+
+  CanFrame &frame = can_data[0].frames.emplace_back();
+  frame.src = parser->bus;
+  frame.address = can_id & ((can_id & FRAME_EFF_FLAG) != 0 ? FRAME_EFF_MASK : FRAME_SFF_MASK);
+  frame.dat = record + FRAME_HEADER_SIZE;
+  frame.size = std::min<size_t>(record[4], max_size);
+}
+
+void CANReader::Update() {
+  can_data[0].nanos = monotonic_nanos();
+  {
+    std::lock_guard lk(mutex);
+    parser->UpdateData(can_data);
+    if (query_nanos == 0) {
+      query_nanos = can_data[0].nanos;
+    }
+  }
+  can_data[0].frames.clear();
+}
+
+void CANReader::Fail(const std::string &what) {
+  const std::string reason = strerror(errno);
+  std::lock_guard lk(mutex);
+  error = what + ": " + reason;
+}
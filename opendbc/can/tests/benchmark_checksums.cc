@@ -0,0 +1,199 @@
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <map>
+#include <random>
+#include <set>
+#include <string>
+#include <vector>
+
+#include "opendbc/can/common.h"
+
+// Times the checksum of each family over the messages of the DBCs using it,
+// next to the bit and byte at a time implementations the table-driven ones
+// replaced, and checks that they agree.
+// usage: benchmark_checksums [iterations]
+
+namespace {
+
+unsigned int chrysler_checksum_bitwise(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) {
+  uint8_t checksum = 0xFF;
+  for (int j = 0; j < (size - 1); j++) {
+    uint8_t shift = 0x80;
+    uint8_t curr = d[j];
+    for (int i = 0; i < 8; i++) {
+      uint8_t bit_sum = curr & shift;
+      uint8_t temp_chk = checksum & 0x80U;
+      if (bit_sum != 0U) {
+        bit_sum = 0x1C;
+        if (temp_chk != 0U) {
+          bit_sum = 1;
+        }
+        checksum = checksum << 1;
+        temp_chk = checksum | 1U;
+        bit_sum ^= temp_chk;
+      } else {
+        if (temp_chk != 0U) {
+          bit_sum = 0x1D;
+        }
+        checksum = checksum << 1;
+        bit_sum ^= checksum;
+      }
+      checksum = bit_sum;
+      shift = shift >> 1;
+    }
+  }
+  return ~checksum & 0xFF;
+}
+
+unsigned int pedal_checksum_bitwise(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) {
+  uint8_t crc = 0xFF;
+  uint8_t poly = 0xD5;
+  for (int i = size-2; i >= 0; i--) {
+    crc ^= d[i];
+    for (int j = 0; j < 8; j++) {
+      if ((crc & 0x80) != 0) {
+        crc = (uint8_t)((crc << 1) ^ poly);
+      } else {
+        crc <<= 1;
+      }
+    }
+  }
+  return crc;
+}
+
+uint16_t crc16_lut_bytewise[256];
+
+unsigned int hkg_can_fd_checksum_bytewise(uint32_t address, const Signal &sig, const uint8_t *d, size_t size) {
+  if (crc16_lut_bytewise[1] == 0) {
+    for (int i = 0; i < 256; i++) {
+      uint16_t crc = i << 8;
+      for (int j = 0; j < 8; j++) {
+        crc = (crc & 0x8000) != 0 ? (uint16_t)((crc << 1) ^ 0x1021) : (uint16_t)(crc << 1);
+      }
+      crc16_lut_bytewise[i] = crc;
+    }
+  }
+
+  uint16_t crc = 0;
+  for (int i = 2; i < size; i++) {
+    crc = (crc << 8) ^ crc16_lut_bytewise[(crc >> 8) ^ d[i]];
+  }
+  crc = (crc << 8) ^ crc16_lut_bytewise[(crc >> 8) ^ ((address >> 0) & 0xFF)];
+  crc = (crc << 8) ^ crc16_lut_bytewise[(crc >> 8) ^ ((address >> 8) & 0xFF)];
+
+  if (size == 8) {
+    crc ^= 0x5f29;
+  } else if (size == 16) {
+    crc ^= 0x041d;
+  } else if (size == 24) {
+    crc ^= 0x819d;
+  } else if (size == 32) {
+    crc ^= 0x9f5b;
+  }
+  return crc;
+}
+
+struct Family {
+  const char *name;
+  unsigned int (*reference)(uint32_t address, const Signal &sig, const uint8_t *d, size_t size);
+};
+
+const std::map<SignalType, Family> families = {
+  {HONDA_CHECKSUM, {"honda", nullptr}},
+  {TOYOTA_CHECKSUM, {"toyota", nullptr}},
+  {PEDAL_CHECKSUM, {"pedal", &pedal_checksum_bitwise}},
+  {VOLKSWAGEN_MQB_CHECKSUM, {"volkswagen_mqb", nullptr}},
+  {XOR_CHECKSUM, {"xor", nullptr}},
+  {SUBARU_CHECKSUM, {"subaru", nullptr}},
+  {CHRYSLER_CHECKSUM, {"chrysler", &chrysler_checksum_bitwise}},
+  {HKG_CAN_FD_CHECKSUM, {"hkg_can_fd", &hkg_can_fd_checksum_bytewise}},
+};
+
+// the messages volkswagen_mqb_checksum knows, it logs every other one
+const std::set<uint32_t> volkswagen_addresses = {
+  0x86, 0x9F, 0xAD, 0xFD, 0x106, 0x117, 0x120, 0x121, 0x122,
+  0x126, 0x12B, 0x12E, 0x187, 0x30C, 0x30F, 0x324, 0x3C0, 0x65D,
+};
+
+struct Frame {
+  uint32_t address;
+  const Signal *sig;
+  std::vector<uint8_t> dat;
+};
+
+template <class F>
+double time_frames(const std::vector<Frame> &frames, int iterations, F checksum, unsigned int &sum) {
+  auto start = std::chrono::steady_clock::now();
+  for (int i = 0; i < iterations; i++) {
+    for (const auto &f : frames) {
+      sum += checksum(f);
+    }
+  }
+  return std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+}
+
+}  // namespace
+
+int main(int argc, char *argv[]) {
+  const int iterations = argc > 1 ? std::atoi(argv[1]) : 200;
+
+  // a few random payloads for each message with a checksum, per family
+  std::mt19937 rng(0);
+  std::map<SignalType, std::vector<Frame>> frames;
+  for (const auto &name : get_dbc_names()) {
+    const DBC *dbc = nullptr;
+    try {
+      dbc = dbc_lookup(name);
+    } catch (std::exception &e) {}
+    if (dbc == nullptr) {
+      continue;
+    }
+
+    for (const auto &msg : dbc->msgs) {
+      for (const auto &sig : msg.sigs) {
+        if (sig.calc_checksum == nullptr ||
+            (sig.type == VOLKSWAGEN_MQB_CHECKSUM && volkswagen_addresses.count(msg.address) == 0)) {
+          continue;
+        }
+        for (int i = 0; i < 16; i++) {
+          Frame &f = frames[sig.type].emplace_back();
+          f.address = msg.address;
+          f.sig = &sig;
+          for (unsigned int j = 0; j < msg.size; j++) {
+            f.dat.push_back(rng());
+          }
+        }
+      }
+    }
+  }
+
+  int failed = 0;
+  unsigned int sum = 0;
+  for (const auto &[type, family_frames] : frames) {
+    const Family &family = families.at(type);
+    const double seconds = time_frames(family_frames, iterations, [](const Frame &f) {
+      return f.sig->calc_checksum(f.address, *f.sig, f.dat.data(), f.dat.size());
+    }, sum);
+    const double ns = seconds * 1e9 / iterations / family_frames.size();
+
+    if (family.reference == nullptr) {
+      printf("%-16s %6zu frames: %6.1f ns/frame\n", family.name, family_frames.size(), ns);
+      continue;
+    }
+
+    for (const auto &f : family_frames) {
+      if (f.sig->calc_checksum(f.address, *f.sig, f.dat.data(), f.dat.size()) != family.reference(f.address, *f.sig, f.dat.data(), f.dat.size())) {
+        failed++;
+      }
+    }
+    const double reference_seconds = time_frames(family_frames, iterations, [&](const Frame &f) {
+      return family.reference(f.address, *f.sig, f.dat.data(), f.dat.size());
+    }, sum);
+    printf("%-16s %6zu frames: %6.1f ns/frame, was %6.1f ns/frame\n", family.name, family_frames.size(), ns,
+           reference_seconds * 1e9 / iterations / family_frames.size());
+  }
+
+  printf("%d mismatches (%u)\n", failed, sum & 1);
+  return failed == 0 ? 0 : 1;
+}
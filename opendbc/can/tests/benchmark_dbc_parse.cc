@@ -0,0 +1,50 @@
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <fstream>
+#include <memory>
+#include <sstream>
+#include <string>
+#include <vector>
+
+#include "opendbc/can/common_dbc.h"
+
+// Parses every DBC in the repo from memory and reports the parser throughput.
+// usage: benchmark_dbc_parse [iterations]
+
+int main(int argc, char *argv[]) {
+  const int iterations = argc > 1 ? std::atoi(argv[1]) : 20;
+
+  std::vector<std::pair<std::string, std::string>> dbcs;
+  size_t total_bytes = 0;
+  for (const auto &name : get_dbc_names()) {
+    std::ifstream infile(std::string(DBC_FILE_PATH) + "/" + name + ".dbc", std::ios::binary);
+    std::string content((std::istreambuf_iterator<char>(infile)), std::istreambuf_iterator<char>());
+
+    // skip DBCs the parser rejects, they would only measure the error path
+    try {
+      std::istringstream stream(content);
+      std::unique_ptr<ChecksumState> checksum(get_checksum(name));
+      delete dbc_parse_from_stream(name, stream, checksum.get());
+    } catch (std::exception &e) {
+      continue;
+    }
+    total_bytes += content.size();
+    dbcs.emplace_back(name, std::move(content));
+  }
+
+  auto start = std::chrono::steady_clock::now();
+  for (int i = 0; i < iterations; i++) {
+    for (const auto &[name, content] : dbcs) {
+      std::istringstream stream(content);
+      std::unique_ptr<ChecksumState> checksum(get_checksum(name));
+      delete dbc_parse_from_stream(name, stream, checksum.get());
+    }
+  }
+  const double seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+
+  const double mb = (double)total_bytes * iterations / (1024 * 1024);
+  printf("parsed %zu DBCs (%.2f MB) %d times in %.3f s: %.1f MB/s\n",
+         dbcs.size(), (double)total_bytes / (1024 * 1024), iterations, seconds, mb / seconds);
+  return 0;
+}
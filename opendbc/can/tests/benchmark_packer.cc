@@ -0,0 +1,66 @@
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <new>
+#include <string>
+#include <vector>
+
+#include "opendbc/can/common.h"
+
+// Constructs a CANPacker for every DBC in the repo and reports the
+// construction time and the heap memory the packers allocate.
+// usage: benchmark_packer [iterations]
+
+static size_t allocated_bytes = 0;
+static size_t allocations = 0;
+
+void* operator new(size_t size) {
+  allocated_bytes += size;
+  allocations++;
+  if (void *p = std::malloc(size)) return p;
+  throw std::bad_alloc();
+}
+
+void operator delete(void *p) noexcept {
+  std::free(p);
+}
+
+void operator delete(void *p, size_t) noexcept {
+  std::free(p);
+}
+
+int main(int argc, char *argv[]) {
+  const int iterations = argc > 1 ? std::atoi(argv[1]) : 20;
+
+  // parse the DBCs up front, only the packers are measured
+  std::vector<std::string> dbc_names;
+  for (const auto &name : get_dbc_names()) {
+    try {
+      if (dbc_lookup(name) != nullptr) {
+        dbc_names.push_back(name);
+      }
+    } catch (std::exception &e) {}
+  }
+
+  const size_t bytes_before = allocated_bytes, allocations_before = allocations;
+  std::vector<CANPacker *> packers;
+  for (const auto &name : dbc_names) {
+    packers.push_back(new CANPacker(name));
+  }
+  const size_t bytes = allocated_bytes - bytes_before, count = allocations - allocations_before;
+  for (auto packer : packers) {
+    delete packer;
+  }
+
+  auto start = std::chrono::steady_clock::now();
+  for (int i = 0; i < iterations; i++) {
+    for (const auto &name : dbc_names) {
+      CANPacker packer(name);
+    }
+  }
+  const double seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+
+  printf("%zu DBCs: %.3f ms to construct all packers, %.1f KiB in %zu allocations\n",
+         dbc_names.size(), seconds * 1000 / iterations, bytes / 1024.0, count);
+  return 0;
+}
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from opendbc.can.parser import CANParser
+from opendbc.can.packer import CANPacker
+
+# Parses the same log with an independent parser per thread, sharing one DBC,
+# and reports the throughput for each thread count. Parsing runs without the
+# GIL, so on a multi-core host it scales close to linearly with the threads.
+# usage: benchmark_parser_threads.py [--frames N] [--threads N]
+
+DBC_NAME = "toyota_new_mc_pt_generated"
+MSGS = ["ACC_CONTROL", "STEERING_LKA", "PCM_CRUISE"]
+
+
+def make_log(frames):
+  # the packer steps the counters, a full cycle of them is repeated
+  packer = CANPacker(DBC_NAME)
+  cycle = [packer.make_can_msg(name, 0, {}) for _ in range(16) for name in MSGS]
+  stride = max(len(dat) for _, dat, _ in cycle)
+  cycle_dat = np.zeros((len(cycle), stride), dtype=np.uint8)
+  for i, (_, dat, _) in enumerate(cycle):
+    cycle_dat[i, :len(dat)] = np.frombuffer(dat, dtype=np.uint8)
+
+  repeats = frames // len(cycle) + 1
+  nanos = np.repeat(np.array(range(repeats * 16), dtype=np.uint64) * 10000000, len(MSGS))[:frames]
+  addresses = np.tile(np.array([address for address, _, _ in cycle], dtype=np.uint32), repeats)[:frames]
+  buses = np.zeros(frames, dtype=np.uint8)
+  dlcs = np.tile(np.array([len(dat) for _, dat, _ in cycle], dtype=np.uint8), repeats)[:frames]
+  dat = np.tile(cycle_dat, (repeats, 1))[:frames]
+  return nanos, addresses, buses, dlcs, dat
+
+
+def parse(log):
+  parser = CANParser(DBC_NAME, [(name, 0) for name in MSGS], 0)
+  nanos, addresses, buses, dlcs, dat = log
+  for i in range(0, len(nanos), 10000):
+    parser.update_arrays(nanos[i:i + 10000], addresses[i:i + 10000], buses[i:i + 10000], dlcs[i:i + 10000],
+                         dat[i:i + 10000])
+
+
+def main():
+  arg_parser = argparse.ArgumentParser()
+  arg_parser.add_argument("--frames", type=int, default=1000000)
+  arg_parser.add_argument("--threads", type=int, default=os.cpu_count())
+  args = arg_parser.parse_args()
+
+  log = make_log(args.frames)
+  parse(log)  # loads the DBC
+
+  base = None
+  for threads in range(1, args.threads + 1):
+    with ThreadPoolExecutor(threads) as executor:
+      start = time.perf_counter()
+      list(executor.map(parse, [log] * threads))
+      elapsed = time.perf_counter() - start
+
+    rate = threads * args.frames / elapsed
+    base = base or rate
+    print(f"{threads:2d} threads: {rate / 1e6:6.2f}M frames/s, {rate / base:.2f}x")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,11 @@
+import os
+import subprocess
+import pytest
+
+TEST_PARSER_ALLOCATIONS = os.path.join(os.path.dirname(__file__), "test_parser_allocations")
+
+
+@pytest.mark.skipif(not os.path.exists(TEST_PARSER_ALLOCATIONS), reason="not built, built with --minimal")
+def test_parser_allocations():
+  # exits non-zero if parsing, or updating a parser, allocated after warming up
+  subprocess.check_call([TEST_PARSER_ALLOCATIONS])
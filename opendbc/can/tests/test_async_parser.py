@@ -0,0 +1,113 @@
+import asyncio
+import selectors
+
+import pytest
+
+from opendbc.can.async_parser import parse_stream
+from opendbc.can.parser import CANParser
+from opendbc.can.packer import CANPacker
+
+DBC_NAME = "honda_civic_touring_2016_can_generated"
+
+
+def steering_entries(count):
+  packer = CANPacker(DBC_NAME)
+  return [[1000000000 + i * 10000000, [packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i})]]
+          for i in range(count)]
+
+
+class VirtualClockSelector(selectors.DefaultSelector):
+  # instead of waiting for the loop's next timer, advances the clock to it
+  now = 0.
+
+  def select(self, timeout=None):
+    events = super().select(None if timeout is None else 0)
+    if not events and timeout:
+      self.now += timeout
+    return events
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+  # timers fire in order of their deadlines without sleeping
+  def __init__(self):
+    self.selector = VirtualClockSelector()
+    super().__init__(self.selector)
+
+  def time(self):
+    return self.selector.now
+
+
+def run_virtual(coro):
+  loop = VirtualClockLoop()
+  try:
+    return loop.run_until_complete(coro)
+  finally:
+    loop.run_until_complete(loop.shutdown_default_executor())
+    loop.close()
+
+
+async def collect(parser, source, **kwargs):
+  batches = []
+  async for updated in parse_stream(parser, source, **kwargs):
+    assert updated == {0xE4}
+    batches.append(list(parser.vl_all["STEERING_CONTROL"]["STEER_TORQUE"]))
+  return batches
+
+
+class TestParseStream:
+  def test_batch_frames(self):
+    async def source():
+      for entry in steering_entries(95):
+        yield entry
+
+    parser = CANParser(DBC_NAME, [("STEERING_CONTROL", 0)])
+    batches = asyncio.run(collect(parser, source(), max_frames=10, max_delay=10.))
+    assert [len(b) for b in batches] == [10] * 9 + [5]
+    assert sum(batches, []) == list(range(95))
+
+  def test_batch_delay(self):
+    async def run():
+      loop = asyncio.get_running_loop()
+      queue = asyncio.Queue()
+      parser = CANParser(DBC_NAME, [("STEERING_CONTROL", 0)])
+      task = asyncio.create_task(collect(parser, queue, max_frames=1000, max_delay=0.05))
+      entries = steering_entries(20)
+      for entry in entries[:10]:
+        queue.put_nowait(entry)
+      # the first batch is due before the rest arrives
+      await asyncio.sleep(0.2)
+      assert loop.time() == pytest.approx(0.2)
+      for entry in entries[10:]:
+        queue.put_nowait(entry)
+      queue.put_nowait(None)
+      return await task
+
+    assert run_virtual(run()) == [list(range(10)), list(range(10, 20))]
+
+  def test_backpressure(self):
+    read = 0
+    async def source():
+      nonlocal read
+      for entry in steering_entries(100):
+        read += 1
+        yield entry
+
+    async def run():
+      parser = CANParser(DBC_NAME, [("STEERING_CONTROL", 0)])
+      stream = parse_stream(parser, source(), max_frames=5)
+      await stream.__anext__()
+      # the consumer is slow, the source is only read ahead by a bounded amount
+      await asyncio.sleep(0.05)
+      assert read <= 5 + 5 + 1
+      await stream.aclose()
+
+    asyncio.run(run())
+
+  def test_source_error(self):
+    async def source():
+      yield steering_entries(1)[0]
+      raise ValueError("source failed")
+
+    parser = CANParser(DBC_NAME, [("STEERING_CONTROL", 0)])
+    with pytest.raises(ValueError):
+      asyncio.run(collect(parser, source()))
@@ -2,6 +2,22 @@ from opendbc.can.parser import CANParser
 from opendbc.can.packer import CANPacker
 
 
+def crc8(dat, poly, crc):
+  for b in dat:
+    crc ^= b
+    for _ in range(8):
+      crc = ((crc << 1) ^ poly if crc & 0x80 else crc << 1) & 0xFF
+  return crc
+
+
+def crc16(dat, poly, crc):
+  for b in dat:
+    crc ^= b << 8
+    for _ in range(8):
+      crc = ((crc << 1) ^ poly if crc & 0x8000 else crc << 1) & 0xFFFF
+  return crc
+
+
 class TestCanChecksums:
 
   def test_honda_checksum(self):
@@ -31,3 +47,28 @@ class TestCanChecksums:
 
       assert parser.vl['LKAS_HUD']['CHECKSUM'] == std
       assert parser.vl['LKAS_HUD_A']['CHECKSUM'] == ext
+
+  def test_chrysler_checksum(self):
+    """Test the Chrysler checksum against a bitwise CRC-8 SAE J1850"""
+    packer = CANPacker("chrysler_ram_hd_generated")
+
+    for angle in range(-500, 500, 7):
+      _, dat, _ = packer.make_can_msg("STEERING", 0, {"STEERING_ANGLE": angle, "STEERING_RATE": -angle})
+      assert dat[7] == ~crc8(dat[:7], 0x1D, 0xFF) & 0xFF
+
+  def test_hkg_can_fd_checksum(self):
+    """Test the Hyundai CAN FD checksum against a bitwise CRC-16 XMODEM, for each payload length"""
+    packer = CANPacker("hyundai_canfd")
+    messages = {
+      "ADRV_0x200": (8, 0x5f29),
+      "LKAS": (16, 0x041d),
+      "GEAR": (24, 0x819d),
+      "ACCELERATOR": (32, 0x9f5b),
+    }
+
+    for name, (size, xor) in messages.items():
+      for counter in range(0, 256, 5):
+        address, dat, _ = packer.make_can_msg(name, 0, {"COUNTER": counter})
+        assert len(dat) == size
+        crc = crc16(bytes(dat[2:]) + bytes([address & 0xFF, address >> 8]), 0x1021, 0)
+        assert int.from_bytes(dat[:2], "little") == crc ^ xor
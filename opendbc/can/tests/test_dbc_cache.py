@@ -0,0 +1,102 @@
+import os
+import shutil
+import subprocess
+import sys
+
+from opendbc import DBC_PATH
+
+DBC_NAME = "honda_civic_touring_2016_can_generated"
+
+# runs in a fresh process, so the DBC is loaded through the cache every time
+LOAD_DBC = """
+import sys
+from opendbc.can.parser import CANParser, CANDefine
+from opendbc.can.packer import CANPacker
+
+path = sys.argv[1]
+packer = CANPacker(path)
+parser = CANParser(path, [("STEERING_CONTROL", 0)])
+parser.update_strings([0, [packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": -123})]])
+print(sorted(parser.vl["STEERING_CONTROL"].items()), CANDefine(path).dv["STEER_STATUS"])
+"""
+
+
+class TestDBCCache:
+  def _load(self, tmp_path, dbc_path):
+    env = {**os.environ, "OPENDBC_CACHE_DIR": str(tmp_path / "cache")}
+    return subprocess.check_output([sys.executable, "-c", LOAD_DBC, dbc_path], env=env, encoding="utf8")
+
+  def test_cache(self, tmp_path):
+    dbc_path = str(tmp_path / f"{DBC_NAME}.dbc")
+    shutil.copyfile(os.path.join(DBC_PATH, f"{DBC_NAME}.dbc"), dbc_path)
+
+    parsed = self._load(tmp_path, dbc_path)
+    assert "('STEER_TORQUE', -123.0)" in parsed
+    assert len(os.listdir(tmp_path / "cache")) == 1
+    assert self._load(tmp_path, dbc_path) == parsed
+
+    # a touched but unchanged source still uses the cache
+    os.utime(dbc_path, ns=(0, 0))
+    assert self._load(tmp_path, dbc_path) == parsed
+
+    # edited in place with the same size and mtime, the content is still checked
+    with open(dbc_path) as f:
+      dbc = f.read()
+    with open(dbc_path, "w") as f:
+      f.write(dbc.replace("permanent_fault", "permanent_faulx"))
+    os.utime(dbc_path, ns=(0, 0))
+    edited = self._load(tmp_path, dbc_path)
+    assert "PERMANENT_FAULX" in edited
+    assert edited.replace("PERMANENT_FAULX", "PERMANENT_FAULT") == parsed
+
+    # an edited source is parsed again
+    with open(dbc_path, "w") as f:
+      f.write(dbc.replace("permanent_fault", "permanent_error"))
+    edited = self._load(tmp_path, dbc_path)
+    assert "PERMANENT_ERROR" in edited
+    assert edited.replace("PERMANENT_ERROR", "PERMANENT_FAULT") == parsed
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+  def test_cache_hit(self, tmp_path):
+    dbc_path = str(tmp_path / f"{DBC_NAME}.dbc")
+    shutil.copyfile(os.path.join(DBC_PATH, f"{DBC_NAME}.dbc"), dbc_path)
+    parsed = self._load(tmp_path, dbc_path)
+    (cache_path,) = (tmp_path / "cache").iterdir()
+
+    def tamper(header=b""):
+      # edits the cached DBC but not its source, so it's only seen if the cache is served.
+      # the header is magic (4), version (4), fingerprint (8) and content hash (8)
+      cache = bytearray(cache_path.read_bytes())
+      cache = cache.replace(b"PERMANENT_FAULT", b"PERMANENT_FAULX")
+      assert b"PERMANENT_FAULX" in cache
+      cache[8:8 + len(header)] = header
+      cache_path.write_bytes(bytes(cache))
+
+    # a hit is served from the cache without parsing the source
+    tamper()
+    cached = self._load(tmp_path, dbc_path)
+    assert "PERMANENT_FAULX" in cached
+    assert cached.replace("PERMANENT_FAULX", "PERMANENT_FAULT") == parsed
+
+    # a stale content hash or build fingerprint parses the source again, and rewrites the cache
+    fingerprint, content_hash = cache_path.read_bytes()[8:16], cache_path.read_bytes()[16:24]
+    stale = bytes(b ^ 0xff for b in fingerprint + content_hash)
+    for header in (stale[:8], fingerprint + stale[8:]):
+      tamper(header)
+      assert self._load(tmp_path, dbc_path) == parsed
+      assert cache_path.read_bytes()[8:24] == fingerprint + content_hash
+      assert b"PERMANENT_FAULX" not in cache_path.read_bytes()
+
+  def test_cache_disabled(self, tmp_path):
+    # opt-in, nothing is written without OPENDBC_CACHE_DIR
+    dbc_path = str(tmp_path / f"{DBC_NAME}.dbc")
+    shutil.copyfile(os.path.join(DBC_PATH, f"{DBC_NAME}.dbc"), dbc_path)
+    home = tmp_path / "home"
+    env = {k: v for k, v in os.environ.items() if k != "OPENDBC_CACHE_DIR"}
+    env.update(HOME=str(home), XDG_CACHE_HOME=str(home / ".cache"))
+    out = subprocess.check_output([sys.executable, "-c", LOAD_DBC, dbc_path], env=env, encoding="utf8")
+    assert not home.exists()
+
+    env["OPENDBC_CACHE_DIR"] = ""
+    assert subprocess.check_output([sys.executable, "-c", LOAD_DBC, dbc_path], env=env, encoding="utf8") == out
+    assert out == self._load(tmp_path, dbc_path)
@@ -28,3 +28,23 @@ class TestCanParserPackerExceptions:
     CANParser(dbc_file, [], 0)
     CANPacker(dbc_file)
     CANDefine(dbc_file)
+
+  def test_bad_lines(self, tmp_path, subtests):
+    bad_lines = [
+      ("BO_ 100 MSG: 8", "bad BO"),
+      ("BO_ 100 MSG 8 XXX", "bad BO"),
+      ('BO_ 100 MSG: 8 XXX\n SG_ SIG : 0|8@1+ (1,0) [0|255] "" XXX extra', None),
+      (' SG_ SIG : 0|8@1 (1,0) [0|255] "" XXX', "bad SG"),
+      (' SG_ SIG : 0|8@1+ (1,0) [0|255] XXX', "bad SG"),
+      ('VAL_ 100 SIG A "A" 1 "B" ;', "bad VAL"),
+      ("VAL_ 100 SIG ;", "bad VAL"),
+    ]
+    for i, (line, error) in enumerate(bad_lines):
+      with subtests.test(line=line):
+        dbc_path = tmp_path / f"bad_lines_{i}.dbc"
+        dbc_path.write_text(line + "\n")
+        if error is None:
+          CANDefine(str(dbc_path))
+        else:
+          with pytest.raises(RuntimeError, match=rf"\[bad_lines_{i}.dbc:\d+\] {error}: "):
+            CANDefine(str(dbc_path))
@@ -1,5 +1,12 @@
-from opendbc.can.parser import CANParser
-from opendbc.can.tests import ALL_DBCS
+import locale
+import os
+import shutil
+import pytest
+
+from opendbc import DBC_PATH
+from opendbc.can.packer import CANPacker
+from opendbc.can.parser import CANParser, CANDefine, preload_dbcs, invalidate_dbcs, reload_dbc
+from opendbc.can.tests import ALL_DBCS, TEST_DBC
 
 
 class TestDBCParser:
@@ -19,3 +26,67 @@ class TestDBCParser:
     for dbc in ALL_DBCS:
       with subtests.test(dbc=dbc):
         CANParser(dbc, [], 0)
+
+  def test_preload_dbcs(self):
+    dbcs = ["honda_civic_touring_2016_can_generated", "toyota_new_mc_pt_generated", TEST_DBC]
+    preload_dbcs(dbcs * 4, workers=8)
+    for dbc in dbcs:
+      CANParser(dbc, [], 0)
+
+    preload_dbcs([], workers=8)
+    with pytest.raises(RuntimeError, match="Can't find DBC: abcdef"):
+      preload_dbcs(dbcs + ["abcdef"], workers=2)
+
+  def test_parse_locale(self, tmp_path):
+    # numbers are parsed in the C locale whatever the process' locale, which isn't changed
+    dbc_name = "honda_civic_touring_2016_can_generated"
+    msg = CANPacker(dbc_name).make_can_msg("WHEEL_SPEEDS", 0, {"WHEEL_SPEED_FL": 12.34})
+
+    original = locale.setlocale(locale.LC_NUMERIC)
+    try:
+      for name in ("de_DE.UTF-8", "de_DE.utf8", "fr_FR.UTF-8", "C.UTF-8"):
+        try:
+          numeric = locale.setlocale(locale.LC_NUMERIC, name)
+          break
+        except locale.Error:
+          pass
+      else:
+        pytest.skip("no locale to test with")
+
+      dbc_path = str(tmp_path / f"{dbc_name}.dbc")
+      shutil.copyfile(os.path.join(DBC_PATH, f"{dbc_name}.dbc"), dbc_path)
+      preload_dbcs([dbc_path], workers=2)
+      assert locale.setlocale(locale.LC_NUMERIC) == numeric
+
+      parser = CANParser(dbc_path, [("WHEEL_SPEEDS", 0)], 0)
+      parser.update_strings([0, [msg]])
+      assert parser.vl["WHEEL_SPEEDS"]["WHEEL_SPEED_FL"] == pytest.approx(12.34)
+    finally:
+      locale.setlocale(locale.LC_NUMERIC, original)
+
+  def test_reload_dbc(self, tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENDBC_CACHE_DIR", str(tmp_path / "cache"))
+    dbc_path = str(tmp_path / "honda_civic_touring_2016_can_generated.dbc")
+    shutil.copyfile(os.path.join(DBC_PATH, "honda_civic_touring_2016_can_generated.dbc"), dbc_path)
+    assert "PERMANENT_FAULT" in CANDefine(dbc_path).dv["STEER_STATUS"]["STEER_STATUS"].values()
+
+    # loaded DBCs are used until reloaded
+    with open(dbc_path) as f:
+      dbc = f.read()
+    with open(dbc_path, "w") as f:
+      f.write(dbc.replace("permanent_fault", "permanent_error"))
+    assert "PERMANENT_FAULT" in CANDefine(dbc_path).dv["STEER_STATUS"]["STEER_STATUS"].values()
+    reload_dbc(dbc_path)
+    assert "PERMANENT_ERROR" in CANDefine(dbc_path).dv["STEER_STATUS"]["STEER_STATUS"].values()
+
+    # lookups of a loaded DBC don't touch the file
+    os.remove(dbc_path)
+    CANDefine(dbc_path)
+    invalidate_dbcs([dbc_path])
+    with pytest.raises(RuntimeError):
+      CANDefine(dbc_path)
+    with pytest.raises(RuntimeError):
+      reload_dbc(dbc_path)
+
+    invalidate_dbcs()
+    CANParser("honda_civic_touring_2016_can_generated", [("STEERING_CONTROL", 0)], 0)
@@ -0,0 +1,49 @@
+import time
+
+from opendbc.can.parser import CANParser, capture_logs, read_logs
+from opendbc.can.packer import CANPacker
+
+DBC_NAME = "honda_civic_touring_2016_can_generated"
+
+
+class TestLogger:
+  def test_capture(self):
+    packer = CANPacker(DBC_NAME)
+    parser = CANParser(DBC_NAME, [("STEERING_CONTROL", 0)])
+    msg = packer.make_can_msg("STEERING_CONTROL", 0, {"COUNTER": 0})
+
+    capture_logs(100)
+    try:
+      # a burst of bad counters is rate limited, a few messages at the start of each 100ms
+      start = time.monotonic()
+      for _ in range(10000):
+        parser.update_strings([0, [msg]])
+      windows = (time.monotonic() - start) / 0.1 + 1
+      logs, dropped = read_logs()
+      assert dropped == 0
+      assert 0 < len(logs) <= 2 * 2 * (windows + 1)
+      assert any("COUNTER FAIL" in m for _, _, m in logs)
+      assert any("message checks failed" in m for _, _, m in logs)
+
+      # suppressed messages are counted by the next one that's logged
+      time.sleep(0.15)
+      parser.update_strings([0, [msg]])
+      logs, _ = read_logs()
+      assert any("similar messages suppressed" in m for _, _, m in logs)
+
+      assert read_logs() == ([], 0)
+    finally:
+      capture_logs(0)
+
+  def test_capture_overflow(self):
+    packer = CANPacker(DBC_NAME)
+    capture_logs(2)
+    try:
+      for i in range(5):
+        packer.make_can_msg("STEERING_CONTROL", 0, {f"UNKNOWN_{i}": 0})
+      logs, dropped = read_logs()
+      assert dropped == 3
+      assert [m for _, _, m in logs] == ["undefined signal UNKNOWN_3 - 228", "undefined signal UNKNOWN_4 - 228"]
+      assert all(level == 40 for _, level, _ in logs)
+    finally:
+      capture_logs(0)
@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+
+from opendbc.can.logreader import CANLogReader, decode_logs, merge_decoded, write_log
+from opendbc.can.parser import CANDecoder
+from opendbc.can.packer import CANPacker
+
+DBC_NAME = "honda_civic_touring_2016_can_generated"
+
+
+def read_frames(path, chunk_frames):
+  frames = []
+  for nanos, addresses, buses, dlcs, dat in CANLogReader(path, chunk_frames):
+    assert dat.shape == (len(nanos), max(max(dlcs), 1))
+    for i in range(len(nanos)):
+      assert not dat[i, dlcs[i]:].any()
+      frames.append((int(nanos[i]), int(addresses[i]), bytes(dat[i, :dlcs[i]]), int(buses[i])))
+  return frames
+
+
+def steering_frames(count):
+  # alternating between two buses, packers have a counter per message
+  packers = [CANPacker(DBC_NAME), CANPacker(DBC_NAME)]
+  frames = []
+  for i in range(count):
+    address, dat, bus = packers[i % 2].make_can_msg("STEERING_CONTROL", i % 2, {"STEER_TORQUE": i})
+    frames.append((1000000000 + i * 10000000, address, dat, bus))
+  return frames
+
+
+class TestCANLogReader:
+  def test_candump(self, tmp_path):
+    lines = [
+      "(1436509052.249713) can0 0E4#12345678",
+      "(1436509052.249713) vcan1 18DAF110#0210030000000000",
+      "(1436509052.3) can2 200##1" + "AB" * 12,
+      "(1436509052.4) can0 7DF#R",
+      "(1436509052.5) can0 20000080#0000000000000000",
+      "not a frame",
+      "(1436509052.6) can0 123#123",
+      "(1436509052.7) can0 004#\r",
+      "",
+      "(1436509052.8) can0 0E4#01 R",
+    ]
+    path = tmp_path / "candump.log"
+    path.write_text("\n".join(lines))
+
+    expected = [
+      (1436509052249713000, 0xE4, bytes.fromhex("12345678"), 0),
+      (1436509052249713000, 0x18DAF110, bytes.fromhex("0210030000000000"), 1),
+      (1436509052300000000, 0x200, b"\xab" * 12, 2),
+      (1436509052700000000, 0x4, b"", 0),
+      (1436509052800000000, 0xE4, b"\x01", 0),
+    ]
+    for chunk_frames in (1, 2, 100):
+      assert read_frames(path, chunk_frames) == expected
+
+    reader = CANLogReader(path)
+    list(reader)
+    assert not reader.binary
+    assert reader.skipped_lines == 2
+
+  def test_binary(self, tmp_path):
+    frames = steering_frames(1000)
+    path = tmp_path / "frames.bin"
+    write_log(path, frames)
+
+    reader = CANLogReader(path, 300)
+    assert [len(chunk[0]) for chunk in reader] == [300, 300, 300, 100]
+    assert reader.binary and not reader.truncated
+    assert read_frames(path, 300) == frames
+
+    # a log being written ends with a partial record
+    path.write_bytes(path.read_bytes()[:-3])
+    reader = CANLogReader(path)
+    assert sum(len(chunk[0]) for chunk in reader) == 999
+    assert reader.truncated
+
+  def test_empty(self, tmp_path):
+    for data in (b"", b"ODBCLOG1"):
+      path = tmp_path / "empty.log"
+      path.write_bytes(data)
+      assert list(CANLogReader(path)) == []
+
+  def test_invalid(self, tmp_path):
+    with pytest.raises(RuntimeError):
+      CANLogReader(tmp_path / "nonexistent.log")
+
+    path = tmp_path / "frames.bin"
+    path.write_bytes(b"ODBCLOG1" + bytes(12) + b"\x00\x41")
+    with pytest.raises(RuntimeError):
+      list(CANLogReader(path))
+
+    # the frames before an invalid record are still read
+    frames = steering_frames(10)
+    write_log(path, frames)
+    with open(path, "ab") as f:
+      f.write(bytes(12) + b"\x00\x41")
+    reader = CANLogReader(path, 64)
+    nanos, _, _, _, _ = next(reader)
+    assert nanos.tolist() == [f[0] for f in frames]
+    with pytest.raises(RuntimeError):
+      next(reader)
+
+  def test_decode_log(self, tmp_path):
+    frames = steering_frames(1000)
+    path = tmp_path / "frames.bin"
+    write_log(path, frames)
+
+    decoder = CANDecoder(DBC_NAME, [("STEERING_CONTROL", "STEER_TORQUE")], bus=1)
+    chunks = list(decoder.decode_log(path, 128))
+    assert len(chunks) == 8
+    ts = np.concatenate([c[("STEERING_CONTROL", "STEER_TORQUE")][0] for c in chunks])
+    values = np.concatenate([c[("STEERING_CONTROL", "STEER_TORQUE")][1] for c in chunks])
+    assert ts.tolist() == [f[0] for f in frames if f[3] == 1]
+    assert values.tolist() == list(range(1, 1000, 2))
+
+  def test_decode_logs(self, tmp_path):
+    frames = steering_frames(1000)
+    paths = []
+    for i in range(5):
+      paths.append(tmp_path / f"segment{i}.bin")
+      write_log(paths[-1], frames[i * 200:(i + 1) * 200])
+    paths.append(tmp_path / "empty.bin")
+    write_log(paths[-1], [])
+
+    signals = [("STEERING_CONTROL", "STEER_TORQUE")]
+    results = list(decode_logs(DBC_NAME, signals, paths, bus=1, processes=3, chunk_frames=64))
+    assert [r[0] for r in results] == [str(p) for p in paths]
+    assert [r[2].frames for r in results] == [200] * 5 + [0]
+
+    ts, values = merge_decoded([r[1] for r in results])[signals[0]]
+    assert ts.tolist() == [f[0] for f in frames if f[3] == 1]
+    assert values.tolist() == list(range(1, 1000, 2))
+
+    # written per segment
+    out_dir = tmp_path / "out"
+    results = list(decode_logs(DBC_NAME, signals, paths[:2], bus=1, processes=2, output_dir=out_dir))
+    with np.load(results[1][1]) as f:
+      assert f["STEERING_CONTROL.STEER_TORQUE.values"].tolist() == list(range(201, 400, 2))
+
+    # segments of a route share their basename, each one keeps its own output
+    route_paths = []
+    for i in range(2):
+      route_paths.append(tmp_path / f"route--{i}" / "rlog")
+      route_paths[-1].parent.mkdir()
+      write_log(route_paths[-1], frames[i * 200:(i + 1) * 200])
+    results = list(decode_logs(DBC_NAME, signals, route_paths, bus=1, processes=2, output_dir=out_dir))
+    assert len({r[1] for r in results}) == 2
+    for i, (_, out, _) in enumerate(results):
+      with np.load(out) as f:
+        assert f["STEERING_CONTROL.STEER_TORQUE.values"].tolist() == list(range(i * 200 + 1, (i + 1) * 200, 2))
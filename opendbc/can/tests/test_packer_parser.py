@@ -1,13 +1,28 @@
+import numpy as np
 import pytest
 import random
+from concurrent.futures import ThreadPoolExecutor
 
-from opendbc.can.parser import CANParser
+from opendbc.can.parser import CANParser, CANDecoder, MultiBusCANParser
 from opendbc.can.packer import CANPacker
 from opendbc.can.tests import TEST_DBC
 
 MAX_BAD_COUNTER = 5
 
 
+def can_strings_to_arrays(can_strings):
+  frames = [(t, f) for t, fs in can_strings for f in fs]
+  stride = max(len(f[1]) for _, f in frames)
+  nanos = np.array([t for t, _ in frames], dtype=np.uint64)
+  addresses = np.array([f[0] for _, f in frames], dtype=np.uint32)
+  buses = np.array([f[2] for _, f in frames], dtype=np.uint8)
+  dlcs = np.array([len(f[1]) for _, f in frames], dtype=np.uint8)
+  dat = np.zeros((len(frames), stride), dtype=np.uint8)
+  for i, (_, f) in enumerate(frames):
+    dat[i, :len(f[1])] = np.frombuffer(f[1], dtype=np.uint8)
+  return nanos, addresses, buses, dlcs, dat
+
+
 class TestCanParserPacker:
   def test_packer(self):
     packer = CANPacker(TEST_DBC)
@@ -91,6 +106,96 @@ class TestCanParserPacker:
     parser.update_strings([0, [msg]])
     assert parser.can_valid
 
+  def test_parser_timeout_can_valid(self):
+    """
+    Compares can_valid with a scan over every message, while messages with
+    different frequencies stop, recover and arrive with out of order timestamps
+    """
+    dbc_file = "honda_civic_touring_2016_can_generated"
+    msgs = [("VSA_STATUS", 50), ("WHEEL_SPEEDS", 50), ("ENGINE_DATA", 100), ("POWERTRAIN_DATA", 100),
+            ("SEATBELT_STATUS", 10), ("GEARBOX", 0)]
+    packer = CANPacker(dbc_file)
+    parser = CANParser(dbc_file, msgs, 0)
+
+    random.seed(0)
+    last_seen = {name: 0 for name, _ in msgs}
+    stopped = set()
+    invalid_cnt = 20
+    t = 0
+    for _ in range(5000):
+      t = max(t + random.randrange(-5, 15) * 1_000_000, 1)
+      if random.random() < 0.02:
+        stopped ^= {random.choice(msgs)[0]}
+      sent = [name for name, _ in msgs if name not in stopped and random.random() < 0.9]
+      parser.update_strings([t, [packer.make_can_msg(name, 0, {}) for name in sent]])
+
+      for name in sent:
+        last_seen[name] = t
+      valid = all(last_seen[name] != 0 and 0 <= t - last_seen[name] <= (1_000_000_000 // freq) * 10
+                  for name, freq in msgs if freq > 0)
+      invalid_cnt = 0 if valid else invalid_cnt + 1
+      assert parser.can_valid == (invalid_cnt < 20)
+
+  def test_parser_timeout_backwards(self):
+    # a message seen again with an older timestamp is the oldest of its group
+    dbc_file = "honda_civic_touring_2016_can_generated"
+    msgs = [("VSA_STATUS", 50), ("WHEEL_SPEEDS", 50), ("SEATBELT_STATUS", 50)]
+    packer = CANPacker(dbc_file)
+    parser = CANParser(dbc_file, msgs, 0)
+
+    t = 10_000_000_000
+    parser.update_strings([t, [packer.make_can_msg(name, 0, {}) for name, _ in msgs]])
+    assert parser.can_valid
+    parser.update_strings([t - 8_000_000_000, [packer.make_can_msg("SEATBELT_STATUS", 0, {})]])
+    for i in range(1, 25):
+      parser.update_strings([t + i * 5_000_000, [packer.make_can_msg("WHEEL_SPEEDS", 0, {})]])
+    assert not parser.can_valid
+
+  def test_stats(self):
+    dbc_file = "honda_civic_touring_2016_can_generated"
+    packer = CANPacker(dbc_file)
+    parser = CANParser(dbc_file, [("STEERING_CONTROL", 100), ("GEARBOX", 0)], 0)
+
+    for i in range(10):
+      t = int(0.01 * i * 1e9)
+      parser.update_strings([t, [packer.make_can_msg("STEERING_CONTROL", 0, {}),
+                                 packer.make_can_msg("VSA_STATUS", 0, {}),
+                                 packer.make_can_msg("GEARBOX", 1, {})]])
+    # a bad checksum, a 1s gap, a repeated counter and an oversized frame
+    addr, dat, _ = packer.make_can_msg("STEERING_CONTROL", 0, {})
+    parser.update_strings([int(0.1e9), [[addr, dat[:-1] + bytes([dat[-1] ^ 1]), 0]]])
+    parser.update_strings([int(1.1e9), [packer.make_can_msg("STEERING_CONTROL", 0, {"COUNTER": 2})]])
+    parser.update_strings([int(1.11e9), [packer.make_can_msg("STEERING_CONTROL", 0, {"COUNTER": 2})]])
+    parser.update_strings([int(1.12e9), [[addr, bytes(65), 0]]])
+
+    stats = parser.stats()
+    assert stats["frames"] == 24
+    assert stats["oversized"] == 1
+    assert stats["bytes"] == 13 * len(dat) + 10 * len(packer.make_can_msg("VSA_STATUS", 0, {})[1]) + 65
+    assert stats["update_cans_nanos"] > 0 and stats["update_valid_nanos"] > 0 and stats["query_nanos"] > 0
+    assert stats["messages"][0xE4] == {
+      "name": "STEERING_CONTROL",
+      "frames_seen": 13,
+      "frames_parsed": 12,
+      "checksum_failures": 1,
+      "counter_failures": 2,
+      "timeouts": 1,
+    }
+    assert stats["messages"][0x191]["frames_seen"] == 0
+
+    parser.reset_stats()
+    stats = parser.stats()
+    assert stats["frames"] == stats["update_cans_nanos"] == 0
+    assert stats["messages"][0xE4]["frames_seen"] == 0
+
+    packer_stats = packer.stats()
+    assert packer_stats["frames"] == 34
+    assert packer_stats["messages"][0xE4] == {"name": "STEERING_CONTROL", "frames": 13}
+    packer.make_can_msg("STEERING_CONTROL", 0, {"UNKNOWN_SIGNAL": 0})
+    packer.make_can_msg(0x7FF, 0, {})
+    packer_stats = packer.stats()
+    assert packer_stats["undefined_signals"] == packer_stats["undefined_addresses"] == 1
+
   def test_parser_no_partial_update(self):
     """
     Ensure that the CANParser doesn't partially update messages with invalid signals (COUNTER/CHECKSUM).
@@ -126,6 +231,30 @@ class TestCanParserPacker:
     assert parser.vl["STEERING_CONTROL"]["STEER_TORQUE"] == 300
     assert parser.vl_all["STEERING_CONTROL"]["STEER_TORQUE"] == [300]
 
+  def test_payload_types(self):
+    packer = CANPacker("honda_civic_touring_2016_can_generated")
+    parser = CANParser("honda_civic_touring_2016_can_generated", [("STEERING_CONTROL", 0)], 0)
+
+    convert = [bytes, bytearray, memoryview, list, lambda dat: np.frombuffer(dat, dtype=np.uint8)]
+    for i, f in enumerate(convert * 2):
+      address, dat, bus = packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i})
+      parser.update_strings([i, [[address, f(dat), bus]]])
+      assert parser.vl["STEERING_CONTROL"]["STEER_TORQUE"] == i
+      assert parser.can_valid
+
+    # arrays of wider integers are converted per element, not by their raw bytes
+    for i, dtype in enumerate((np.int64, np.uint16, np.int32), start=100):
+      address, dat, bus = packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i})
+      parser.update_strings([i, [[address, np.frombuffer(dat, dtype=np.uint8).astype(dtype), bus]]])
+      assert parser.vl["STEERING_CONTROL"]["STEER_TORQUE"] == i
+      assert parser.can_valid
+
+    # anything else isn't a payload, an int isn't read as that many zero bytes
+    address, dat, bus = packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": 0})
+    for bad in (8, "12345678", None):
+      with pytest.raises(RuntimeError):
+        parser.update_strings([200, [[address, bad, bus]]])
+
   def test_packer_parser(self):
     msgs = [
       ("Brake_Status", 0),
@@ -163,6 +292,277 @@ class TestCanParserPacker:
         for sig in ("STEER_TORQUE", "STEER_TORQUE_REQUEST", "COUNTER", "CHECKSUM"):
           assert parser.vl["STEERING_CONTROL"][sig] == parser.vl[228][sig]
 
+  def test_make_can_msgs(self):
+    packer = CANPacker(TEST_DBC)
+    packer_single = CANPacker(TEST_DBC)
+
+    for i in range(300):
+      msgs = [
+        ("STEERING_CONTROL", 0, {"STEER_TORQUE": i}),
+        (245, 1, {"SIGNED": -i}),
+        ("CAN_FD_MESSAGE", 2, {"COUNTER": i % 7}),
+      ]
+      assert packer.make_can_msgs(msgs) == [packer_single.make_can_msg(*m) for m in msgs]
+    assert packer.make_can_msgs([]) == []
+
+    # any iterable, undefined messages are packed empty
+    msgs = [("UNDEFINED_MESSAGE", 0, {}), (245, 1, {"SIGNED": 1})]
+    assert packer.make_can_msgs(iter(msgs)) == [packer_single.make_can_msg(*m) for m in msgs]
+    assert packer.make_can_msgs(msgs)[0] == [0, b"", 0]
+
+    # threads sharing a packer are serialized, none of the calls raise
+    prepared = packer.prepare("STEERING_CONTROL", ["STEER_TORQUE"])
+    calls = [
+      lambda: packer.make_can_msgs([("STEERING_CONTROL", 0, {"STEER_TORQUE": 1})] * 100),
+      lambda: packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": 1}),
+      lambda: packer.pack_arrays("STEERING_CONTROL", {"STEER_TORQUE": [1, 2]}),
+      lambda: prepared.make_can_msg(0, [1]),
+    ]
+    with ThreadPoolExecutor(4) as pool:
+      for f in [pool.submit(calls[i % len(calls)]) for i in range(400)]:
+        f.result()
+
+  def test_pack_arrays(self):
+    packer = CANPacker("honda_civic_touring_2016_can_generated")
+    packer_single = CANPacker("honda_civic_touring_2016_can_generated")
+
+    torque = np.array(range(-500, 500, 7))
+    dat = packer.pack_arrays("STEERING_CONTROL", {"STEER_TORQUE": torque, "STEER_TORQUE_REQUEST": torque > 0})
+    assert dat.dtype == np.uint8 and dat.shape == (len(torque), 5)
+    for i, t in enumerate(torque):
+      expected = packer_single.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": t, "STEER_TORQUE_REQUEST": t > 0})
+      assert bytes(dat[i]) == expected[1]
+
+    # counters continue between calls, and can be given as a column
+    dat = packer.pack_arrays(0xe4, {"STEER_TORQUE": [1, 2, 3]})
+    assert [bytes(d) for d in dat] == [packer_single.make_can_msg(0xe4, 0, {"STEER_TORQUE": t})[1] for t in (1, 2, 3)]
+    dat = packer.pack_arrays(0xe4, {"STEER_TORQUE": [1, 2], "COUNTER": [3, 1]})
+    assert [bytes(d) for d in dat] == [packer_single.make_can_msg(0xe4, 0, {"STEER_TORQUE": 1, "COUNTER": 3})[1],
+                                       packer_single.make_can_msg(0xe4, 0, {"STEER_TORQUE": 2, "COUNTER": 1})[1]]
+
+    parser = CANParser("honda_civic_touring_2016_can_generated", [("STEERING_CONTROL", 0)], 0)
+    count = len(dat)
+    parser.update_arrays(np.zeros(count, dtype=np.uint64), np.full(count, 0xe4, dtype=np.uint32),
+                         np.zeros(count, dtype=np.uint8), np.full(count, 5, dtype=np.uint8), dat)
+    assert parser.vl_all["STEERING_CONTROL"]["STEER_TORQUE"] == [1, 2]
+
+    assert packer.pack_arrays("STEERING_CONTROL", {"STEER_TORQUE": []}).shape == (0, 5)
+    with pytest.raises(RuntimeError):
+      packer.pack_arrays("STEERING_CONTROL", {"STEER_TORQUE": [1, 2], "STEER_TORQUE_REQUEST": [1]})
+    with pytest.raises(RuntimeError):
+      packer.pack_arrays("UNKNOWN_MESSAGE", {"STEER_TORQUE": [1]})
+    with pytest.raises(RuntimeError):
+      packer.pack_arrays("STEERING_CONTROL", {"UNKNOWN_SIGNAL": [1]})
+
+  def test_prepare(self):
+    packer = CANPacker("honda_civic_touring_2016_can_generated")
+    packer_single = CANPacker("honda_civic_touring_2016_can_generated")
+
+    steer = packer.prepare("STEERING_CONTROL", ["STEER_TORQUE", "STEER_TORQUE_REQUEST"])
+    assert steer.address == 0xe4 and steer.signals == ["STEER_TORQUE", "STEER_TORQUE_REQUEST"]
+    for i in range(-300, 300, 3):
+      expected = packer_single.make_can_msg("STEERING_CONTROL", 1, {"STEER_TORQUE": i, "STEER_TORQUE_REQUEST": i > 0})
+      values = (i, i > 0) if i % 2 else np.array([i, i > 0], dtype=np.float64)
+      assert steer.make_can_msg(1, values) == expected
+
+    # counters are shared with the packer, and set if COUNTER is prepared
+    assert packer.make_can_msg(0xe4, 0, {}) == packer_single.make_can_msg(0xe4, 0, {})
+    steer_counter = packer.prepare(0xe4, ["COUNTER"])
+    assert steer_counter.make_can_msg(0, [1]) == packer_single.make_can_msg(0xe4, 0, {"COUNTER": 1})
+    assert steer.make_can_msg(0, [5, 1]) == packer_single.make_can_msg(0xe4, 0, {"STEER_TORQUE": 5, "STEER_TORQUE_REQUEST": 1})
+
+    with pytest.raises(RuntimeError):
+      steer.make_can_msg(0, [1])
+    with pytest.raises(RuntimeError):
+      packer.prepare("STEERING_CONTROL", ["UNKNOWN_SIGNAL"])
+    with pytest.raises(RuntimeError):
+      packer.prepare("UNKNOWN_MESSAGE", [])
+
+  def test_update_arrays(self):
+    msgs = [("STEERING_CONTROL", 0), ("CAN_FD_MESSAGE", 0)]
+    packer = CANPacker(TEST_DBC)
+    parser = CANParser(TEST_DBC, msgs, 0)
+    parser_strings = CANParser(TEST_DBC, msgs, 0)
+
+    can_strings = []
+    for i in range(100):
+      frames = [
+        packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i}),
+        packer.make_can_msg("CAN_FD_MESSAGE", 0, {"SIGNED": -i}),
+        packer.make_can_msg("STEERING_CONTROL", 1, {"STEER_TORQUE": 2 * i}),
+      ]
+      can_strings.append([int(0.01 * i * 1e9), frames])
+
+    nanos, addresses, buses, dlcs, dat = can_strings_to_arrays(can_strings)
+
+    # same result in one bulk call as feeding the frames one update at a time
+    for s in can_strings:
+      updated_strings = parser_strings.update_strings(s)
+    updated = parser.update_arrays(nanos, addresses, buses, dlcs, dat)
+
+    assert updated == updated_strings == {228, 245}
+    assert parser.vl == parser_strings.vl
+    assert parser.ts_nanos == parser_strings.ts_nanos
+    assert parser.vl["STEERING_CONTROL"]["STEER_TORQUE"] == 99
+    assert parser.vl_all["STEERING_CONTROL"]["STEER_TORQUE"] == list(range(100))
+    assert parser.vl["CAN_FD_MESSAGE"]["SIGNED"] == -99
+
+    with pytest.raises(RuntimeError):
+      parser.update_arrays(nanos[:-1], addresses, buses, dlcs, dat)
+
+  def test_threads(self):
+    # parsers sharing a DBC parse in parallel, same results as parsing one after another
+    msgs = [("STEERING_CONTROL", 0), ("CAN_FD_MESSAGE", 0)]
+    packer = CANPacker(TEST_DBC)
+    can_strings = []
+    for i in range(1000):
+      frames = [
+        packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i % 100}),
+        packer.make_can_msg("CAN_FD_MESSAGE", 0, {"SIGNED": -(i % 100)}),
+      ]
+      can_strings.append([int(0.01 * i * 1e9), frames])
+    arrays = can_strings_to_arrays(can_strings)
+
+    def parse(_):
+      parser = CANParser(TEST_DBC, msgs, 0)
+      for i in range(0, len(can_strings), 100):
+        parser.update_strings(can_strings[i:i + 100])
+      parser_arrays = CANParser(TEST_DBC, msgs, 0)
+      parser_arrays.update_arrays(*arrays)
+      return parser.vl_all, parser_arrays.vl_all
+
+    expected = parse(None)
+    with ThreadPoolExecutor(4) as executor:
+      assert list(executor.map(parse, range(8))) == [expected] * 8
+
+  def test_multi_bus(self):
+    dbc_file = "honda_civic_touring_2016_can_generated"
+    bus_msgs = {
+      0: [("VSA_STATUS", 50), ("ENGINE_DATA", 100)],
+      1: [("VSA_STATUS", 50), ("STEERING_CONTROL", 0)],
+      128: [("ENGINE_DATA", 100)],
+    }
+    packer = CANPacker(dbc_file)
+    parser = MultiBusCANParser(dbc_file, [(bus, msg, freq) for bus, msgs in bus_msgs.items() for msg, freq in msgs])
+    parser_arrays = MultiBusCANParser(dbc_file, [(bus, msg, freq) for bus, msgs in bus_msgs.items() for msg, freq in msgs])
+    parsers = {bus: CANParser(dbc_file, msgs, bus) for bus, msgs in bus_msgs.items()}
+
+    random.seed(0)
+    stopped = set()
+    for i in range(1, 2000):
+      if random.random() < 0.01:
+        stopped ^= {random.choice([0, 1, 2, 128])}
+      frames = [packer.make_can_msg(msg, bus, {"USER_BRAKE": i % 100, "STEER_TORQUE": i % 100, "XMISSION_SPEED": i % 100})
+                for bus in (0, 1, 2, 128) if bus not in stopped
+                for msg in ("VSA_STATUS", "ENGINE_DATA", "STEERING_CONTROL") if random.random() < 0.9]
+      can_strings = [int(0.01 * i * 1e9), frames]
+
+      updated = parser.update_strings(can_strings)
+      updated_arrays = parser_arrays.update_arrays(*can_strings_to_arrays([can_strings])) if len(frames) else None
+      for bus, p in parsers.items():
+        assert updated[bus] == p.update_strings(can_strings)
+        assert parser[bus].vl == p.vl
+        assert parser[bus].vl_all == p.vl_all
+        assert parser[bus].ts_nanos == p.ts_nanos
+        assert parser[bus].can_valid == p.can_valid
+        assert parser[bus].bus_timeout == p.bus_timeout
+        if updated_arrays is not None:
+          assert updated_arrays[bus] == updated[bus]
+          assert parser_arrays[bus].vl == p.vl
+
+      assert parser.can_valid == all(p.can_valid for p in parsers.values())
+      assert parser.bus_timeout == any(p.bus_timeout for p in parsers.values())
+
+    assert set(parser.buses) == {0, 1, 128}
+    with pytest.raises(RuntimeError):
+      MultiBusCANParser(dbc_file, [(0, "VSA_STATUS", 50), (0, "VSA_STATUS", 50)])
+    with pytest.raises(RuntimeError):
+      MultiBusCANParser(dbc_file, [(0, "UNKNOWN_MESSAGE", 50)])
+
+  def test_history_capacity(self):
+    packer = CANPacker(TEST_DBC)
+    parser = CANParser(TEST_DBC, [("STEERING_CONTROL", 0)], 0, history_capacity=10)
+
+    for n in (5, 25, 3):
+      frames = [[0, [packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i})]] for i in range(n)]
+      parser.update_strings(frames)
+      assert parser.vl_all["STEERING_CONTROL"]["STEER_TORQUE"] == list(range(max(0, n - 10), n))
+      assert parser.vl["STEERING_CONTROL"]["STEER_TORQUE"] == n - 1
+
+  def test_views(self):
+    msgs = [("STEERING_CONTROL", 0), ("CAN_FD_MESSAGE", 0)]
+    packer = CANPacker(TEST_DBC)
+    parser = CANParser(TEST_DBC, msgs, 0, views=True)
+    parser_dicts = CANParser(TEST_DBC, msgs, 0)
+
+    view = parser.vl["STEERING_CONTROL"]
+    assert parser.vl[228] is view and view.address == 228 and view.name == "STEERING_CONTROL"
+    assert dict(view) == parser_dicts.vl["STEERING_CONTROL"]
+    array = view.array
+    assert array.dtype == np.float64 and array.shape == (len(view.index),)
+    with pytest.raises(ValueError):
+      array[0] = 1.0
+
+    for i in range(10):
+      frames = [[int(1e9) * (i + 1), [packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i}),
+                               packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": 2 * i})]]]
+      assert parser.update_strings(frames) == parser_dicts.update_strings(frames) == {228}
+
+      # values update in place
+      assert array[view.index["STEER_TORQUE"]] == 2 * i
+      assert view["STEER_TORQUE"] == parser.vl[228]["STEER_TORQUE"] == 2 * i
+      assert dict(view) == parser_dicts.vl["STEERING_CONTROL"]
+      assert view.ts_nanos == int(1e9) * (i + 1)
+      assert view.all_values("STEER_TORQUE").tolist() == parser_dicts.vl_all["STEERING_CONTROL"]["STEER_TORQUE"]
+
+    parser.update_strings([])
+    assert view.all_values("STEER_TORQUE").tolist() == []
+    assert parser.vl_all == parser.ts_nanos == {}
+
+    # the array keeps the parser alive
+    del parser, view
+    assert array[0] == array[0]
+
+  def test_decoder(self):
+    packer = CANPacker("honda_civic_touring_2016_can_generated")
+    decoder = CANDecoder("honda_civic_touring_2016_can_generated", [("STEERING_CONTROL", "STEER_TORQUE"), (0x1a4, "USER_BRAKE")])
+
+    can_strings = []
+    for i in range(50):
+      frames = [packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i})]
+      if i % 2 == 0:
+        frames.append(packer.make_can_msg("VSA_STATUS", 0, {"USER_BRAKE": i // 2}))
+      if i == 25:
+        # bad checksum, dropped from the series
+        frames.append(frames[0][:1] + [b'\x00' * len(frames[0][1])] + [0])
+      can_strings.append([int(0.01 * i * 1e9), frames])
+
+    series = decoder.decode(*can_strings_to_arrays(can_strings))
+    ts, values = series[("STEERING_CONTROL", "STEER_TORQUE")]
+    assert ts.dtype == np.uint64 and values.dtype == np.int64
+    assert ts.tolist() == [int(0.01 * i * 1e9) for i in range(50)]
+    assert values.tolist() == list(range(50))
+
+    # scaled signals stay float64
+    ts, values = series[(0x1a4, "USER_BRAKE")]
+    assert values.dtype == np.float64
+    assert ts.tolist() == [int(0.01 * i * 1e9) for i in range(0, 50, 2)]
+    assert values.tolist() == pytest.approx(range(25))
+
+    with pytest.raises(RuntimeError):
+      CANDecoder("honda_civic_touring_2016_can_generated", [("STEERING_CONTROL", "UNKNOWN_SIGNAL")])
+
+  def test_decoder_int64(self, tmp_path):
+    # integer columns are exact beyond the 2^53 a double holds, unsigned 64-bit values wrap
+    dbc_path = tmp_path / "int64.dbc"
+    dbc_path.write_text('BO_ 100 IDS: 8 XXX\n SG_ ID : 0|64@1+ (1,0) [0|0] "" XXX\n SG_ LOW : 0|56@1- (1,-1) [0|0] "" XXX\n')
+    raw = [2**53 + 1, 2**62 + 3, 2**55 + 2**54 + 5, 2**64 - 1]
+    can_strings = [[i, [[100, r.to_bytes(8, "little"), 0]]] for i, r in enumerate(raw)]
+
+    series = CANDecoder(str(dbc_path), [("IDS", "ID"), ("IDS", "LOW")]).decode(*can_strings_to_arrays(can_strings))
+    assert series[("IDS", "ID")][1].tolist() == [2**53 + 1, 2**62 + 3, 2**55 + 2**54 + 5, -1]
+    assert series[("IDS", "LOW")][1].tolist() == [2**53, 2, -2**54 + 4, -2]
+
   def test_scale_offset(self):
     """Test that both scale and offset are correctly preserved"""
     dbc_file = "honda_civic_touring_2016_can_generated"
@@ -271,6 +671,33 @@ class TestCanParserPacker:
       if len(user_brake_vals):
         assert vl_all[-1] == parser.vl["VSA_STATUS"]["USER_BRAKE"]
 
+  def test_empty_update(self):
+    """
+    vl_all only holds the values of the last update. An update without frames
+    reports the messages seen at the last timestamp again, or every message
+    before one was seen, with their values and no new ones in vl_all
+    """
+    dbc_file = "honda_civic_touring_2016_can_generated"
+    packer = CANPacker(dbc_file)
+    parser = CANParser(dbc_file, [("STEERING_CONTROL", 0), ("VSA_STATUS", 0), ("GEARBOX", 0)], 0)
+    steering, vsa, gearbox = (packer.make_can_msg(name, 0, {})[0] for name in ("STEERING_CONTROL", "VSA_STATUS", "GEARBOX"))
+
+    assert parser.vl_all["GEARBOX"] == {sig: [] for sig in parser.vl["GEARBOX"]}
+    assert parser.update_strings([]) == {steering, vsa, gearbox}
+
+    assert parser.update_strings([int(1e9), [packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": 1})]]) == {steering}
+    assert parser.vl_all["STEERING_CONTROL"]["STEER_TORQUE"] == [1]
+    assert parser.vl_all["GEARBOX"] == parser.vl_all["VSA_STATUS"] == {}
+
+    assert parser.update_strings([int(2e9), [packer.make_can_msg("VSA_STATUS", 0, {"USER_BRAKE": 5})]]) == {vsa}
+    assert parser.vl_all["STEERING_CONTROL"] == {}
+
+    assert parser.update_strings([]) == {vsa}
+    assert parser.vl["VSA_STATUS"]["USER_BRAKE"] == 5
+    assert parser.vl_all["VSA_STATUS"]["USER_BRAKE"] == []
+    assert parser.vl["STEERING_CONTROL"]["STEER_TORQUE"] == 1
+    assert parser.vl_all["STEERING_CONTROL"] == {}
+
   def test_timestamp_nanos(self):
     """Test message timestamp dict"""
     dbc_file = "honda_civic_touring_2016_can_generated"
@@ -336,6 +763,43 @@ class TestCanParserPacker:
       "CHECKSUM": 0,
     }
 
+  def test_all_messages(self):
+    dbc_file = "honda_civic_touring_2016_can_generated"
+    packer, packer_bus1 = CANPacker(dbc_file), CANPacker(dbc_file)
+    parser = CANParser(dbc_file, None)
+    parser_views = CANParser(dbc_file, None, views=True)
+    parser_msgs = CANParser(dbc_file, [("STEERING_CONTROL", 0), ("VSA_STATUS", 0)])
+
+    # messages show up once they're seen
+    assert parser.vl == parser.vl_all == parser.ts_nanos == parser_views.vl == {}
+    for i in range(10):
+      frames = [
+        packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i}),
+        packer_bus1.make_can_msg("STEERING_CONTROL", 1, {"STEER_TORQUE": 2 * i}),
+        [0x7ff, b"\x00" * 8, 0],
+      ]
+      if i >= 5:
+        frames.append(packer.make_can_msg("VSA_STATUS", 0, {"USER_BRAKE": i}))
+      can_strings = [int(0.01 * (i + 1) * 1e9), frames]
+
+      updated = parser.update_strings(can_strings)
+      assert parser_views.update_strings(can_strings) == updated == parser_msgs.update_strings(can_strings)
+      assert set(parser.vl) == {"STEERING_CONTROL", 228} | ({"VSA_STATUS", 420} if i >= 5 else set())
+      assert parser.vl["STEERING_CONTROL"] == parser_msgs.vl["STEERING_CONTROL"] == dict(parser_views.vl[228])
+    assert parser.vl_all["VSA_STATUS"] == parser_msgs.vl_all["VSA_STATUS"]
+    assert parser.ts_nanos["VSA_STATUS"] == parser_msgs.ts_nanos["VSA_STATUS"]
+
+    # checksum and counter are checked unless ignored
+    msg = packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": 100})
+    bad_msg = [msg[0], bytes(msg[1][:4]) + bytes([msg[1][4] ^ 0x0F]), 0]
+    parser_ignore = CANParser(dbc_file, None, ignore_checksum=True, ignore_counter=True)
+    parser_msgs_ignore = CANParser(dbc_file, [("STEERING_CONTROL", 0)], ignore_checksum=True, ignore_counter=True)
+    for p in (parser, parser_msgs, parser_ignore, parser_msgs_ignore):
+      p.update_strings([int(1e9), [bad_msg]])
+    assert parser.vl["STEERING_CONTROL"]["STEER_TORQUE"] == parser_msgs.vl["STEERING_CONTROL"]["STEER_TORQUE"] == 9
+    assert parser_ignore.vl["STEERING_CONTROL"]["STEER_TORQUE"] == 100
+    assert parser_msgs_ignore.vl["STEERING_CONTROL"]["STEER_TORQUE"] == 100
+
   def test_disallow_duplicate_messages(self):
     CANParser("toyota_nodsu_pt_generated", [("ACC_CONTROL", 5)])
 
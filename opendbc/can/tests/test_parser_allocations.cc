@@ -0,0 +1,124 @@
+#include <cstdio>
+#include <cstdlib>
+#include <new>
+#include <string>
+#include <vector>
+
+#include "opendbc/can/common.h"
+
+// Checks that parsing frames doesn't allocate once the message states, and a
+// parser updated with them, are warmed up, counting every operator new of the
+// process.
+
+static bool counting = false;
+static size_t allocations = 0;
+
+void* operator new(size_t size) {
+  if (counting) {
+    allocations++;
+  }
+  if (void *p = std::malloc(size)) return p;
+  throw std::bad_alloc();
+}
+
+void operator delete(void *p) noexcept {
+  std::free(p);
+}
+
+void operator delete(void *p, size_t) noexcept {
+  std::free(p);
+}
+
+int main() {
+  const std::string dbc_name = "honda_civic_touring_2016_can_generated";
+  const DBC *dbc = dbc_lookup(dbc_name);
+  const Msg *msg = dbc->name_to_msg.at("STEERING_CONTROL");
+
+  CANPacker packer(dbc_name);
+  std::vector<std::vector<uint8_t>> frames;
+  for (int i = 0; i < 1000; i++) {
+    frames.push_back(packer.pack(msg->address, {{"STEER_TORQUE", (double)(i % 100)}}));
+  }
+
+  // history read every 100 frames, and a bounded one that's never read
+  MessageState state, bounded;
+  state.init(*msg);
+  bounded.init(*msg);
+  bounded.set_history_capacity(16);
+
+  std::vector<double> values;
+  size_t failed = 0;
+  auto run = [&]() {
+    for (size_t i = 0; i < frames.size(); i++) {
+      failed += !state.parse(i, frames[i].data(), frames[i].size());
+      failed += !bounded.parse(i, frames[i].data(), frames[i].size());
+      if (i % 100 == 99) {
+        for (size_t j = 0; j < state.parse_sigs.size(); j++) {
+          state.read_history(j, values);
+        }
+        state.clear_history();
+      }
+    }
+  };
+
+  run();
+  counting = true;
+  run();
+  run();
+  counting = false;
+  const size_t state_allocations = allocations;
+
+  // full updates of a parser, 10 CanData each, with a frame of an untracked
+  // message and one of another bus. Timestamps keep increasing across the runs
+  const Msg *powertrain = dbc->name_to_msg.at("POWERTRAIN_DATA");
+  std::vector<std::vector<uint8_t>> powertrain_frames;
+  for (size_t i = 0; i < frames.size(); i++) {
+    powertrain_frames.push_back(packer.pack(powertrain->address, {}));
+  }
+  const uint8_t untracked[8] = {};
+  std::vector<std::vector<std::vector<CanData>>> runs(3);
+  uint64_t nanos = 0;
+  for (auto &updates : runs) {
+    for (size_t i = 0; i < frames.size(); i++) {
+      if (i % 10 == 0) {
+        updates.emplace_back();
+      }
+      nanos += 10000000;
+      updates.back().push_back({nanos, {
+        {0, msg->address, frames[i].data(), frames[i].size()},
+        {0, powertrain->address, powertrain_frames[i].data(), powertrain_frames[i].size()},
+        {0, 0x123, untracked, sizeof(untracked)},
+        {1, msg->address, frames[i].data(), frames[i].size()},
+      }});
+    }
+  }
+
+  CANParser parser(0, dbc_name, {{msg->address, 100}, {powertrain->address, 100}});
+  std::vector<MessageState *> states;
+  size_t invalid = 0;
+  auto run_parser = [&](const std::vector<std::vector<CanData>> &updates) {
+    for (const auto &can_data : updates) {
+      states.clear();
+      parser.update(can_data, states);
+      for (MessageState *updated : states) {
+        for (size_t j = 0; j < updated->parse_sigs.size(); j++) {
+          updated->read_history(j, values);
+        }
+        updated->clear_history();
+      }
+      invalid += !parser.can_valid;
+    }
+  };
+
+  run_parser(runs[0]);
+  invalid = 0;
+  counting = true;
+  run_parser(runs[1]);
+  run_parser(runs[2]);
+  counting = false;
+  const size_t parser_allocations = allocations - state_allocations;
+
+  printf("%zu failed frames, %zu allocations\n", failed, state_allocations);
+  printf("parser: %zu invalid updates, %zu allocations\n", invalid, parser_allocations);
+  return failed == 0 && state_allocations == 0 && invalid == 0 && parser_allocations == 0 ? 0 : 1;
+}
@@ -0,0 +1,134 @@
+import os
+import socket
+import struct
+import time
+
+import pytest
+
+from opendbc.can.parser import CANParser, CANReader
+from opendbc.can.packer import CANPacker
+
+DBC_NAME = "honda_civic_touring_2016_can_generated"
+
+
+def can_records(msgs, canfd=False):
+  # struct can_frame, or canfd_frame, records as read from a SocketCAN socket
+  fmt = "<IB3x64s" if canfd else "<IB3x8s"
+  return b"".join(struct.pack(fmt, address | (0x80000000 if address > 0x7FF else 0), len(dat), dat)
+                  for address, dat, _ in msgs)
+
+
+def wait_for(condition, timeout=5.):
+  start = time.monotonic()
+  while not condition():
+    assert time.monotonic() - start < timeout
+    time.sleep(0.01)
+
+
+class TestCANReader:
+  def _steering_msgs(self, packer, count):
+    return [packer.make_can_msg("STEERING_CONTROL", 0, {"STEER_TORQUE": i}) for i in range(count)]
+
+  def _receive(self, reader, parser, count):
+    # polls until count frames of STEERING_CONTROL were parsed, returns their torques
+    torques = []
+    def received():
+      if reader.poll():
+        torques.extend(parser.vl_all["STEERING_CONTROL"]["STEER_TORQUE"])
+      return len(torques) >= count
+    wait_for(received)
+    return torques
+
+  def test_file(self, tmp_path):
+    packer = CANPacker(DBC_NAME)
+    parser = CANParser(DBC_NAME, [("STEERING_CONTROL", 0)])
+    path = tmp_path / "frames.bin"
+    path.write_bytes(can_records(self._steering_msgs(packer, 10000)))
+
+    with CANReader(parser, path=path) as reader:
+      wait_for(lambda: not reader.running)
+      assert reader.error is None
+      assert reader.poll() == {0xE4}
+      assert reader.can_valid
+      assert parser.vl["STEERING_CONTROL"]["STEER_TORQUE"] == 9999
+      assert parser.vl_all["STEERING_CONTROL"]["STEER_TORQUE"] == list(range(10000))
+      assert reader.poll() == set()
+
+  def test_canfd_file(self, tmp_path):
+    packer = CANPacker("hyundai_canfd")
+    parser = CANParser("hyundai_canfd", [("ADRV_0x200", 0)])
+    msgs = [packer.make_can_msg("ADRV_0x200", 0, {"SET_ME_E1": i}) for i in range(100)]
+    path = tmp_path / "frames.bin"
+    path.write_bytes(can_records(msgs, canfd=True))
+
+    with CANReader(parser, path=path, canfd=True) as reader:
+      wait_for(lambda: not reader.running)
+      assert reader.poll() == {0x200}
+      assert parser.vl_all["ADRV_0x200"]["SET_ME_E1"] == list(range(100))
+
+  def test_pipe(self):
+    packer = CANPacker(DBC_NAME)
+    parser = CANParser(DBC_NAME, [("STEERING_CONTROL", 100)])
+    r, w = os.pipe()
+    try:
+      with CANReader(parser, path=f"/dev/fd/{r}") as reader:
+        # a record split across writes
+        records = can_records(self._steering_msgs(packer, 50))
+        os.write(w, records[:100])
+        time.sleep(0.05)
+        os.write(w, records[100:])
+        assert self._receive(reader, parser, 50) == list(range(50))
+        assert reader.can_valid
+
+        # the parser notices a quiet bus without frames to update it
+        wait_for(lambda: reader.poll() is not None and not reader.can_valid)
+
+        os.close(w)
+        w = None
+        wait_for(lambda: not reader.running)
+        assert reader.error is None
+    finally:
+      os.close(r)
+      if w is not None:
+        os.close(w)
+
+  @pytest.mark.skipif(not os.path.exists("/sys/class/net/vcan0"), reason="needs a vcan0 interface")
+  def test_vcan(self):
+    packer = CANPacker(DBC_NAME)
+    parser = CANParser(DBC_NAME, [("STEERING_CONTROL", 0)])
+    with CANReader(parser, interface="vcan0") as reader, socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW) as s:
+      s.bind(("vcan0",))
+      records = can_records(self._steering_msgs(packer, 10))
+      for i in range(0, len(records), 16):
+        s.send(records[i:i+16])
+      assert self._receive(reader, parser, 10) == list(range(10))
+
+  def test_attached(self):
+    packer = CANPacker(DBC_NAME)
+    parser = CANParser(DBC_NAME, [("STEERING_CONTROL", 0)])
+    msg = packer.make_can_msg("STEERING_CONTROL", 0, {})
+    r, w = os.pipe()
+    try:
+      with CANReader(parser, path=f"/dev/fd/{r}"):
+        with pytest.raises(RuntimeError):
+          parser.update_strings([0, [msg]])
+        with pytest.raises(RuntimeError):
+          CANReader(parser, path=f"/dev/fd/{r}")
+      parser.update_strings([0, [msg]])
+    finally:
+      os.close(r)
+      os.close(w)
+
+  def test_invalid(self, tmp_path):
+    parser = CANParser(DBC_NAME, [("STEERING_CONTROL", 0)])
+    with pytest.raises(RuntimeError):
+      CANReader(parser, interface="nonexistent0")
+    with pytest.raises(RuntimeError):
+      CANReader(parser, path=tmp_path / "nonexistent.bin")
+    with pytest.raises(RuntimeError):
+      CANReader(parser)
+    parser.update_strings([])
+
+    views_parser = CANParser(DBC_NAME, [("STEERING_CONTROL", 0)], views=True)
+    with pytest.raises(RuntimeError):
+      CANReader(views_parser, path=tmp_path / "nonexistent.bin")